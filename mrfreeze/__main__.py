@@ -22,10 +22,17 @@ logging.basicConfig(level  = logging.WARN,
 
 # Set log levels for MrFreeze modules
 logging.getLogger("mrfreeze").setLevel(logging.INFO)
+logging.getLogger("AssetCache").setLevel(logging.INFO)
 logging.getLogger("CommandLogger").setLevel(logging.INFO)
+logging.getLogger("DatabaseWorker").setLevel(logging.INFO)
+logging.getLogger("ConnectionManager").setLevel(logging.INFO)
 logging.getLogger("Inkcyclopedia").setLevel(logging.INFO)
+logging.getLogger("MessageScanner").setLevel(logging.INFO)
+logging.getLogger("Migration").setLevel(logging.INFO)
 logging.getLogger("MrFreeze").setLevel(logging.INFO)
+logging.getLogger("Outbox").setLevel(logging.INFO)
 logging.getLogger("PinHandler").setLevel(logging.INFO)
+logging.getLogger("UnmuteScheduler").setLevel(logging.INFO)
 logging.getLogger("Settings").setLevel(logging.INFO)
 logging.getLogger("Moderation").setLevel(logging.INFO)
 logging.getLogger("ErrorHandler").setLevel(logging.INFO)
@@ -0,0 +1,62 @@
+"""
+Module for the in-memory cache of images the bot sends.
+
+Some images, like the gifs attached to really hot or cold temperature
+conversions, are sent over and over again. Rather than opening and reading
+them from disk every time (which blocks the event loop) all of them are
+read into memory once when the bot starts.
+"""
+
+import io
+import logging
+import os
+from typing import Dict
+
+from discord import Embed
+from discord import File
+
+from mrfreeze.colors import CYAN, MAGENTA_B, RED, RESET, YELLOW_B
+
+
+class AssetCache:
+    """Cache holding the contents of all image files in memory."""
+
+    def __init__(self, path: str = "images") -> None:
+        self.path = path
+        self.assets: Dict[str, bytes] = dict()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def load(self) -> None:
+        """Read every file in self.path into memory."""
+        assets = dict()
+        try:
+            for name in sorted(os.listdir(self.path)):
+                file_path = os.path.join(self.path, name)
+                if os.path.isfile(file_path):
+                    with open(file_path, "rb") as asset:
+                        assets[name] = asset.read()
+        except OSError as e:
+            self.logger.error(
+                f"{YELLOW_B}Assets {CYAN}failed to load {self.path}:\n{RED}==> {e}{RESET}")
+
+        self.assets = assets
+        size = sum(len(data) for data in assets.values()) // 1024
+        self.logger.info(
+            f"{CYAN}Loaded {MAGENTA_B}{len(assets)} assets {CYAN}({size} kB){RESET}")
+
+    def file(self, name: str) -> File:
+        """
+        Create a discord.File for an asset.
+
+        The File is backed by the bytes in memory, falling back
+        to reading from disk if the asset hasn't been loaded.
+        """
+        data = self.assets.get(name)
+        if data is None:
+            return File(os.path.join(self.path, name))
+        return File(io.BytesIO(data), filename=name)
+
+    def thumbnail(self, embed: Embed, name: str) -> File:
+        """Set the thumbnail of an embed to an asset, returning the File to attach."""
+        embed.set_thumbnail(url=f"attachment://{name}")
+        return self.file(name)
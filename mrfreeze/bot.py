@@ -7,10 +7,12 @@ and also servers as a hub for various common functions that
 are used in many of the cogs.
 """
 
+import asyncio
 import datetime
 import logging
 import os
 import sys
+from collections import OrderedDict
 from typing import Any
 from typing import Awaitable
 from typing import Dict
@@ -21,16 +23,25 @@ from typing import Optional
 import discord
 from discord import Guild
 from discord import Member
+from discord import Message
 from discord import Role
 from discord import TextChannel
 from discord.ext import commands
 from discord.ext.commands import Context
+from discord.ext.commands.view import StringView
 
 # Importing MrFreeze submodules
 from mrfreeze import colors, greeting
+from mrfreeze.assets import AssetCache
 from mrfreeze import dbfunctions, server_settings, time
 from mrfreeze.checks import MuteCheckFailure
+from mrfreeze.database.helpers import connections
+from mrfreeze.database.migrate import migrate_legacy
 from mrfreeze.database.settings import Settings
+from mrfreeze.database.tables.abc_table_base import ABCTableBase
+from mrfreeze.database.worker import DatabaseWorker
+from mrfreeze.outbox import Outbox
+from mrfreeze.scanner import MessageScanner
 
 
 # Usage note!
@@ -53,6 +64,17 @@ class ServerTuple(NamedTuple):
     mute_role:    Optional[Role]
 
 
+class ParsedMessage(NamedTuple):
+    """The part of an invocation context that comes from parsing a message."""
+
+    message:      Message
+    prefix:       Optional[str]
+    invoked_with: Optional[str]
+    command:      Optional[commands.Command]
+    previous:     int
+    index:        int
+
+
 class MrFreeze(commands.Bot):
     """The man, the bot, the legend. This is where the magic happens."""
 
@@ -68,16 +90,22 @@ class MrFreeze(commands.Bot):
         # Dict in which to save the ServerTuple for each server.
         self.servertuples: Dict[int, ServerTuple] = dict()
 
+        # Parse results for the most recently parsed messages, keyed on message
+        # ID. All on_message listeners (and the command dispatch) go through
+        # get_context, so each message is only parsed once.
+        self.context_cache_size = 256
+        self.context_cache: "OrderedDict[int, ParsedMessage]" = OrderedDict()
+
         # Setting up imported functions so they can be accessed by all cogs
         self.logger.debug("Linking imported functions as own methods")
         self.extract_time = time.extract_time
         self.parse_timedelta = time.parse_timedelta
         self.read_server_setting = server_settings.read_server_setting
         self.write_server_setting = server_settings.write_server_setting
-        self.create_server_settings = server_settings.create_server_settings
         self.db_connect = dbfunctions.db_connect
         self.db_create = dbfunctions.db_create
         self.db_time = dbfunctions.db_time
+        self.db_epoch = dbfunctions.db_epoch
 
         # Check that the necessary directories exist and
         # are directories, otherwise create them.
@@ -88,9 +116,30 @@ class MrFreeze(commands.Bot):
         self.servers_prefix = "config/servers"
         self.path_setup(self.servers_prefix, "Servers prefix")
 
+        # Read all images into memory so they don't have to be
+        # read from disk every time they're sent.
+        self.logger.debug("Loading assets")
+        self.assets = AssetCache("images")
+        self.assets.load()
+
         self.logger.debug("Instantiating Settings module")
         self.settings = Settings()
 
+        # Database work the cogs await is carried out on a thread of its own.
+        self.logger.debug("Starting database worker")
+        self.database = DatabaseWorker()
+
+        # Passive listeners register triggers with the scanner
+        # instead of listening to on_message themselves.
+        self.logger.debug("Setting up message scanner")
+        self.scanner = MessageScanner(on_error=self.on_error)
+        self.add_listener(self.scanner.scan, "on_message")
+
+        # Replies from passive listeners go through the outbox, which
+        # merges replies sent to the same channel in quick succession.
+        self.logger.debug("Setting up outbox")
+        self.outbox = Outbox()
+
         # Add the mute check
         self.logger.debug("Adding self mute check")
         self.check(self.block_self_if_muted)
@@ -99,6 +148,7 @@ class MrFreeze(commands.Bot):
         """Block commands form executing if MrFreeze is muted in a certain server."""
         command = ctx.command.name
 
+        await self.load_tables(self.settings.freeze_mutes)
         if self.settings.is_freeze_muted(ctx.guild) and command != "freezemute":
             server = ctx.guild.name
             author = ctx.author
@@ -106,12 +156,51 @@ class MrFreeze(commands.Bot):
 
         return True
 
+    async def get_context(self, message: Message, *, cls: type = Context) -> Context:
+        """
+        Get the invocation context for a message, parsing it at most once.
+
+        The message is parsed by whichever listener asks for it first and the
+        result is shared with every other listener as well as the command
+        dispatch. Each caller gets a context of its own, since invoking a
+        command fills in the context it's given. Contexts of custom classes
+        are never cached.
+        """
+        if cls is not Context:
+            return await super().get_context(message, cls=cls)
+
+        parsed = self.context_cache.get(message.id)
+        # An edited message arrives as a new object with the same ID.
+        if parsed is None or parsed.message is not message:
+            ctx = await super().get_context(message, cls=cls)
+            parsed = ParsedMessage(message, ctx.prefix, ctx.invoked_with, ctx.command,
+                                   ctx.view.previous, ctx.view.index)
+            self.context_cache[message.id] = parsed
+            self.context_cache.move_to_end(message.id)
+            while len(self.context_cache) > self.context_cache_size:
+                self.context_cache.popitem(last=False)
+            return ctx
+
+        view = StringView(message.content)
+        view.previous = parsed.previous
+        view.index = parsed.index
+        return cls(prefix=parsed.prefix, view=view, bot=self, message=message,
+                   invoked_with=parsed.invoked_with, command=parsed.command)
+
     async def on_ready(self) -> None:
         """Set the bot up, print some greeting messages and stuff."""
         # Set tuples up for all servers
         for server in self.guilds:
             await self.server_tuple(server)
 
+        # Load the settings tables that haven't been used yet.
+        if self.settings.warm_up_on_ready and "settings warm-up" not in self.bg_tasks:
+            self.add_bg_task(self.warm_up_settings(), "settings warm-up")
+
+        # Periodically write settings changes that haven't been written yet.
+        if "settings flush" not in self.bg_tasks:
+            self.add_bg_task(self.flush_settings(), "settings flush")
+
         # Greeting (printed to console)
         greetmsg = greeting.bot_greeting(self)
         for line in greetmsg:
@@ -130,6 +219,52 @@ class MrFreeze(commands.Bot):
         # Signal to the terminal that the bot is ready.
         self.logger.info(f"{colors.WHITE_B}READY WHEN YOU ARE CAP'N!{colors.RESET}")
 
+    async def load_tables(self, *tables: ABCTableBase) -> None:
+        """Load the settings tables that haven't been loaded yet on the database worker."""
+        for table in tables:
+            # It may have been loaded by something else while waiting.
+            if not table.is_loaded():
+                await self.database.run(table.ensure_loaded)
+
+    async def warm_up_settings(self) -> None:
+        """Load the settings tables that haven't been used yet, one at a time."""
+        await self.load_tables(*self.settings.unloaded_tables())
+
+        if self.settings.unloaded_tables():
+            self.logger.error("Some settings tables failed to load")
+        else:
+            self.logger.debug("All settings tables loaded")
+
+    async def import_legacy_data(self) -> None:
+        """Import the legacy databases and server settings, unless they've been imported before."""
+        counts = await self.database.run(
+            migrate_legacy, self.settings, self.db_prefix, self.servers_prefix, only_once=True)
+
+        for table, count in counts.items():
+            if count < 0:
+                self.logger.error(f"Failed to import legacy data into {table}")
+            else:
+                self.logger.info(f"Imported {count} legacy rows into {table}")
+
+    async def flush_settings(self) -> None:
+        """Write pending settings changes to the database every now and then."""
+        while not self.is_closed():
+            await asyncio.sleep(self.settings.flush_interval)
+            await self.database.run(self.settings.flush)
+
+    async def start(self, *args: Any, **kwargs: Any) -> None:
+        """Import legacy data, then log in and connect."""
+        await self.import_legacy_data()
+        await super().start(*args, **kwargs)
+
+    async def close(self) -> None:
+        """Log out, then finish database work and close the connections."""
+        await super().close()
+        await self.outbox.close()
+        await self.database.run(self.settings.flush)
+        await self.database.close()
+        connections.close_all()
+
     def path_setup(self, path: str, trivial_name: str) -> None:
         """Create various directories which the bot needs."""
         if os.path.isdir(path):
@@ -189,6 +324,7 @@ class MrFreeze(commands.Bot):
         if the server hasn't specified one the default system channel is
         returned instead.
         """
+        await self.load_tables(self.settings.trash_channels)
         channel_id = self.settings.get_trash_channel(server)
 
         if channel_id:
@@ -205,6 +341,7 @@ class MrFreeze(commands.Bot):
         if the server hasn't specified one the default system channel is
         returned instead.
         """
+        await self.load_tables(self.settings.mute_channels)
         channel_id = self.settings.get_mute_channel(server)
 
         if channel_id:
@@ -4,7 +4,6 @@ from typing import List
 
 import discord
 from discord import Embed
-from discord import File
 from discord.ext.commands import Context
 
 from mrfreeze.bot import MrFreeze
@@ -41,8 +40,7 @@ class About(CogBase):
             name="Readme",
             value=f"My readme file is available [on Github]({url})!")
 
-        image = File("images/readme.png")
-        embed.set_thumbnail(url="attachment://readme.png")
+        image = self.bot.assets.thumbnail(embed, "readme.png")
         await ctx.send(embed=embed, file=image)
 
     @discord.ext.commands.command(name="source", aliases=source_aliases)
@@ -55,8 +53,7 @@ class About(CogBase):
                    "Github](https://github.com/terminalnode/mrfreeze)!")
         )
 
-        image = File("images/source.png")
-        embed.set_thumbnail(url="attachment://source.png")
+        image = self.bot.assets.thumbnail(embed, "source.png")
         await ctx.send(embed=embed, file=image)
 
     @discord.ext.commands.command(name="getfreeze", aliases=getfreeze_aliases)
@@ -103,8 +100,7 @@ class About(CogBase):
             value=(f"[Invite Ba'athman to a server]({baathman_url})\n" +
                    f"[Invite Robin to a server]({robin_url})"))
 
-        image = File("images/dummies.png")
-        embed.set_thumbnail(url="attachment://dummies.png")
+        image = self.bot.assets.thumbnail(embed, "dummies.png")
         await ctx.send(embed=embed, file=image)
 
     @discord.ext.commands.command(name="todo", aliases=todo_aliases)
@@ -119,6 +115,5 @@ class About(CogBase):
                    "\"cool\" stuff Terminal has planned for me... :sleeping:")
         )
 
-        image = File("images/todos.png")
-        embed.set_thumbnail(url="attachment://todos.png")
+        image = self.bot.assets.thumbnail(embed, "todos.png")
         await ctx.send(embed=embed, file=image)
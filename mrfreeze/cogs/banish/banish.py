@@ -11,10 +11,13 @@ Therefor they're both in a cog separate from everything else.
 import asyncio
 import datetime
 import random
+import time
+from typing import Dict
 from typing import Iterable
+from typing import List
+from typing import Tuple
 
 import discord
-from discord import Guild
 
 from mrfreeze import checks
 from mrfreeze import colors
@@ -24,6 +27,7 @@ from mrfreeze.cogs.cogbase import CogBase
 from mrfreeze.cogs.banish.enums import MuteType, MuteStr
 from mrfreeze.cogs.banish.templates import templates
 from mrfreeze.cogs.banish import mute_db, region_db
+from mrfreeze.cogs.banish.scheduler import Expiry, UnmuteScheduler
 
 
 banish_aliases = ["unbanish", "microbanish",
@@ -52,57 +56,45 @@ def setup(bot: MrFreeze) -> None:
 class BanishAndRegion(CogBase):
     """Good mod! Read the manual! Or if you're not mod - sod off!"""
 
-    def __init__(self, bot: MrFreeze, mdbname: str = "mutes", rdbname: str = "regions") -> None:
+    def __init__(self, bot: MrFreeze) -> None:
         self.bot = bot
 
-        # Server setting names
-        # Mute interval governs how often to check for unmutes.
-        self.mute_interval_name = 'mute_interval'
-        self.default_mute_interval = 5
-        self.mute_interval_dict = dict()
+        # Mutes, the region blacklist and the server settings are stored in
+        # the settings database. The legacy data is imported the first time
+        # the bot starts, or at any time with !migratedb.
 
+        # Server setting names
         # Self mute interval governs how long to banish
         # unauthorized uses of !mute/!banish etc
         self.self_mute_time_name = 'self_mute_time'
         self.default_self_mute_time = 20
         self.self_mute_time_dict = dict()
 
-        # Mutes database creation
-        self.mdbname = mdbname
-        mdbtable = f"""CREATE TABLE IF NOT EXISTS {self.mdbname}(
-            id          integer NOT NULL,
-            server      integer NOT NULL,
-            voluntary   boolean NOT NULL,
-            until       date,
-            CONSTRAINT  server_user PRIMARY KEY (id, server));"""
-        bot.db_create(self.bot, self.mdbname, mdbtable)
-
-        # Region database creation
-        self.rdbname = rdbname
-        self.region_table = "region"
-        self.blacklist_table = "blacklist"
-        # Complete list of tables and their rows in this database.
-        # Primary key(s) is marked with an asterisk (*).
-        # Mandatory but not primary keys are marked with a pling (!).
-        # TABLE                 ROWS       TYPE     FUNCTION
-        # self.region_table     role*      integer  Role ID
-        #                       server*    integer  Server ID
-        #                       triggers!  string   String of keywords for region
-        # self.blacklist_table  uid*       integer  User ID
-        #                       sid*       integer  Server ID
-        rdbtable = f"""CREATE TABLE IF NOT EXISTS {self.region_table}(
-            role        integer NOT NULL,
-            server      integer NOT NULL,
-            triggers    str NOT NULL,
-            CONSTRAINT  server_user PRIMARY KEY (role, server));"""
-
-        rdbtable_bl = f"""CREATE TABLE IF NOT EXISTS {self.blacklist_table}(
-            uid         integer NOT NULL,
-            sid         integer NOT NULL,
-            CONSTRAINT  sid_uid PRIMARY KEY (uid, sid));"""
-
-        bot.db_create(self.bot, self.rdbname, rdbtable, comment="region table")
-        bot.db_create(self.bot, self.rdbname, rdbtable_bl, comment="blacklist table")
+        # Keep the dictionary up to date whenever the setting changes.
+        bot.settings.add_setting_listener(self.self_mute_time_name, self.setting_changed)
+
+        # A single scheduler takes care of unmuting everyone on every server
+        # as soon as their time is up.
+        self.scheduler = UnmuteScheduler(self.unmute_expired)
+
+        # Role changes on a server share a rate limit bucket, so banishing
+        # lots of people at once only has this many role changes in flight
+        # per server, discord.py takes care of waiting out the rate limit.
+        self.role_changes = 5
+        self.role_semaphores: Dict[int, asyncio.Semaphore] = dict()
+
+    def role_semaphore(self, server: discord.Guild) -> asyncio.Semaphore:
+        """Get the semaphore limiting concurrent role changes on a server."""
+        if server.id not in self.role_semaphores:
+            self.role_semaphores[server.id] = asyncio.Semaphore(self.role_changes)
+        return self.role_semaphores[server.id]
+
+    def setting_changed(self, server_id: int, setting: str, value: str) -> None:
+        """Update the self mute time of a server after it's changed."""
+        if value.isdigit():
+            self.self_mute_time_dict[server_id] = int(value)
+        else:
+            self.self_mute_time_dict[server_id] = self.default_self_mute_time
 
     def word_distance(self, a: str, b: str) -> int:
         """Get the word distance between two words."""
@@ -132,19 +124,21 @@ class BanishAndRegion(CogBase):
         """
         return min(candidates, key=lambda k: self.word_distance(k, input))
 
+    async def cog_before_invoke(self, ctx):
+        # Commands may come in before on_ready, and before the warm-up has
+        # loaded the tables they read from.
+        await self.bot.load_tables(
+            self.bot.settings.mutes,
+            self.bot.settings.region_blacklist,
+            self.bot.settings.server_settings)
+
     @CogBase.listener()
     async def on_ready(self):
-        for server in self.bot.guilds:
-            # Set intervals in which to check mutes
-            mute_interval = self.bot.read_server_setting(self.bot, server, self.mute_interval_name)
-            if mute_interval and mute_interval.isdigit():
-                self.mute_interval_dict[server.id] = int(mute_interval)
-            else:
-                self.mute_interval_dict[server.id] = self.default_mute_interval
-
-            # Add unbanish loop to bot
-            self.bot.add_bg_task(self.unbanish_loop(server), f'unbanish@{server.id}')
+        # Load the server settings and mutes on the database thread, after
+        # that reading them is just a dictionary lookup.
+        await self.bot.load_tables(self.bot.settings.server_settings, self.bot.settings.mutes)
 
+        for server in self.bot.guilds:
             # Set how long a member should be punished for after unauthorized !mute usage
             self_mute_time = self.bot.read_server_setting(self.bot, server, self.self_mute_time_name)
             if self_mute_time and self_mute_time.isdigit():
@@ -152,89 +146,143 @@ class BanishAndRegion(CogBase):
             else:
                 self.self_mute_time_dict[server.id] = self.default_self_mute_time
 
-    async def unbanish_loop(self, server: Guild) -> None:
-        """Check for people to unbanish every self.banish_interval seconds."""
-        while not self.bot.is_closed():
-            await asyncio.sleep(self.mute_interval_dict[server.id])
+        # Schedule the unmutes of everyone still banished. Those whose time
+        # ran out while we were away are due right away, and are unbanished
+        # (and retried if that fails) by the scheduler like everyone else.
+        for server_id, member_id, voluntary, until in self.bot.settings.mutes.all():
+            if until is not None:
+                self.scheduler.schedule(server_id, member_id, self.bot.db_epoch(until))
 
-            current_time = datetime.datetime.now()
-            server_mutes = mute_db.mdb_fetch(self.bot, self.mdbname, server)
-            mute_role = await self.bot.get_mute_role(server)
-            mute_channel = await self.bot.get_mute_channel(server)
-            unmuted = list()
-
-            for mute in server_mutes:
-                if mute.until is None:
-                    continue
-
-                member = mute.member
-                until = mute.until
-
-                if until < current_time:
-                    diff = self.bot.parse_timedelta(current_time - until)
-                    if diff == "":
-                        diff = "now"
-                    else:
-                        diff = f"{diff} ago"
-
-                    mute_db.mdb_del(self.bot, self.mdbname, member) # Remove from database
-                    if mute_role in member.roles:
-                        try:
-                            await member.remove_roles(mute_role)
-                            # Members are only considered unmuted if they had the antarctica role
-                            unmuted.append(member)
-                        except Exception as e:
-                            print(f"{self.current_time()} {colors.RED_B}Mutes DB:{colors.CYAN} failed to remove " +
-                                f"mute role of{colors.CYAN_B} {member.name}#{member.discriminator} @ {server.name}.\n" +
-                                f"{colors.RED}==> {e}{colors.RESET}")
-
-                    print(f"{self.current_time()} {colors.GREEN_B}Mutes DB:{colors.CYAN} auto-unmuted " +
-                        f"{colors.CYAN_B}{member.name}#{member.discriminator} @ {server.name}." +
-                        f"{colors.YELLOW} (due {diff}){colors.RESET}")
-
-            # Time for some great regrets
-            if len(unmuted) > 0:
-                unmuted = self.mentions_list(unmuted)
-                if len(unmuted) == 1:
-                    await mute_channel.send(
-                        f"It's with great regret that I must inform you all that {unmuted}'s exile has come to an end."
-                    )
-                else:
-                    await mute_channel.send(
-                        f"It's with great regret that I must inform you all that the exile of {unmuted} has come to an end."
-                    )
+        # on_ready may run more than once, but the scheduler only once.
+        if "unmute scheduler" not in self.bot.bg_tasks:
+            self.bot.add_bg_task(self.scheduler.run(), "unmute scheduler")
 
-    @discord.ext.commands.command(name='banishinterval', aliases=['banishint', 'baninterval', 'banint', 'muteinterval', 'muteint'])
-    @discord.ext.commands.check(checks.is_mod)
-    async def _banishinterval(self, ctx, *args):
-        author = ctx.author.mention
-        server = ctx.guild
-        interval = None
+    async def unmute_expired(self, expired: List[Expiry]) -> None:
+        """
+        Unbanish everyone whose banishment has expired, as a single batch.
 
-        # Look for first number in args and use as interval time.
-        for arg in args:
-            if arg.isdigit():
-                interval = int(arg)
-                break
+        The mute roles are removed first, concurrently on every server,
+        limited by the server's role semaphore, and each server gets one
+        announcement. Then the mutes whose role is gone are deleted from
+        the database at once. Mutes whose role couldn't be removed are kept
+        and retried later by the scheduler.
+        """
+        started = time.perf_counter()
+        current_time = datetime.datetime.now()
 
-        if interval is None:
-            await ctx.send(f"{author} You didn't specify a valid interval. Please try again.")
+        # They may have been unbanished or banished anew while waiting.
+        still_expired = list()
+        for server_id, member_id, until in expired:
+            mute = mute_db.mdb_active(self.bot, server_id, member_id)
+            if mute is not None and mute.until == until:
+                still_expired.append((server_id, member_id, until))
 
-        elif interval == self.mute_interval_dict[server.id]:
-            await ctx.send(f"{author} The interval for this server is already set to {interval}.")
+        if not still_expired:
+            return
 
-        elif interval < 5:
-            await ctx.send(f"{author} You greedy little smud you, trying to steal my CPU cycles like that. Minimum interval is 5 seconds.")
+        by_server: Dict[int, List[Expiry]] = dict()
+        for expiry in still_expired:
+            by_server.setdefault(expiry[0], list()).append(expiry)
+
+        results = await asyncio.gather(*[
+            self.unmute_server_expired(server_id, server_expired, current_time)
+            for server_id, server_expired in by_server.items() ])
+        roles_removed = time.perf_counter()
+
+        failed = { key for _, server_failed in results for key in server_failed }
+        keys = [ (server_id, member_id) for server_id, member_id, _ in still_expired
+                 if (server_id, member_id) not in failed ]
+
+        # Remove from database
+        if keys and not await self.bot.database.run(self.bot.settings.mutes.delete_many, keys):
+            failed.update(keys)
+            keys = list()
+
+        for server_id, member_id in failed:
+            self.scheduler.retry(server_id, member_id)
+
+        print(f"{self.current_time()} {colors.GREEN_B}Mutes DB:{colors.CYAN} " +
+              f"auto-unmute batch of {colors.CYAN_B}{len(still_expired)}{colors.CYAN} " +
+              f"mutes on {colors.CYAN_B}{len(by_server)}{colors.CYAN} servers, " +
+              f"{sum(unmuted for unmuted, _ in results)} roles removed, " +
+              f"{len(keys)} deleted, {len(failed)} to retry." +
+              f"{colors.YELLOW} (roles {roles_removed - started:.3f}s, " +
+              f"total {time.perf_counter() - started:.3f}s){colors.RESET}")
+
+    async def unmute_server_expired(
+            self,
+            server_id: int,
+            expired: List[Expiry],
+            current_time: datetime.datetime) -> Tuple[int, List[Tuple[int, int]]]:
+        """
+        Remove the mute role of everyone on a server whose mute has expired.
 
-        else:
-            oldinterval = self.mute_interval_dict[server.id]
-            self.mute_interval_dict[server.id] = interval
-            setting_saved = self.bot.write_server_setting(self.bot, server, self.mute_interval_name, str(interval))
-            if setting_saved:
-                await ctx.send(f"{author} The interval has been changed from {oldinterval} to {interval} seconds.")
+        Returns the number of members who had their role removed, and the
+        server and member IDs of those whose role couldn't be removed.
+        """
+        server = self.bot.get_guild(server_id)
+        if server is None:
+            return 0, list()
+
+        mute_role = self.bot.servertuples[server.id].mute_role
+        members = list()
+        for _, member_id, until in expired:
+            # If they left there's no role to remove.
+            member = server.get_member(member_id)
+            if member is None:
+                continue
+
+            diff = self.bot.parse_timedelta(current_time - until)
+            if diff == "":
+                diff = "now"
+            else:
+                diff = f"{diff} ago"
+
+            print(f"{self.current_time()} {colors.GREEN_B}Mutes DB:{colors.CYAN} auto-unmuted " +
+                  f"{colors.CYAN_B}{member.name}#{member.discriminator} @ {server.name}." +
+                  f"{colors.YELLOW} (due {diff}){colors.RESET}")
+
+            # Members are only considered unmuted if they had the antarctica role
+            if mute_role in member.roles:
+                members.append(member)
+
+        errors = await mute_db.change_mute_roles(
+            self.bot, members, False, self.role_semaphore(server))
+
+        unmuted = list()
+        failed = list()
+        for member, error in zip(members, errors):
+            if error is None:
+                unmuted.append(member)
+            else:
+                failed.append((server.id, member.id))
+                print(f"{self.current_time()} {colors.RED_B}Mutes DB:{colors.CYAN} " +
+                      f"failed to remove mute role of{colors.CYAN_B} " +
+                      f"{member.name}#{member.discriminator} @ {server.name}.\n" +
+                      f"{colors.RED}==> {error}{colors.RESET}")
+
+        # Time for some great regrets
+        if len(unmuted) > 0:
+            mute_channel = await self.bot.get_mute_channel(server)
+            mentions = self.mentions_list(unmuted)
+            if len(unmuted) == 1:
+                await mute_channel.send(
+                    f"It's with great regret that I must inform you all that {mentions}'s exile has come to an end."
+                )
             else:
-                await ctx.send(f"{author} The interval has been changed from {oldinterval} to {interval} seconds, *BUT* " +
-                    f"for some reason I was unable to save this setting, so it will be reset to {oldinterval} once I restart.")
+                await mute_channel.send(
+                    f"It's with great regret that I must inform you all that the exile of {mentions} has come to an end."
+                )
+
+        return len(unmuted), failed
+
+    @discord.ext.commands.command(name='banishinterval', aliases=['banishint', 'baninterval', 'banint', 'muteinterval', 'muteint'])
+    @discord.ext.commands.check(checks.is_mod)
+    async def _banishinterval(self, ctx, *args):
+        # Unmutes are scheduled for the exact time they're due rather than
+        # checked for every so often, so there's no interval to set anymore.
+        await ctx.send(f"{ctx.author.mention} There's no need for an interval anymore, " +
+                       "I unbanish people the very second their time is up.")
 
     @discord.ext.commands.command(name='selfmutetime', aliases=['smt', 'selfmute', 'mutetime'])
     @discord.ext.commands.check(checks.is_mod)
@@ -264,7 +312,8 @@ class BanishAndRegion(CogBase):
         else:
             old_time = self.self_mute_time_dict[server.id]
             self.self_mute_time_dict[server.id] = proposed_time
-            setting_saved = self.bot.write_server_setting(self.bot, server, self.self_mute_time_name, str(proposed_time))
+            setting_saved = await self.bot.database.run(
+                self.bot.write_server_setting, self.bot, server, self.self_mute_time_name, str(proposed_time))
             if setting_saved:
                 await ctx.send(f"{author} The self mute time has been changed from {old_time} to {proposed_time} minutes.")
             else:
@@ -344,12 +393,17 @@ class BanishAndRegion(CogBase):
         else:
             # Working mutes (at user mutes):
             # SINGLE, MULTI, FAIL, FAILS, SINGLE_FAIL, SINGLE_FAILS, MULTI_FAIL, MULTI_FAILS
-            for member in usr:
-                if unmute:
-                    error = await mute_db.carry_out_unbanish(self.bot, self.mdbname, member)
-                else:
-                    error = await mute_db.carry_out_banish(self.bot, self.mdbname, member, end_date)
+            # Everyone's roles are changed at once and their mutes
+            # are written to the database in a single transaction.
+            semaphore = self.role_semaphore(ctx.guild)
+            if unmute:
+                errors = await mute_db.carry_out_unbanish_many(
+                    self.bot, usr, self.scheduler, semaphore)
+            else:
+                errors = await mute_db.carry_out_banish_many(
+                    self.bot, usr, end_date, self.scheduler, semaphore)
 
+            for member, error in zip(usr, errors):
                 if isinstance(error, Exception):
                     fails_list.append(member)
                     if isinstance(error, discord.HTTPException):    http_exception = True
@@ -481,7 +535,8 @@ class BanishAndRegion(CogBase):
         duration = self.bot.parse_timedelta(duration)
 
         # Carry out the banish with resulting end date
-        error = await mute_db.carry_out_banish(self.bot, self.mdbname, author, end_date)
+        error = await mute_db.carry_out_banish(
+            self.bot, author, end_date, self.scheduler, self.role_semaphore(author.guild))
 
         if isinstance(error, Exception):
             if isinstance(error, discord.Forbidden):        error = "**a lack of privilegies**"
@@ -538,7 +593,8 @@ class BanishAndRegion(CogBase):
             else:
                 reply = f"{mention} rolls a headshot on the dice of death! 5 minutes in Antarctica!"
 
-            error = await mute_db.carry_out_banish(self.bot, self.mdbname, member, end_date)
+            error = await mute_db.carry_out_banish(
+                self.bot, member, end_date, self.scheduler, self.role_semaphore(member.guild))
             if isinstance(error, Exception):
                 if isinstance(error, discord.HTTPException):    http_exception = True
                 elif isinstance(error, discord.Forbidden):      forbidden_exception = True
@@ -571,10 +627,9 @@ class BanishAndRegion(CogBase):
         failures_list = list()
         for mention in ctx.message.mentions:
             try:
-                result = region_db.add_blacklist(
+                result = await self.bot.database.run(
+                    region_db.add_blacklist,
                     self.bot,
-                    self.rdbname,
-                    self.blacklist_table,
                     mention)
                 if result: success_list.append(mention)
                 else:      failures_list.append(mention)
@@ -614,10 +669,9 @@ class BanishAndRegion(CogBase):
         failures_list = list()
         for mention in ctx.message.mentions:
             try:
-                result = region_db.remove_blacklist(
+                result = await self.bot.database.run(
+                    region_db.remove_blacklist,
                     self.bot,
-                    self.rdbname,
-                    self.blacklist_table,
                     mention)
 
                 if result: success_list.append(mention)
@@ -654,13 +708,12 @@ class BanishAndRegion(CogBase):
 
     @discord.ext.commands.command(name="blacklistlist")
     async def blacklistlist(self, ctx, *args):
-        result = region_db.fetch_blacklist(
+        result = await self.bot.database.run(
+            region_db.fetch_blacklist,
             self.bot,
-            self.rdbname,
-            self.blacklist_table,
             ctx.guild)
 
-        blacklisted = [ str(ctx.guild.get_member(uid[0])) for uid in result ]
+        blacklisted = [ str(ctx.guild.get_member(uid)) for uid in result ]
         blacklisted = "\n".join(sorted(blacklisted))
         await ctx.send(f"**{ctx.guild.name}** region blacklist:\n{blacklisted}")
 
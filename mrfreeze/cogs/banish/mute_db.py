@@ -1,10 +1,12 @@
+import asyncio
 import discord
 from typing import NamedTuple
+from typing import Optional
 
 from discord import Member
 from datetime import datetime
 
-from mrfreeze.colors import CYAN, CYAN_B, GREEN, GREEN_B, RED, RED_B, YELLOW, RESET
+from mrfreeze.colors import CYAN, CYAN_B, GREEN, GREEN_B, RED_B, YELLOW, RESET
 
 class BanishTuple(NamedTuple):
     member: Member
@@ -12,80 +14,123 @@ class BanishTuple(NamedTuple):
     until: datetime
 
 
-# Complete list of tables and their rows in this database.
-# (These are created via the banish cog)
-#
-# Primary key(s) is marked with an asterisk (*).
-# Mandatory but not primary keys are marked with a pling (!).
-# TABLE         ROWS        TYPE        FUNCTION
-# self.mdbname  id*         integer     User ID
-#               server*     integer     Server ID
-#               voluntary!  boolean     If this mute was self-inflicted or not
-#               until       date        The date when the user will be unbanned
-#                                       Leave empty if indefinite
-async def carry_out_banish(bot, mdbname, member, end_date):
+class ActiveMute(NamedTuple):
+    voluntary: bool
+    until: Optional[datetime]
+
+
+# Mutes are stored in the mutes table of the settings database,
+# see mrfreeze/database/tables/mutes.py. Rows are kept in memory
+# keyed by (server, member) and indexed by server, writes go to the
+# database first and then to memory. None of these functions query
+# the database except to write changes to it.
+def mdb_active(bot, server_id, member_id):
+    """Look up a member's active mute in memory.
+    Return an ActiveMute, or None if they're not muted."""
+    entry = bot.settings.mutes.get(server_id, member_id)
+    if entry is None:
+        return None
+    return ActiveMute(voluntary=bool(entry[2]), until=bot.db_epoch(entry[3]))
+
+
+async def carry_out_banish(bot, member, end_date, scheduler=None, semaphore=None):
     """Add the antarctica role to a user, then add them to the db.
+    If a scheduler is given their unmute is scheduled with it.
     Return None if successful, Exception otherwise."""
-    server = member.guild
-    roles = member.roles
-    mute_role = bot.servertuples[server.id].mute_role
-    result = None
+    results = await carry_out_banish_many(bot, [ member ], end_date, scheduler, semaphore)
+    return results[0]
 
-    if mute_role not in roles:
-        try:
-            await member.add_roles(mute_role)
-        except Exception as e:
-            result = e
 
-    if not isinstance(result, Exception):
-        mdb_add(bot, mdbname, member, end_date=end_date)
+async def carry_out_banish_many(bot, members, end_date, scheduler=None, semaphore=None):
+    """Add the antarctica role to several users of a server at once, then
+    add all of them to the db in a single transaction.
+    If a scheduler is given their unmutes are scheduled with it.
+    Return a list with None for each success, the Exception otherwise."""
+    results = await change_mute_roles(bot, members, True, semaphore)
+    banished = [ member for member, result in zip(members, results) if result is None ]
+
+    if banished:
+        await bot.database.run(mdb_add_many, bot, banished, end_date=end_date)
+
+    for member in banished:
+        # The mute may have been prolonged, so schedule whatever was stored.
+        mute = mdb_active(bot, member.guild.id, member.id)
+        if scheduler is not None and mute is not None:
+            scheduler.schedule(member.guild.id, member.id, mute.until)
 
-    return result
+    return results
 
 
-async def carry_out_unbanish(bot, mdbname, member):
+async def carry_out_unbanish(bot, member, scheduler=None, semaphore=None):
     """Remove the antarctica role from a user, then remove them from the db.
+    If a scheduler is given their scheduled unmute is cancelled.
     Return None if successful, Exception otherwise."""
-    server = member.guild
-    roles = member.roles
-    mute_role = bot.servertuples[server.id].mute_role
-    result = None
+    results = await carry_out_unbanish_many(bot, [ member ], scheduler, semaphore)
+    return results[0]
+
+
+async def carry_out_unbanish_many(bot, members, scheduler=None, semaphore=None):
+    """Remove the antarctica role from several users of a server at once,
+    then remove all of them from the db in a single transaction.
+    If a scheduler is given their scheduled unmutes are cancelled.
+    Return a list with None for each success, the Exception otherwise."""
+    results = await change_mute_roles(bot, members, False, semaphore)
+    unbanished = [ member for member, result in zip(members, results) if result is None ]
+
+    # Members who aren't in the index have nothing to remove from the db.
+    muted = [ member for member in unbanished
+              if mdb_active(bot, member.guild.id, member.id) is not None ]
+    if muted:
+        await bot.database.run(mdb_del_many, bot, muted)
+
+    if scheduler is not None:
+        for member in unbanished:
+            scheduler.cancel(member.guild.id, member.id)
+
+    return results
+
+
+async def change_mute_roles(bot, members, add, semaphore=None):
+    """Add or remove the antarctica role of several users concurrently.
+    At most as many role changes as the semaphore allows are in flight at
+    a time, without one they're all made at once.
+    Return a list with None for each success, the Exception otherwise."""
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(len(members), 1))
+
+    async def change(member):
+        mute_role = bot.servertuples[member.guild.id].mute_role
+        if add == (mute_role in member.roles):
+            return None
 
-    if mute_role in roles:
         try:
-            await member.remove_roles(mute_role)
+            async with semaphore:
+                if add:
+                    await member.add_roles(mute_role)
+                else:
+                    await member.remove_roles(mute_role)
         except Exception as e:
-            result = e
+            return e
 
-    if not isinstance(result, Exception):
-        mdb_del(bot, mdbname, member)
+        return None
 
-    return result
+    return await asyncio.gather(*[ change(member) for member in members ])
 
 
-def mdb_add(bot, mdbname, user, voluntary=False, end_date=None, prolong=True):
-    """Add a new user to the mutes database."""
+def mdb_row(bot, user, voluntary=False, end_date=None, prolong=True):
+    """Work out the row to store in the mutes database for a user,
+    prolonging their current mute if they have one.
+    Return the row and the date the mute ends."""
     is_member = isinstance(user, discord.Member)
     if not is_member:
         # This should never happen, no point in even logging it.
         raise TypeError(f"Expected discord.Member, got {type(user)}")
 
-    uid = user.id
-    server = user.guild.id
-    servername = user.guild.name
-    name = f"{user.name}#{user.discriminator}"
-    error = None
-    until = str()     # this string is filled in if called with an end_date
-    duration = str()  # this string too
-
-    current_mute = mdb_fetch(bot, mdbname, user)
-    is_muted = len(current_mute) != 0
-    if is_muted:
-        # Always delete existing mutes
-        mdb_del(bot, mdbname, user)
+    current_mute = mdb_active(bot, user.guild.id, user.id)
+    is_muted = current_mute is not None
 
     if is_muted and end_date is not None and prolong:
-        old_until = current_mute[0].until
+        old_until = current_mute.until
         # if current mute is permanent just replace it with a timed one
         if old_until is not None:
             diff = end_date - datetime.now()
@@ -94,82 +139,86 @@ def mdb_add(bot, mdbname, user, voluntary=False, end_date=None, prolong=True):
             except OverflowError:
                 end_date = datetime.max
 
-    with bot.db_connect(bot, mdbname) as conn:
-        c = conn.cursor()
-        if end_date is not None:
-            # Collect time info in string format for the log
-            until = bot.db_time(end_date)
-            until = f"\n{GREEN}==> Until: {until} {RESET}"
+    # Turn datetime object into seconds since the epoch
+    row = {
+        "server": user.guild.id,
+        "member": user.id,
+        "voluntary": voluntary,
+        "until": bot.db_epoch(end_date)
+    }
+    return row, end_date
 
-            duration = end_date - datetime.now()
-            duration = bot.parse_timedelta(duration)
-            duration = f"{YELLOW}(in {duration}){RESET}"
 
-            # Turn datetime object into string
-            end_date = bot.db_time(end_date)
+def mdb_add(bot, user, voluntary=False, end_date=None, prolong=True):
+    """Add a new user to the mutes database."""
+    return mdb_add_many(bot, [ user ], voluntary, end_date, prolong)
 
-            sql = (f"INSERT INTO {mdbname}(id, server, voluntary, until) " +
-                   "VALUES(?,?,?,?)")
 
-            try:
-                c.execute(sql, (uid, server, voluntary, end_date))
-            except Exception as e:
-                error = e
+def mdb_add_many(bot, users, voluntary=False, end_date=None, prolong=True):
+    """Add several users to the mutes database in a single transaction."""
+    rows = [ mdb_row(bot, user, voluntary, end_date, prolong) for user in users ]
 
-        elif end_date is None:
-            sql = (f"INSERT INTO {mdbname}(id, server, voluntary) " +
-                   "VALUES(?,?,?)")
-            try:
-                c.execute(sql, (uid, server, voluntary))
-            except Exception as e:
-                error = e
-
-    if error == None:
-        print(f"{bot.current_time()} {GREEN_B}Mutes DB:{CYAN} added user to DB: " +
-                f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}{until}{duration}")
-        return True
-
-    else:
-        print(f"{bot.current_time()} {RED_B}Mutes DB:{CYAN} failed adding to DB: " +
-                f"{CYAN_B}{name} @ {servername}{CYAN}:" +
-                f"\n{RED}==> {error}{RESET}")
-        return False
-
-def mdb_del(bot, mdbname, user):
-    """Removes a user from the mutes database."""
-    is_member = isinstance(user, discord.Member)
-    if not is_member:
-        # This should never happen, no point in even logging it.
-        raise TypeError(f"Expected discord.Member, got {type(user)}")
+    # Existing mutes are always replaced
+    success = bot.settings.mutes.update_many([ row for row, _ in rows ], accept_none=True)
 
-    uid = user.id
-    server = user.guild.id
-    servername = user.guild.name
-    name = f"{user.name}#{user.discriminator}"
+    for user, (_, user_end_date) in zip(users, rows):
+        name = f"{user.name}#{user.discriminator}"
+        servername = user.guild.name
+        until = str()     # this string is filled in if called with an end_date
+        duration = str()  # this string too
 
-    is_muted = len(mdb_fetch(bot, mdbname, user)) != 0
-    if not is_muted:
-        print(f"{bot.current_time()} {GREEN_B}Mutes DB:{CYAN} user already not in DB: " +
-            f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}")
-        return True
+        if user_end_date is not None:
+            # Collect time info in string format for the log
+            until = bot.db_time(user_end_date)
+            until = f"\n{GREEN}==> Until: {until} {RESET}"
 
-    with bot.db_connect(bot, mdbname) as conn:
-        c = conn.cursor()
-        sql = f"DELETE FROM {mdbname} WHERE id = ? AND server = ?"
+            duration = user_end_date - datetime.now()
+            duration = bot.parse_timedelta(duration)
+            duration = f"{YELLOW}(in {duration}){RESET}"
 
-        try:
-            c.execute(sql, (uid, server))
+        if success:
+            print(f"{bot.current_time()} {GREEN_B}Mutes DB:{CYAN} added user to DB: " +
+                    f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}{until}{duration}")
+        else:
+            print(f"{bot.current_time()} {RED_B}Mutes DB:{CYAN} failed adding to DB: " +
+                    f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}")
+
+    return success
+
+def mdb_del(bot, user):
+    """Removes a user from the mutes database."""
+    return mdb_del_many(bot, [ user ])
+
+def mdb_del_many(bot, users):
+    """Removes several users from the mutes database in a single transaction."""
+    for user in users:
+        if not isinstance(user, discord.Member):
+            # This should never happen, no point in even logging it.
+            raise TypeError(f"Expected discord.Member, got {type(user)}")
+
+    keys = [ (user.guild.id, user.id) for user in users ]
+    muted = { key for key in keys if bot.settings.mutes.contains(*key) }
+    success = True
+    if muted:
+        success = bot.settings.mutes.delete_many(list(muted))
+
+    for user, key in zip(users, keys):
+        name = f"{user.name}#{user.discriminator}"
+        servername = user.guild.name
+
+        if key not in muted:
+            print(f"{bot.current_time()} {GREEN_B}Mutes DB:{CYAN} user already not in DB: " +
+                f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}")
+        elif success:
             print(f"{bot.current_time()} {GREEN_B}Mutes DB:{CYAN} removed user from DB: " +
                 f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}")
-            return True
-
-        except Exception as error:
+        else:
             print(f"{bot.current_time()} {RED_B}Mutes DB:{CYAN} failed to remove from DB: " +
-                f"{CYAN_B}{name} @ {servername}{CYAN}:" +
-                f"\n{RED}==> {error}{RESET}")
-            return False
+                f"{CYAN_B}{name} @ {servername}{CYAN}.{RESET}")
+
+    return success
 
-def mdb_fetch(bot, mdbname, in_data):
+def mdb_fetch(bot, in_data):
     """If input is a server, return a list of all users from that server in the database.
     If input is a member, return what we've got on that member."""
     is_member = isinstance(in_data, discord.Member)
@@ -179,26 +228,18 @@ def mdb_fetch(bot, mdbname, in_data):
         # This should never happen, no point in even logging it.
         raise TypeError(f"Expected discord.Member or discord.Guild, got {type(in_data)}")
 
-    with bot.db_connect(bot, mdbname) as conn:
-        c = conn.cursor()
-        fetch_id = in_data.id
-        if is_member:
-            server = in_data.guild
-            sql = f' SELECT * FROM {mdbname} WHERE id = ? AND server = ? '
-            c.execute(sql, (fetch_id, server.id))
-
-        elif is_server:
-            server = in_data
-            sql = f' SELECT * FROM {mdbname} WHERE server = ? '
-            c.execute(sql, (fetch_id,))
-
-        output = [
-            BanishTuple(
-                member = discord.utils.get(server.members, id=int(entry[0])),
-                voluntary = bool(entry[2]),
-                until = bot.db_time(entry[3])
-            )
-            for entry in c.fetchall()
-        ]
-
-    return output
+    if is_member:
+        mute = mdb_active(bot, in_data.guild.id, in_data.id)
+        if mute is None:
+            return list()
+        return [ BanishTuple(member=in_data, voluntary=mute.voluntary, until=mute.until) ]
+
+    server = in_data
+    return [
+        BanishTuple(
+            member = server.get_member(int(entry[1])),
+            voluntary = bool(entry[2]),
+            until = bot.db_epoch(entry[3])
+        )
+        for entry in bot.settings.mutes.find("server", server.id)
+    ]
@@ -4,22 +4,12 @@ from discord import Guild
 from discord import Member
 
 from mrfreeze.bot import MrFreeze
-from mrfreeze.dbfunctions import db_connect
 from mrfreeze.colors import CYAN, CYAN_B, GREEN, GREEN_B, RED, RED_B, YELLOW, RESET
 
-# Complete list of tables and their rows in this database.
-# (These are created via the banish cog)
-#
-# Primary key(s) is marked with an asterisk (*).
-# Mandatory but not primary keys are marked with a pling (!).
-# TABLE                 ROWS       TYPE     FUNCTION
-# self.region_table     role*      integer  Role ID
-#                       server*    integer  Server ID
-#                       triggers!  string   String of keywords for region
-# self.blacklist_table  uid*       integer  User ID
-#                       sid*       integer  Server ID
+# The blacklist is stored in the region_blacklist table of the settings
+# database, see mrfreeze/database/tables/region_blacklist.py.
 
-def add_blacklist(bot: MrFreeze, dbfile: str, dbtable: str, member: Member) -> bool:
+def add_blacklist(bot: MrFreeze, member: Member) -> bool:
     """
     Add a member to the region blacklist.
 
@@ -27,16 +17,14 @@ def add_blacklist(bot: MrFreeze, dbfile: str, dbtable: str, member: Member) -> b
     region via commands, but they may still use it for Antarctica.
     """
     server = member.guild
-    error = None
+    blacklist = bot.settings.region_blacklist
 
-    with db_connect(bot, dbfile) as conn:
-        c = conn.cursor()
-        sql = (f"INSERT INTO {dbtable} (uid, sid) VALUES (?,?)")
-
-        try:
-            c.execute(sql, (member.id, server.id))
-        except Exception as e:
-            error = e
+    if blacklist.contains(server.id, member.id):
+        error = "already blacklisted"
+    elif not blacklist.upsert((server.id, member.id), tuple()):
+        error = "failed to write to database"
+    else:
+        error = None
 
     if error == None:
         print(f"{bot.current_time()} {GREEN_B}Region DB:{CYAN} added user to blacklist: " +
@@ -48,7 +36,7 @@ def add_blacklist(bot: MrFreeze, dbfile: str, dbtable: str, member: Member) -> b
               f"\n{RED}==> {error}{RESET}")
         return False
 
-def remove_blacklist(bot: MrFreeze, dbfile: str, dbtable: str, member: Member) -> bool:
+def remove_blacklist(bot: MrFreeze, member: Member) -> bool:
     """
     Remove a member from the region blacklist.
 
@@ -56,51 +44,28 @@ def remove_blacklist(bot: MrFreeze, dbfile: str, dbtable: str, member: Member) -
     to change their region via commands, including Antarctica.
     """
     server = member.guild
-    error = None
-
-    with bot.db_connect(bot, dbfile) as conn:
-        c = conn.cursor()
-        sql = (f"DELETE FROM {dbtable} WHERE sid = ? AND uid = ?")
 
-        try:
-            c.execute(sql, (server.id, member.id))
-        except Exception as e:
-            error = e
-
-    if error == None:
+    if bot.settings.region_blacklist.delete(server.id, member.id):
         print(f"{bot.current_time()} {GREEN_B}Region DB:{CYAN} removed user from blacklist: " +
               f"{CYAN_B}{member} @ {server.name}{CYAN}.{RESET}")
         return True
     else:
         print(f"{bot.current_time()} {RED_B}Region DB:{CYAN} failed to remove user from blacklist: " +
-              f"{CYAN_B}{member} @ {server.name}{CYAN}.{RESET}" +
-              f"\n{RED}==> {error}{RESET}")
+              f"{CYAN_B}{member} @ {server.name}{CYAN}.{RESET}")
         return False
 
 
-def fetch_blacklist(bot: MrFreeze, dbfile: str, dbtable: str, server: Guild) -> List[int]:
+def fetch_blacklist(bot: MrFreeze, server: Guild) -> List[int]:
     """
     Get a list of all members who are blacklisted on a given server.
 
     Fetch all the users blacklisted in a given server and return them as a list.
     """
-    error = None
-
-    with bot.db_connect(bot, dbfile) as conn:
-        c = conn.cursor()
-        sql = (f"SELECT uid FROM {dbtable} WHERE sid = ?")
-
-        try:
-            c.execute(sql, (server.id,))
-        except Exception as e:
-            error = e
-
-        if error == None:
-            print(f"{bot.current_time()} {GREEN_B}Region DB:{CYAN} fetched blacklist for server: " +
-                  f"{CYAN_B}{server.name}{CYAN}.{RESET}")
-            return c.fetchall()
-        else:
-            print(f"{bot.current_time()} {RED_B}Region DB:{CYAN} failed to fetch blacklist for server: " +
-                  f"{CYAN_B}{server.name}{CYAN}:" +
-                  f"\n{RED}==> {error}{RESET}")
-            return list()
+    if not bot.settings.region_blacklist.ensure_loaded():
+        print(f"{bot.current_time()} {RED_B}Region DB:{CYAN} failed to fetch blacklist for server: " +
+              f"{CYAN_B}{server.name}{CYAN}.{RESET}")
+        return list()
+
+    print(f"{bot.current_time()} {GREEN_B}Region DB:{CYAN} fetched blacklist for server: " +
+          f"{CYAN_B}{server.name}{CYAN}.{RESET}")
+    return [ row[1] for row in bot.settings.region_blacklist.find("server", server.id) ]
@@ -0,0 +1,172 @@
+"""
+Scheduler for automatic unmutes.
+
+Rather than polling every server for expired mutes every few seconds, all
+timed mutes go into a single min-heap keyed on when they expire. The
+scheduler sleeps until the earliest one is due, hands every mute that has
+expired to a handler, and goes back to sleep. Whenever a mute is added,
+changed or removed the scheduler is re-armed, so it never sleeps past a
+new earlier expiry and servers without timed mutes cost nothing.
+
+Heap entries are never removed when a mute changes. Instead the current
+expiry of every mute is kept in a dictionary, and entries that don't match
+it are skipped when they reach the top of the heap.
+
+Unmutes handed to the handler are kept as running until it returns. If
+the handler raises, or gives up on an unmute with retry, the unmute is
+scheduled again after a delay which doubles with every failure in a row.
+Unmutes that are cancelled or rescheduled while running aren't retried.
+The heap and deadlines hold when an unmute is due, which is a retry's time
+rather than the mute's. The handler is always given the time the mute
+ends, which is kept in expiries.
+"""
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from datetime import timedelta
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+Key = Tuple[int, int]
+Expiry = Tuple[int, int, datetime]
+ExpiryHandler = Callable[[List[Expiry]], Awaitable[None]]
+
+
+class UnmuteScheduler:
+    """Keep track of when mutes expire, and call a handler when they do."""
+
+    def __init__(
+        self,
+        handler: ExpiryHandler,
+        retry_delay: float = 30,
+        max_retry_delay: float = 3600
+    ) -> None:
+        self.handler = handler
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.heap: List[Tuple[datetime, Key]] = list()
+        self.deadlines: Dict[Key, datetime] = dict()
+        self.expiries: Dict[Key, datetime] = dict()
+        self.running: Dict[Key, datetime] = dict()
+        self.failures: Dict[Key, int] = dict()
+        self.rearm = asyncio.Event()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def __len__(self) -> int:
+        """Get the number of scheduled unmutes."""
+        return len(self.deadlines)
+
+    def schedule(self, guild_id: int, member_id: int, until: Optional[datetime]) -> None:
+        """Schedule a member's unmute, replacing any earlier one. None means never."""
+        key = (guild_id, member_id)
+        if until is None:
+            self.cancel(guild_id, member_id)
+            return
+
+        self.running.pop(key, None)
+        self.failures.pop(key, None)
+        self.expiries[key] = until
+        self.push(key, until)
+
+    def push(self, key: Key, due: datetime) -> None:
+        """Put an unmute due at due on the heap, waking the scheduler if it's the earliest."""
+        self.deadlines[key] = due
+        heapq.heappush(self.heap, (due, key))
+        self.compact()
+
+        # Only a new earliest deadline changes how long to sleep.
+        if self.heap[0] == (due, key):
+            self.rearm.set()
+
+    def cancel(self, guild_id: int, member_id: int) -> None:
+        """Cancel a member's scheduled unmute, if there is one."""
+        key = (guild_id, member_id)
+        self.deadlines.pop(key, None)
+        self.expiries.pop(key, None)
+        self.running.pop(key, None)
+        self.failures.pop(key, None)
+        self.compact()
+
+    def retry(self, guild_id: int, member_id: int) -> None:
+        """Schedule a running unmute that failed again, backing off on every failure."""
+        key = (guild_id, member_id)
+        until = self.running.pop(key, None)
+        if until is None:
+            # Cancelled or rescheduled since it was handed out.
+            return
+
+        failures = self.failures.get(key, 0) + 1
+        self.failures[key] = failures
+        delay = min(self.retry_delay * 2 ** (failures - 1), self.max_retry_delay)
+        self.logger.warning(
+            f"Unmute of {member_id} on {guild_id} failed {failures} times, retrying in {delay}s")
+        self.expiries[key] = until
+        self.push(key, datetime.now() + timedelta(seconds=delay))
+
+    def finish(self, expired: List[Expiry]) -> None:
+        """Forget the running unmutes the handler is done with."""
+        for guild_id, member_id, until in expired:
+            key = (guild_id, member_id)
+            if self.running.get(key) == until:
+                del self.running[key]
+                self.failures.pop(key, None)
+
+    def compact(self) -> None:
+        """Rebuild the heap once most of its entries are stale."""
+        if len(self.heap) > 2 * len(self.deadlines) + 64:
+            self.heap = [ (due, key) for key, due in self.deadlines.items() ]
+            heapq.heapify(self.heap)
+
+    def next_deadline(self) -> Optional[datetime]:
+        """Get when the next unmute is due, dropping stale entries on the way."""
+        while self.heap:
+            due, key = self.heap[0]
+            if self.deadlines.get(key) == due:
+                return due
+            heapq.heappop(self.heap)
+        return None
+
+    def pop_due(self, now: datetime) -> List[Expiry]:
+        """Remove and return every unmute due at or before now, marking them as running."""
+        due: List[Expiry] = list()
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                return due
+
+            _, key = heapq.heappop(self.heap)
+            del self.deadlines[key]
+            until = self.expiries.pop(key)
+            self.running[key] = until
+            due.append(key + (until,))
+
+    async def run(self) -> None:
+        """Sleep until the next unmute is due, hand it to the handler, repeat forever."""
+        while True:
+            self.rearm.clear()
+            due = self.pop_due(datetime.now())
+            if due:
+                try:
+                    await self.handler(due)
+                except Exception as e:
+                    self.logger.error(f"Unmute handler failed for {len(due)} mutes: {e}")
+                    for guild_id, member_id, _ in due:
+                        self.retry(guild_id, member_id)
+                self.finish(due)
+                continue
+
+            deadline = self.next_deadline()
+            timeout = None
+            if deadline is not None:
+                timeout = max((deadline - datetime.now()).total_seconds(), 0)
+
+            try:
+                await asyncio.wait_for(self.rearm.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
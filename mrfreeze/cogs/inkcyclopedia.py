@@ -1,8 +1,10 @@
+import asyncio
 import csv
 import logging
 import os
 import re
-from typing import List, NamedTuple, Optional, Pattern, Set
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Set, Tuple
 
 from airtable.airtable import Airtable
 
@@ -13,9 +15,26 @@ from discord.ext.commands.context import Context
 from mrfreeze import checks
 from mrfreeze.bot import MrFreeze
 from mrfreeze.colors import CYAN, MAGENTA_B, RESET
+from mrfreeze.database.tables.inkcyclopedia import InkRecord
+from mrfreeze.database.tables.inkcyclopedia import InkRow
+from mrfreeze.database.tables.inkcyclopedia import InkcyclopediaInks
 
 from .cogbase import CogBase
 
+# The regex parser is private and has moved before, so InkMatcher
+# falls back to a full scan of all inks if it can't be imported.
+try:
+    # Python 3.11+
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:
+    try:
+        import sre_constants
+        import sre_parse
+    except ImportError:
+        sre_constants = None
+        sre_parse = None
+
 
 # Small cog listening to all incoming messages looking for mentions of inks.
 # Based on The Inkcyclopedia by klundtasaur:
@@ -33,19 +52,157 @@ class InkyTuple(NamedTuple):
     regex: Pattern[str]
 
 
+class InkMatcher:
+    """
+    Index for quickly finding the ink matching a term.
+
+    Running every ink regex over every term gets slow as the number of inks
+    grows. Instead the index looks for a run of literal characters that any
+    match of an ink regex has to contain, and files the ink under the first
+    three letters (the trigram) of that run. Only inks filed under one of the
+    trigrams of the term, and inks without a usable literal, are candidates.
+
+    Inks have a fixed priority given by the order they were added in, and
+    the candidate with the highest priority whose regex matches is returned.
+    Replacing an ink keeps its priority, so the index can be patched in place.
+    """
+
+    trigram_length = 3
+
+    def __init__(self, inks: Iterable[InkyTuple] = ()) -> None:
+        # Removed inks leave a None behind so the priorities don't shift.
+        self.inks: List[Optional[InkyTuple]] = list()
+        self.names: Dict[str, int] = dict()
+        self.trigrams: Dict[str, List[int]] = dict()
+        self.unindexed: List[int] = list()
+
+        for ink in inks:
+            self.add(ink)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, ink: InkyTuple) -> None:
+        """
+        Add an ink to the index.
+
+        A new ink gets lower priority than all existing inks, an ink
+        replacing one with the same name takes over its priority.
+        """
+        index = self.names.get(ink.name)
+        if index is None:
+            index = len(self.inks)
+            self.inks.append(ink)
+            self.names[ink.name] = index
+        else:
+            self.unfile(index)
+            self.inks[index] = ink
+
+        literal = self.required_literal(ink.regex)
+        if len(literal) < self.trigram_length:
+            self.unindexed.append(index)
+        else:
+            trigram = literal[:self.trigram_length]
+            self.trigrams.setdefault(trigram, list()).append(index)
+
+    def remove(self, name: str) -> None:
+        """Remove the ink with the given name from the index, if it's there."""
+        index = self.names.pop(name, None)
+        if index is not None:
+            self.unfile(index)
+            self.inks[index] = None
+
+    def unfile(self, index: int) -> None:
+        """Remove the ink at index from the trigram it's filed under."""
+        ink = self.inks[index]
+        literal = self.required_literal(ink.regex)
+        if len(literal) < self.trigram_length:
+            self.unindexed.remove(index)
+        else:
+            self.trigrams[literal[:self.trigram_length]].remove(index)
+
+    def match(self, term: str) -> Optional[InkyTuple]:
+        """Get the highest priority ink matching term, if any."""
+        term_lower = term.lower()
+        candidates: Set[int] = set(self.unindexed)
+        for start in range(len(term_lower) - self.trigram_length + 1):
+            trigram = term_lower[start:start + self.trigram_length]
+            candidates.update(self.trigrams.get(trigram, ()))
+
+        for index in sorted(candidates):
+            ink = self.inks[index]
+            if ink.regex.search(term):
+                return ink
+
+        return None
+
+    @staticmethod
+    def required_literal(regex: Pattern[str]) -> str:
+        """
+        Find the longest run of literal characters every match of regex contains.
+
+        Only the top level of the regex is considered, everything there has to
+        match for the regex to match. Anything but plain literals (groups,
+        repeats, character classes etc.) breaks the run.
+
+        If the regex can't be parsed the literal is empty, leaving the
+        ink unindexed so it's always a candidate.
+        """
+        if sre_parse is None:
+            return ""
+
+        longest = ""
+        current: List[str] = list()
+        try:
+            for op, value in sre_parse.parse(regex.pattern, regex.flags):
+                if op == sre_constants.LITERAL:
+                    current.append(chr(value).lower())
+                    continue
+
+                if len(current) > len(longest):
+                    longest = "".join(current)
+                current = list()
+        except Exception:
+            return ""
+
+        if len(current) > len(longest):
+            longest = "".join(current)
+        return longest
+
+
 class Inkcyclopedia(CogBase):
     """Type an ink inside {curly brackets} and I'll tell you what it looks like."""
 
     def __init__(self, bot: MrFreeze) -> None:
         self.bot: MrFreeze = bot
 
-        self.inkydb:     Set[InkyTuple] = set()
-        self.inkdb_path: str = f"{bot.db_prefix}/inkcyclopedia.csv"
-        self.inkdb_enc:  str = "utf-8-sig"
+        self.inkydb:     InkMatcher = InkMatcher()
         self.airtable:   Optional[Airtable] = None
         self.bracketmatch = re.compile(r"[{]([\w\-\s]+)[}]")
         self.logger = logging.getLogger(self.__class__.__name__)
 
+        # Only one Airtable sync at a time.
+        self.sync_lock = asyncio.Lock()
+
+        # Compiled inks by content hash, so inks that haven't
+        # changed don't need to be compiled again on refresh.
+        self.compiled: Dict[str, InkyTuple] = dict()
+
+        # Inks used to be stored in a CSV file, which is imported
+        # into the database if the ink table is empty.
+        self.inkdb_path: str = f"{bot.db_prefix}/inkcyclopedia.csv"
+        self.inkdb_enc:  str = "utf-8-sig"
+
+        # Most recently looked up terms and the ink they matched, if any.
+        self.cache_size = 512
+        self.cache: "OrderedDict[str, Optional[InkyTuple]]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # Only messages with curly brackets can contain ink requests.
+        self.bot.scanner.register(
+            "inkcyclopedia", r"[{]", self.handle_message, pattern=self.bracketmatch)
+
         # File config/airtable should have format:
         # base = <your base id here>
         # table = <your table name here>
@@ -65,17 +222,29 @@ class Inkcyclopedia(CogBase):
             logmsg += "The Inkcyclopedia will not be able to update."
             self.logger.error(logmsg)
 
+    def cog_unload(self) -> None:
+        """Remove the trigger from the message scanner."""
+        self.bot.scanner.unregister("inkcyclopedia")
+
+    @property
+    def table(self) -> InkcyclopediaInks:
+        """Get the database table the inks are stored in."""
+        return self.bot.settings.inkcyclopedia
+
     @CogBase.listener()
     async def on_ready(self) -> None:
         """
         Prepare the Inkcyclopedia when the bot is ready.
 
-        Fetch inks if database does not exist.
+        If the ink table is empty, import the old ink file or fetch inks.
         Update db (loading the inks into memory).
         Then print status.
         """
-        if not os.path.isfile(self.inkdb_path):
-            await self.fetch_inks()
+        if await self.bot.database.run(self.table.is_empty):
+            if os.path.isfile(self.inkdb_path):
+                await self.bot.database.run(self.import_csv)
+            else:
+                await self.fetch_inks()
 
         await self.update_db()
 
@@ -84,53 +253,204 @@ class Inkcyclopedia(CogBase):
         status += f"{MAGENTA_B}{len(self.inkydb)} inks{CYAN}!{RESET}"
         self.logger.info(status)
 
-    async def fetch_inks(self) -> None:
-        """Fetch the latest version of the Inkcyclopedia from Airtable."""
-        with open(self.inkdb_path, "w", encoding=self.inkdb_enc) as inkfile:
-            # Abort if self.airtable is not set.
-            if self.airtable is not None:
-                fetch = self.airtable.get_all()
+    def import_csv(self) -> None:
+        """Import inks from the ink file used before inks were kept in the database."""
+        with open(self.inkdb_path, encoding=self.inkdb_enc) as inkfile:
+            inks = [ (row[0], row[2], row[1]) for row in csv.reader(inkfile) ]
+
+        if self.table.replace_all(inks):
+            self.logger.info(
+                f"{CYAN}Imported {MAGENTA_B}{len(inks)} inks {CYAN}from {self.inkdb_path}{RESET}")
+
+    async def fetch_inks(self) -> bool:
+        """
+        Fetch the latest version of the Inkcyclopedia from Airtable.
+
+        The download blocks, so it's run in an executor to keep the bot
+        responsive, and the inks are then written on the database worker.
+        Returns True if the inks were updated, False if Airtable isn't
+        configured or the sync failed.
+        """
+        # Abort if self.airtable is not set.
+        if self.airtable is None:
+            return False
+
+        async with self.sync_lock:
+            loop = asyncio.get_event_loop()
+            try:
+                inks = await loop.run_in_executor(None, self.download_inks)
+            except Exception as e:
+                self.logger.error(f"Failed to fetch inks from Airtable: {e}")
+                return False
+
+            return await self.bot.database.run(self.table.replace_all, inks)
+
+    def download_inks(self) -> List[InkRecord]:
+        """
+        Download all usable inks from Airtable.
+
+        Records are processed a page at a time as they arrive. Nothing is
+        written until every page has been downloaded, and then everything is
+        written in a single transaction, so a failed download never leaves
+        the table half updated.
+        """
+        inks: List[InkRecord] = list()
+        for page in self.airtable.get_iter():
+            for record in page:
+                ink = self.parse_record(record)
+                if ink is not None:
+                    inks.append(ink)
+
+        return inks
+
+    async def fetch_changes(self) -> Optional[Tuple[List[InkRow], List[str]]]:
+        """
+        Fetch only the inks that changed since the last sync from Airtable.
+
+        Returns the rows that were written and the names of the inks that were
+        removed, or None if a full sync is needed instead. That's the case when
+        Airtable isn't configured, when no ink has a modification stamp yet, or
+        when the sync failed.
+        """
+        if self.airtable is None:
+            return None
+
+        async with self.sync_lock:
+            since = await self.bot.database.run(self.table.last_modified)
+            if since is None:
+                return None
+
+            loop = asyncio.get_event_loop()
+            try:
+                changed, removed = await loop.run_in_executor(
+                    None, self.download_changes, since)
+            except Exception as e:
+                self.logger.error(f"Failed to fetch changed inks from Airtable: {e}")
+                return None
+
+            return await self.bot.database.run(self.table.apply_changes, changed, removed)
+
+    def download_changes(self, since: str) -> Tuple[List[InkRecord], List[str]]:
+        """
+        Download the inks modified after since from Airtable.
+
+        Airtable filters the records, so only records modified after the most
+        recent stamp in the table are downloaded. Returns the usable records,
+        and the IDs of records that are no longer usable and should be removed.
+        Records deleted from Airtable can't be detected this way, they
+        disappear on the next full sync.
+        """
+        # Filter on the same field the stamps are taken from, so the
+        # comparison is always between two values of the same field.
+        since = since.replace("'", "")
+        formula = f"IS_AFTER({{Last Modified}}, DATETIME_PARSE('{since}'))"
+        changed: List[InkRecord] = list()
+        removed: List[str] = list()
+        for page in self.airtable.get_iter(formula=formula):
+            for record in page:
+                ink = self.parse_record(record)
+                if ink is not None:
+                    changed.append(ink)
+                elif "id" in record:
+                    removed.append(record["id"])
+
+        return changed, removed
+
+    def parse_record(self, record: Dict) -> Optional[InkRecord]:
+        """
+        Turn an Airtable record into an InkRecord, if it's usable.
+
+        The modification stamp is taken from the Last Modified field, which
+        the delta sync filters on. Records without it have no stamp and are
+        only picked up by full syncs.
+        """
+        fields = record.get("fields", dict())
+        try:
+            name, url, regex = fields["Ink Name"], fields["Inkbot version"], fields["RegEx"]
+        except KeyError:
+            # One of the fields is missing, we can't use this row
+            inkname = fields.get("Ink Name", record.get("id"))
+            self.logger.warning(f"Failed to add {inkname}")
+            return None
+
+        # Inks without a proper image have this placeholder.
+        if "N38sjv2.jpg" in url:
+            return None
+
+        modified = fields.get("Last Modified", "")
+        return InkRecord(name, url, regex, record.get("id", ""), modified)
+
+    def compile_ink(self, row: InkRow) -> Optional[InkyTuple]:
+        """Get the compiled ink for a row, reusing it if the ink hasn't changed."""
+        ink = self.compiled.get(row.hash)
+        if ink is None:
+            try:
+                regex = re.compile(row.regex, re.IGNORECASE)
+            except re.error as e:
+                self.logger.warning(f"Invalid regex for {row.name}: {e}")
+                return None
+            ink = InkyTuple(row.name, row.url, regex)
+            self.compiled[row.hash] = ink
+
+        return ink
+
+    def patch_db(self, written: List[InkRow], removed: List[str]) -> None:
+        """Patch the ink database in memory with changed and removed inks."""
+        for name in removed:
+            self.inkydb.remove(name)
+
+        for row in written:
+            ink = self.compile_ink(row)
+            if ink is None:
+                self.inkydb.remove(row.name)
             else:
-                return
+                self.inkydb.add(ink)
 
-            writer = csv.writer(inkfile)
-            for row in fetch:
-                try:
-                    fields = row["fields"]
-                    inkname = fields["Ink Name"]
-                    to_file: List[str] = [
-                        fields["Ink Name"],
-                        fields["RegEx"],
-                        fields["Inkbot version"]
-                    ]
-                    if "N38sjv2.jpg" not in to_file[2]:
-                        writer.writerow(to_file)
-                except Exception:
-                    # One of the fields is missing, we can't use this row
-                    self.logger.warn(f"Failed to add {inkname}")
-                    pass
+        self.cache.clear()
 
     async def update_db(self) -> None:
         """
         Load all the inks into memory.
 
-        Read the ink file from disk and create the ink database.
+        Read the inks from the database a chunk at a time and create the ink
+        database. Only inks that are new or have changed since the last time
+        are compiled, and control is handed back to the event loop between
+        chunks so a large ink table doesn't hold up other messages.
         """
-        with open(self.inkdb_path, encoding=self.inkdb_enc) as inkfile:
-            reader = csv.reader(inkfile)
-            self.inkydb = set()
-
-            for row in reader:
-                ink = row[0]
-                regex = row[1]
-                url = row[2]
-                self.inkydb.add(
-                    InkyTuple(ink, url, re.compile(regex, re.IGNORECASE))
-                )
+        inkydb = InkMatcher()
+        previous = self.compiled
+        self.compiled = dict()
+        reused = 0
+
+        # Inks are prioritised by their position in the table. Each chunk
+        # is read on the database worker as it's needed, so only one chunk
+        # is held in memory at a time.
+        chunks = self.table.iter_rows()
+        while True:
+            chunk = await self.bot.database.run(next, chunks, None)
+            if chunk is None:
+                break
+
+            for row in chunk:
+                ink = previous.get(row.hash)
+                if ink is not None:
+                    self.compiled[row.hash] = ink
+                    reused += 1
+                else:
+                    ink = self.compile_ink(row)
+
+                if ink is not None:
+                    inkydb.add(ink)
+
+            await asyncio.sleep(0)
+
+        self.inkydb = inkydb
+        self.cache.clear()
+        self.logger.debug(f"Loaded {len(inkydb)} inks, {reused} were already compiled")
 
     @discord.ext.commands.command(name="inkupdate")
     @discord.ext.commands.check(checks.is_owner)
-    async def inkupdate(self, ctx: Context) -> None:
+    async def inkupdate(self, ctx: Context, mode: str = "") -> None:
         """
         Let the bot owner force the bot to reload the inks into memory.
 
@@ -142,29 +462,85 @@ class Inkcyclopedia(CogBase):
 
         Hence it's kind of pointless to do periodic checks and much better
         to simply force fetch it when you know there are updates available.
+
+        By default only inks changed since the last update are fetched.
+        Use `!inkupdate full` to fetch everything, which is also the only
+        way inks deleted from Airtable are removed.
         """
-        await self.fetch_inks()
+        if mode != "full":
+            changes = await self.fetch_changes()
+            if changes is not None:
+                written, removed = changes
+                self.patch_db(written, removed)
+                await ctx.send(
+                    f"Updated {len(written)} and removed {len(removed)} inks, " +
+                    f"there are now {len(self.inkydb)} inks in the database!")
+                self.log_command(
+                    ctx, f"Inkcyclopedia patched, now has {len(self.inkydb)} entries.")
+                return
+
+        if not await self.fetch_inks():
+            await ctx.send("Failed to fetch the inks from Airtable, see the log for details.")
+            return
+
         await self.update_db()
         await ctx.send(
             f"There are now {len(self.inkydb)} inks in the database!")
         self.log_command(
             ctx, f"Inkcyclopedia updated, now has {len(self.inkydb)} entries.")
 
-    @CogBase.listener()
-    async def on_message(self, message: Message) -> None:
-        """Read every message, detect requests for ink pictures."""
+    @discord.ext.commands.command(name="inkstats")
+    @discord.ext.commands.check(checks.is_owner)
+    async def inkstats(self, ctx: Context) -> None:
+        """Show how well the Inkcyclopedia lookup cache is doing."""
+        lookups = self.cache_hits + self.cache_misses
+        hit_rate = round(100 * self.cache_hits / lookups) if lookups else 0
+        await ctx.send(
+            f"{ctx.author.mention} Inkcyclopedia statistics:\n" +
+            f"**inks:** {len(self.inkydb)}\n" +
+            f"**cached terms:** {len(self.cache)}/{self.cache_size}\n" +
+            f"**hits:** {self.cache_hits}\n" +
+            f"**misses:** {self.cache_misses}\n" +
+            f"**hit rate:** {hit_rate}%")
+
+    def lookup(self, term: str) -> Optional[InkyTuple]:
+        """
+        Find the ink matching a term, remembering the result.
+
+        The regexes are matched against the term as written. Every ink regex
+        ignores case, so the lower case term is used as the cache key and
+        "{Oxblood}" and "{oxblood}" share an entry. Terms not matching any
+        ink are remembered as well.
+        """
+        key = term.lower()
+        if key in self.cache:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        self.cache_misses += 1
+        ink = self.inkydb.match(term)
+        self.cache[key] = ink
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return ink
+
+    async def handle_message(self, message: Message) -> None:
+        """Read messages with curly brackets, detect requests for ink pictures."""
         matches: List[str] = self.bracketmatch.findall(message.content)
         # Stop the function if message was sent by a bot or contains no matches
         if message.author.bot or not matches:
             return
 
         for match in matches:
-            for ink in self.inkydb:
-                if ink.regex.findall(match):
-                    image = discord.Embed()
-                    image.set_image(url=ink.url)
-                    await message.channel.send(
-                        f"Found a match for {ink.name}!",
-                        embed=image)
-                    # Only return the first hit, then return.
-                    return
+            ink = self.lookup(match)
+            if ink is not None:
+                image = discord.Embed()
+                image.set_image(url=ink.url)
+                await self.bot.outbox.send(
+                    message.channel,
+                    f"Found a match for {ink.name}!",
+                    embed=image)
+                # Only return the first hit, then return.
+                return
@@ -8,6 +8,7 @@ from discord.ext.commands.context import Context
 
 from mrfreeze import checks
 from mrfreeze.bot import MrFreeze
+from mrfreeze.database.migrate import migrate_legacy
 
 from .cogbase import CogBase
 
@@ -34,6 +35,27 @@ class Maintenance(CogBase):
         await ctx.send(f"{mention} Yes Dear Leader... I will restart now.")
         os.execl(sys.executable, sys.executable, *sys.argv)
 
+    @discord.ext.commands.command(name="outbox")
+    @discord.ext.commands.check(checks.is_owner)
+    async def _outbox(self, ctx: Context, *args: Tuple[str]) -> None:
+        """Show how many replies the outbox has queued, merged and dropped."""
+        metrics = self.bot.outbox.metrics
+        stats = "\n".join(f"**{key}:** {value}" for key, value in metrics.items())
+        await ctx.send(f"{ctx.author.mention} Outbox statistics:\n{stats}")
+
+    @discord.ext.commands.command(name="migratedb")
+    @discord.ext.commands.check(checks.is_owner)
+    async def _migratedb(self, ctx: Context, *args: Tuple[str]) -> None:
+        """Import the legacy databases and server settings into the settings database."""
+        await ctx.send(f"{ctx.author.mention} Importing the legacy data, hold on...")
+        counts = await self.bot.database.run(
+            migrate_legacy, self.bot.settings, self.bot.db_prefix, self.bot.servers_prefix)
+
+        report = "\n".join(
+            f"**{table}:** " + ("failed, see the log" if count < 0 else f"{count} rows")
+            for table, count in counts.items())
+        await ctx.send(f"{ctx.author.mention} Import finished:\n{report}")
+
     @discord.ext.commands.command(name="update")
     @discord.ext.commands.check(checks.is_owner)
     async def _gitupdate(self, ctx: Context, *args: Tuple[str]) -> None:
@@ -85,7 +85,7 @@ class Moderation(CogBase):
             return
 
         # Toggle mute
-        self.bot.settings.toggle_freeze_mute(ctx.guild)
+        await self.bot.database.run(self.bot.settings.toggle_freeze_mute, ctx.guild)
 
         # Check if freeze is now muted and respond accordingly
         is_muted = self.bot.settings.is_freeze_muted(ctx.guild)
@@ -105,8 +105,9 @@ class Moderation(CogBase):
         old_channel = "nothing"
         new_channel = "something"
 
+        await self.bot.load_tables(self.bot.settings.trash_channels)
         old_cid = self.bot.settings.get_trash_channel(ctx.guild)
-        result = self.bot.settings.set_trash_channel(channel)
+        result = await self.bot.database.run(self.bot.settings.set_trash_channel, channel)
         new_cid = self.bot.settings.get_trash_channel(ctx.guild)
 
         try:
@@ -134,8 +135,9 @@ class Moderation(CogBase):
         old_channel = "nothing"
         new_channel = "something"
 
+        await self.bot.load_tables(self.bot.settings.mute_channels)
         old_cid = self.bot.settings.get_mute_channel(ctx.guild)
-        result = self.bot.settings.set_mute_channel(channel)
+        result = await self.bot.database.run(self.bot.settings.set_mute_channel, channel)
         new_cid = self.bot.settings.get_mute_channel(ctx.guild)
 
         try:
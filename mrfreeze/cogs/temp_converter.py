@@ -3,8 +3,6 @@
 import re
 from enum import Enum
 
-import discord
-
 from mrfreeze.cogs.cogbase import CogBase
 
 
@@ -17,6 +15,27 @@ class TempUnit(Enum):
     R = "°R"
 
 
+# Building blocks for the temperature statement regex.
+# Space or ° mandatory for kelvin to avoid
+# collision with k as in thousand.
+numbers = r"(?:(?<!\S)-)?\d+(?:[,.]\d+)? ?"
+celsius = r"°?(?:c|celcius|celsius|civili[sz]ed units?)"
+fahrenheit = r"°?(?:f|fahrenheit|freedom units?)"
+degrees = r"°?(?:deg|degrees)"
+kelvin = r"(?:k|kelvin)"
+rankine = r"°?(?:r|rankine)"
+convert = r"(?:for|in|as|(?:convert )?to|convert)"
+
+# Roles deciding which unit "degrees" refers to, in order of priority.
+unit_roles = (
+    ("Celsius", TempUnit.C),
+    ("Fahrenheit", TempUnit.F),
+    ("Canada", TempUnit.C),
+    ("Mexico", TempUnit.C),
+    ("North America", TempUnit.F),
+)
+
+
 def setup(bot):
     """Add the cog to the bot."""
     bot.add_cog(TemperatureConverter(bot))
@@ -29,9 +48,74 @@ class TemperatureConverter(CogBase):
         """Initialize the cog."""
         self.bot = bot
 
+        # Upper limit for how many statements are converted in one message,
+        # keeps the reply well within the message length limit.
+        self.max_statements = 15
+
+        # Index of unit roles for each guild, role id -> (priority, unit).
+        self.role_units = dict()
+
+        # A temperature statement, optionally followed by a forced conversion
+        # such as "50 c to f", extracted in a single pass. The leading
+        # lookahead lets the regex engine skip ahead to the next digit
+        # or minus sign rather than trying every position in the message.
+        self.temperature_regex = re.compile(
+            r"(?=[-\d])" +
+            f"(?P<temperature>{numbers})" +
+            f"(?:(?P<from_c>{celsius})|(?P<from_f>{fahrenheit})" +
+            fr"|(?P<from_k>[ °]{kelvin})|(?P<from_r>{rankine})" +
+            f"|(?P<from_deg>{degrees}))" +
+            f"(?: {convert} (?:(?P<to_c>{celsius})|(?P<to_f>{fahrenheit})" +
+            fr"|(?P<to_k>°?{kelvin})|(?P<to_r>{rankine})))?" +
+            r"(?=\s|$)",
+            re.IGNORECASE)
+
+        # Every temperature statement contains a number.
+        self.bot.scanner.register("temperature", r"\d", self.handle_message)
+
+    def cog_unload(self):
+        """Remove the trigger from the message scanner."""
+        self.bot.scanner.unregister("temperature")
+
+    @CogBase.listener()
+    async def on_ready(self):
+        """Index the unit roles of every guild."""
+        for guild in self.bot.guilds:
+            self.index_roles(guild)
+
+    @CogBase.listener()
+    async def on_guild_role_create(self, role):
+        """Invalidate the role index when a role is created."""
+        self.invalidate_roles(role.guild)
+
+    @CogBase.listener()
+    async def on_guild_role_delete(self, role):
+        """Invalidate the role index when a role is deleted."""
+        self.invalidate_roles(role.guild)
+
     @CogBase.listener()
-    async def on_message(self, message):
-        """Look through all messages received for temperature statements."""
+    async def on_guild_role_update(self, before, after):
+        """Invalidate the role index when a role is renamed."""
+        if before.name != after.name:
+            self.invalidate_roles(after.guild)
+
+    def index_roles(self, guild):
+        """Build the index of unit roles for a guild."""
+        priorities = { name: (priority, unit)
+                       for priority, (name, unit) in enumerate(unit_roles) }
+        self.role_units[guild.id] = {
+            role.id: priorities[role.name]
+            for role in guild.roles
+            if role.name in priorities
+        }
+        return self.role_units[guild.id]
+
+    def invalidate_roles(self, guild):
+        """Drop the role index of a guild, it's rebuilt on next use."""
+        self.role_units.pop(guild.id, None)
+
+    async def handle_message(self, message):
+        """Look through messages with numbers in them for temperature statements."""
         if message.author.bot:
             return
 
@@ -40,61 +124,72 @@ class TemperatureConverter(CogBase):
         channel = ctx.channel
 
         # Abort if no temperature statement was found.
-        statement = self.parse_request(ctx)
-        if not statement:
+        statements = self.parse_statements(ctx)
+        if not statements:
             return
 
-        # Check if input is ridiculously high/low.
-        if abs(statement["temperature"]) >= 100000:
-            hotcold = "a bit chilly"
-            image_path = "images/hellacold.gif"
+        # Convert all the statements, then
+        # compose a single reply with one line per statement.
+        self.convert_statements(statements)
+        image_name = self.image_name(statements)
+        replies = list()
 
-            if statement["temperature"] > 0:
-                hotcold = "quite warm"
-                image_path = "images/helldog.gif"
+        for statement in statements:
+            # Check if input is ridiculously high/low.
+            if self.is_ridiculous(statement):
+                hotcold = "a bit chilly"
+                if statement["temperature"] > 0:
+                    hotcold = "quite warm"
 
-            await channel.send(
-                    f"{author} No matter what unit you put that " +
-                    f"in the answer is still gonna be \"{hotcold}\".",
-                    file=discord.File(image_path))
-            return
+                reply = (f"{author} No matter what unit you put that " +
+                         f"in the answer is still gonna be \"{hotcold}\".")
 
-        # Calculate converted temperature,
-        # see if it's above or equal to dog threshold.
-        if statement["origin"] == TempUnit.C:
-            new_temp = self.celsius_table(
-                statement["temperature"],
-                statement["destination"])
-            in_c = statement["temperature"]
-
-        elif statement["origin"] == TempUnit.F:
-            new_temp = self.fahrenheit_table(
-                statement["temperature"],
-                statement["destination"])
-            in_c = self.fahrenheit_table(statement["temperature"], TempUnit.C)
-
-        elif statement["origin"] == TempUnit.K:
-            new_temp = self.kelvin_table(
-                statement["temperature"],
-                statement["destination"])
-            in_c = self.kelvin_table(statement["temperature"], TempUnit.C)
+            else:
+                reply = self.statement_reply(statement, author)
 
-        else:  # Has to be rankine
-            new_temp = self.rankine_table(
-                statement["temperature"],
-                statement["destination"])
-            in_c = self.rankine_table(statement["temperature"], TempUnit.C)
+            # Don't repeat ourselves if the same statement was made twice.
+            if reply not in replies:
+                replies.append(reply)
+
+        if image_name is None:
+            await self.bot.outbox.send(channel, "\n".join(replies), author=ctx.author)
+        else:
+            image = self.bot.assets.file(image_name)
+            await self.bot.outbox.send(
+                channel, "\n".join(replies), file=image, author=ctx.author)
+
+    def is_ridiculous(self, statement):
+        """Check if a statement is too hot or cold for a conversion to matter."""
+        return abs(statement["temperature"]) >= 100000
+
+    def image_name(self, statements):
+        """
+        Pick the image for the most extreme statement, if any is extreme enough.
+
+        Ridiculous statements beat everything else, the one furthest from zero
+        decides the image. Otherwise the statement furthest past its threshold
+        (35°C for hot, -20°C for cold) decides, with hot winning a tie.
+        """
+        ridiculous = [ statement for statement in statements if self.is_ridiculous(statement) ]
+        if ridiculous:
+            extreme = max(ridiculous, key=lambda statement: abs(statement["temperature"]))
+            return "helldog.gif" if extreme["temperature"] > 0 else "hellacold.gif"
 
         # hot/cold thresholds are defined in celsius
-        image = None
-        if in_c >= 35:
-            image = discord.File("images/helldog.gif")
-        elif in_c <= -20:
-            image = discord.File("images/hellacold.gif")
+        heat = max(statement["in_c"] for statement in statements) - 35
+        cold = -20 - min(statement["in_c"] for statement in statements)
+
+        if heat >= 0 and heat >= cold:
+            return "helldog.gif"
+        elif cold >= 0:
+            return "hellacold.gif"
+        return None
 
+    def statement_reply(self, statement, author):
+        """Create the reply line for a single converted statement."""
         # old/new_temp contains the temperature values as floats.
         old_temp = round(statement["temperature"], 2)
-        new_temp = round(new_temp, 2)
+        new_temp = round(statement["new_temp"], 2)
         # Check if old and new temp are the same temperatures or units.
         no_change = (old_temp == new_temp)
         same_unit = (statement["origin"] == statement["destination"])
@@ -102,111 +197,121 @@ class TemperatureConverter(CogBase):
         origin = statement["origin"].value
         destination = statement["destination"].value
 
-        # Time for the reply.
         if no_change:
             if same_unit and statement["manual"]:
-                reply = (f"Did {author} just try to convert {old_temp}" +
-                         f"{origin} to {destination}? :thinking:")
+                return (f"Did {author} just try to convert {old_temp}" +
+                        f"{origin} to {destination}? :thinking:")
             elif statement["manual"]:
-                reply = (f"Uh... {old_temp}{origin} is the same in " +
-                         f"{new_temp}{destination} you smud. :angry:")
+                return (f"Uh... {old_temp}{origin} is the same in " +
+                        f"{new_temp}{destination} you smud. :angry:")
             else:
-                reply = (f"Guess what! {old_temp}{origin} is the same as " +
-                         f"{new_temp}{destination}! WOOOW!")
+                return (f"Guess what! {old_temp}{origin} is the same as " +
+                        f"{new_temp}{destination}! WOOOW!")
         else:
-            reply = f"{old_temp}{origin} is around {new_temp}{destination}"
-        await channel.send(reply, file=image)
+            return f"{old_temp}{origin} is around {new_temp}{destination}"
 
-    def parse_request(self, ctx):
+    def parse_statements(self, ctx):
         """
-        Extract temperature statement from text.
+        Extract all temperature statements from text.
 
-        If no temperature statement is found returns false.
-        Otherwise returns a dictionary with keys:
+        Returns a list of dictionaries, one for each statement found
+        (up to self.max_statements), with keys:
             temperature, origin, destination, manual
+
+        If no temperature statement is found the list is empty.
         """
-        text = ctx.message.content
-
-        # Space or ° mandatory for kelvin to avoid
-        # collision with k as in thousand.
-        numbers = r"(?:(?:\s|^)-)?\d+(?:[,.]\d+)? ?"
-        celsius = r"°?(?:c|celcius|celsius|civili[sz]ed units?)"
-        fahrenheit = r"°?(?:f|fahrenheit|freedom units?)"
-        degrees = r"°?(?:deg|degrees)"
-        kelvin = r"(?:k|kelvin)"
-        rankine = r"°?(?:r|rankine)"
-        regex = (f"({numbers})(?:({celsius})|({fahrenheit})" +
-                 fr"|([ °]{kelvin})|({rankine})|({degrees}))(?:\s|$)")
-        statement = re.search(regex, text, re.IGNORECASE)
-        if not statement:
-            return False
-
-        result = dict()
-
-        # Determine the origin unit.
-        statement = statement.groups()
-        result["temperature"] = float(statement[0].replace(",", "."))
-        if statement[1]:
-            result["origin"] = TempUnit.C
-        elif statement[2]:
-            result["origin"] = TempUnit.F
-        elif statement[3]:
-            result["origin"] = TempUnit.K
-        elif statement[4]:
-            result["origin"] = TempUnit.R
-        else:  # Has to be "degrees", needs to be converted into real unit
-            if ctx.guild is not None:
-                # Not DMs
-                roles = ctx.author.roles
-                if discord.utils.get(roles, name="Celsius"):
-                    result["origin"] = TempUnit.C
-                elif discord.utils.get(roles, name="Fahrenheit"):
-                    result["origin"] = TempUnit.F
-                elif discord.utils.get(roles, name="Canada"):
-                    result["origin"] = TempUnit.C
-                elif discord.utils.get(roles, name="Mexico"):
-                    result["origin"] = TempUnit.C
-                elif discord.utils.get(roles, name="North America"):
-                    result["origin"] = TempUnit.F
-                else:
-                    # Default is celsius
-                    result["origin"] = TempUnit.C
-            else:
-                # DMs
+        statements = list()
+        default_unit = None
+
+        for match in self.temperature_regex.finditer(ctx.message.content):
+            if len(statements) >= self.max_statements:
+                break
+
+            result = dict()
+            result["temperature"] = float(match["temperature"].replace(",", "."))
+
+            # Determine the origin unit.
+            if match["from_c"]:
                 result["origin"] = TempUnit.C
+            elif match["from_f"]:
+                result["origin"] = TempUnit.F
+            elif match["from_k"]:
+                result["origin"] = TempUnit.K
+            elif match["from_r"]:
+                result["origin"] = TempUnit.R
+            else:  # Has to be "degrees", needs to be converted into real unit
+                if default_unit is None:
+                    default_unit = self.default_unit(ctx)
+                result["origin"] = default_unit
+
+            # Determine destination unit
+            # First we'll look for force conversions
+            if match["to_c"] or match["to_f"] or match["to_k"] or match["to_r"]:
+                result["manual"] = True
+                if match["to_c"]:
+                    result["destination"] = TempUnit.C
+                elif match["to_f"]:
+                    result["destination"] = TempUnit.F
+                elif match["to_k"]:
+                    result["destination"] = TempUnit.K
+                else:  # Has to be rankine
+                    result["destination"] = TempUnit.R
+            else:
+                result['manual'] = False
+                if result["origin"] == TempUnit.F:
+                    result["destination"] = TempUnit.C
+                elif result["origin"] == TempUnit.K:
+                    result["destination"] = TempUnit.C
+                elif result["origin"] == TempUnit.C:
+                    result["destination"] = TempUnit.F
+                else:  # Has to be rankine
+                    result["destination"] = TempUnit.F
 
-        # Determine destination unit
-        # First we'll look for force conversions
-        no_catch = (fr"(?:(?:{numbers}) ?(?:{celsius}|{fahrenheit}|" +
-                    fr"{degrees}|[ °]{kelvin}|{rankine})) (?:for|in|as" +
-                    fr"|(?:convert )?to|convert)")
-        find_convert = (fr"{no_catch} (?:({celsius})|({fahrenheit})" +
-                        fr"|(°?{kelvin})|({rankine}))(?:\s|$)")
-        conversion = re.search(find_convert, text, re.IGNORECASE)
-
-        if conversion:
-            result["manual"] = True
-            conversion = conversion.groups()
-            if conversion[0]:
-                result["destination"] = TempUnit.C
-            elif conversion[1]:
-                result["destination"] = TempUnit.F
-            elif conversion[2]:
-                result["destination"] = TempUnit.K
-            else:  # Has to be rankine
-                result["destination"] = TempUnit.R
-        else:
-            result['manual'] = False
-            if result["origin"] == TempUnit.F:
-                result["destination"] = TempUnit.C
-            elif result["origin"] == TempUnit.K:
-                result["destination"] = TempUnit.C
-            elif result["origin"] == TempUnit.C:
-                result["destination"] = TempUnit.F
-            else:  # Has to be rankine
-                result["destination"] = TempUnit.F
-
-        return result
+            statements.append(result)
+
+        return statements
+
+    def default_unit(self, ctx):
+        """Determine which unit "degrees" refers to for the author of a message."""
+        if ctx.guild is None:
+            # DMs
+            return TempUnit.C
+
+        role_units = self.role_units.get(ctx.guild.id)
+        if role_units is None:
+            role_units = self.index_roles(ctx.guild)
+
+        author_roles = { role.id for role in ctx.author.roles }
+        matches = [ role_units[role] for role in author_roles & role_units.keys() ]
+
+        # Default is celsius
+        return min(matches)[1] if matches else TempUnit.C
+
+    def convert_statements(self, statements):
+        """
+        Convert a batch of statements in place.
+
+        Adds the keys new_temp (temperature in destination unit) and
+        in_c (temperature in celsius) to each statement. Each statement
+        is converted once, and a second time only if its destination
+        isn't celsius.
+        """
+        tables = {
+            TempUnit.C: self.celsius_table,
+            TempUnit.F: self.fahrenheit_table,
+            TempUnit.K: self.kelvin_table,
+            TempUnit.R: self.rankine_table
+        }
+
+        for statement in statements:
+            table = tables[statement["origin"]]
+            new_temp = table(statement["temperature"], statement["destination"])
+            statement["new_temp"] = new_temp
+
+            if statement["destination"] == TempUnit.C:
+                statement["in_c"] = new_temp
+            else:
+                statement["in_c"] = table(statement["temperature"], TempUnit.C)
 
     def celsius_table(self, temp, dest):
         """Convert from celsius to other units."""
@@ -1,9 +1,12 @@
 """Various helper methods for reading and writing to the database."""
 
 import datetime
+import logging
 import sqlite3
+import threading
 from sqlite3 import Connection
 from typing import Any
+from typing import Dict
 from typing import List
 from typing import Optional
 from typing import Tuple
@@ -20,9 +23,88 @@ class ExecutionResult:
         self.error = error
 
 
+class ConnectionManager:
+    """
+    Keeps one long-lived connection per database file and thread.
+
+    Opening a new connection for every query means parsing the schema and
+    preparing every statement over and over. Instead connections are opened
+    once, set up with WAL mode and a few other pragmas, and then reused, which
+    also lets sqlite3 reuse the statements it has already prepared.
+
+    SQLite connections must not be shared between threads, so database work
+    that's been handed off to an executor gets connections of its own.
+    """
+
+    pragmas = (
+        # Readers and the writer don't block each other.
+        "PRAGMA journal_mode = WAL",
+        # In WAL mode this is still safe from corruption, but doesn't
+        # wait for the disk on every single commit.
+        "PRAGMA synchronous = NORMAL",
+        # Wait for locks held by other connections instead of failing.
+        "PRAGMA busy_timeout = 5000",
+        "PRAGMA temp_store = MEMORY",
+        # Page cache size, negative numbers are in kB.
+        "PRAGMA cache_size = -8000",
+    )
+
+    # Number of prepared statements kept per connection.
+    cached_statements = 256
+
+    def __init__(self) -> None:
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections: List[Connection] = list()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def connect(self, dbpath: str) -> Connection:
+        """Get the connection to a database, opening it if necessary."""
+        connections: Optional[Dict[str, Connection]] = getattr(self.local, "connections", None)
+        if connections is None:
+            connections = self.local.connections = dict()
+
+        conn = connections.get(dbpath)
+        if conn is None:
+            # Each connection is only used by the thread that opened it,
+            # but close_all needs to be able to close it from any thread.
+            conn = sqlite3.connect(
+                dbpath,
+                cached_statements=self.cached_statements,
+                check_same_thread=False)
+            for pragma in self.pragmas:
+                conn.execute(pragma)
+
+            connections[dbpath] = conn
+            with self.lock:
+                self.connections.append(conn)
+            self.logger.debug(f"Opened connection to {dbpath}")
+
+        return conn
+
+    def close_all(self) -> None:
+        """Close every connection, in every thread."""
+        with self.lock:
+            connections = self.connections
+            self.connections = list()
+
+        for conn in connections:
+            conn.close()
+        self.local = threading.local()
+
+
+# The connections used by everything that talks to a database.
+connections = ConnectionManager()
+
+
 def db_connect(dbpath: str) -> Connection:
-    """Create a connection to a database."""
-    return sqlite3.connect(dbpath)
+    """
+    Get a connection to a database.
+
+    The connection is shared and stays open, use it as a context manager
+    to commit, but don't close it.
+    """
+    return connections.connect(dbpath)
 
 
 def db_time(in_data: Union[str, datetime.datetime]) -> Optional[Union[str, datetime.datetime]]:
@@ -43,6 +125,37 @@ def db_time(in_data: Union[str, datetime.datetime]) -> Optional[Union[str, datet
         return None
 
 
+# 9999-12-31 23:59:59 UTC, datetime.max as far as the database is concerned.
+MAX_EPOCH = 253402300799
+
+
+def db_epoch(
+        in_data: Union[int, str, datetime.datetime]) -> Optional[Union[int, datetime.datetime]]:
+    """
+    Parse to and from epoch timestamps consistently for database use.
+
+    A datetime object, or a string in the format of db_time, is parsed to
+    an integer number of seconds since the epoch. An integer is parsed to a
+    datetime object. Datetimes are naive and in local time, like the ones
+    from datetime.now(). Anything else returns None.
+    """
+    if isinstance(in_data, str):
+        in_data = db_time(in_data)
+
+    if isinstance(in_data, datetime.datetime):
+        try:
+            return min(int(in_data.timestamp()), MAX_EPOCH)
+        except (OverflowError, OSError, ValueError):
+            return MAX_EPOCH
+    elif isinstance(in_data, int):
+        try:
+            return datetime.datetime.fromtimestamp(in_data)
+        except (OverflowError, OSError, ValueError):
+            return datetime.datetime.max
+    else:
+        return None
+
+
 def db_execute(dbpath: str, sql: str, values: Tuple[str, ...]) -> ExecutionResult:
     """Execute a database query."""
     error = None
@@ -0,0 +1,269 @@
+"""
+Import legacy data into the settings database.
+
+Mutes and region blacklists used to live in databases of their own, one
+file per cog with a connection of its own, and server settings in a file
+per setting. They now have tables in the settings database, and this
+module copies the old data over.
+
+The legacy files are opened read only and streamed in batches, every batch
+written to the new table in a single transaction with update_many, so
+large databases are never loaded into memory all at once. Rows that are
+already in the new tables are overwritten, so running the import twice
+is harmless.
+
+Every table legacy data has been imported into is recorded in the
+legacy_imports table. The bot runs the import on start for the tables that
+aren't recorded yet, so the legacy data is picked up automatically the first
+time a version with the settings database starts, and never again after
+that, even if the table is emptied later. !migratedb imports everything
+again.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from .helpers import db_connect
+from .helpers import db_epoch
+from .settings import Settings
+from .tables.abc_table_base import ABCTableBase
+
+logger = logging.getLogger("Migration")
+
+# Legacy queries, selecting the columns of the new tables in order.
+legacy_mutes = "SELECT server, id, voluntary, until FROM mutes"
+legacy_blacklist = "SELECT sid, uid FROM blacklist"
+
+# The tables legacy data has been imported into, with where it came from and when.
+imports_table = """
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    name        VARCHAR(63) NOT NULL PRIMARY KEY,
+    source      VARCHAR(255) NOT NULL,
+    imported    INTEGER NOT NULL
+);"""
+
+insert_import = """
+INSERT INTO legacy_imports (name, source, imported) VALUES (?, ?, ?)
+ON CONFLICT(name) DO UPDATE SET source = ?, imported = ?;
+"""
+
+
+def copy_rows(
+    source: str,
+    select: str,
+    table: ABCTableBase,
+    columns: Tuple[str, ...],
+    batch_size: int = 500,
+    convert: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+) -> int:
+    """
+    Stream the rows selected from source into table, batch_size rows at a time.
+
+    If convert is given every row is passed through it before it's written,
+    rows it can't convert are logged and skipped.
+
+    Returns the number of rows copied, or -1 if the source couldn't be read
+    or a batch couldn't be written.
+    """
+    if not os.path.isfile(source):
+        logger.info(f"{source} doesn't exist, nothing to import into {table.name}")
+        return 0
+
+    copied = 0
+    conn = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(select)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+
+            rows = [ dict(zip(columns, row)) for row in batch ]
+            if convert is not None:
+                rows = convert_rows(rows, convert, source)
+            if not table.update_many(rows, accept_none=True):
+                logger.error(f"failed to import batch into {table.name} after {copied} rows")
+                return -1
+            copied += len(rows)
+
+    except sqlite3.Error as e:
+        logger.error(f"failed to read {source}: {e}")
+        return -1
+
+    finally:
+        conn.close()
+
+    logger.info(f"imported {copied} rows from {source} into {table.name}")
+    return copied
+
+
+def convert_rows(
+    rows: List[Dict[str, Any]],
+    convert: Callable[[Dict[str, Any]], Dict[str, Any]],
+    source: str
+) -> List[Dict[str, Any]]:
+    """Pass every row through convert, leaving out the rows it fails on."""
+    converted = list()
+    for pairs in rows:
+        try:
+            converted.append(convert(pairs))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"skipped row {pairs} of {source}: {e}")
+    return converted
+
+
+def convert_mute(pairs: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert the end time of a legacy mute to seconds since the epoch."""
+    return { **pairs, "until": db_epoch(pairs["until"]) }
+
+
+def read_setting_files(servers_prefix: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the server settings stored as servers_prefix/<server id>/<setting>.
+
+    Setting files that can't be read or aren't valid UTF-8 are logged and
+    skipped, only failing to list the directories raises an OSError.
+    """
+    for server in sorted(os.listdir(servers_prefix)):
+        server_dir = os.path.join(servers_prefix, server)
+        if not server.isdigit() or not os.path.isdir(server_dir):
+            continue
+
+        for setting in sorted(os.listdir(server_dir)):
+            setting_path = os.path.join(server_dir, setting)
+            if not os.path.isfile(setting_path):
+                continue
+
+            try:
+                with open(setting_path, "r", encoding="utf-8") as f:
+                    value = f.read().strip()
+            except (OSError, ValueError) as e:
+                logger.warning(f"skipped {setting_path}: {e}")
+                continue
+
+            yield { "server": int(server), "setting": setting, "value": value }
+
+
+def import_setting_files(settings: Settings, servers_prefix: str, batch_size: int = 500) -> int:
+    """
+    Import the server settings files found in servers_prefix, batch_size at a time.
+
+    Returns the number of settings imported, or -1 if the directories couldn't
+    be read or a batch couldn't be written. Files that can't be read are skipped.
+    """
+    table = settings.server_settings
+    if not os.path.isdir(servers_prefix):
+        logger.info(f"{servers_prefix} doesn't exist, nothing to import into {table.name}")
+        return 0
+
+    copied = 0
+    batch: List[Dict[str, Any]] = list()
+    try:
+        for pairs in read_setting_files(servers_prefix):
+            batch.append(pairs)
+            if len(batch) < batch_size:
+                continue
+
+            if not table.update_many(batch):
+                logger.error(f"failed to import batch into {table.name} after {copied} rows")
+                return -1
+            copied += len(batch)
+            batch = list()
+
+    except OSError as e:
+        logger.error(f"failed to read {servers_prefix}: {e}")
+        return -1
+
+    if not table.update_many(batch):
+        logger.error(f"failed to import batch into {table.name} after {copied} rows")
+        return -1
+    copied += len(batch)
+
+    logger.info(f"imported {copied} rows from {servers_prefix} into {table.name}")
+    return copied
+
+
+def imported_tables(dbpath: str) -> Optional[Set[str]]:
+    """Get the names of the tables legacy data has been imported into, None on failure."""
+    try:
+        conn = db_connect(dbpath)
+        with conn:
+            conn.execute(imports_table)
+        return { row[0] for row in conn.execute("SELECT name FROM legacy_imports") }
+    except sqlite3.Error as e:
+        logger.error(f"failed to read the legacy imports: {e}")
+        return None
+
+
+def mark_imported(dbpath: str, table: ABCTableBase, source: str) -> bool:
+    """Record that the legacy data in source has been imported into table."""
+    now = int(time.time())
+    try:
+        conn = db_connect(dbpath)
+        with conn:
+            conn.execute(imports_table)
+            conn.execute(insert_import, (table.table_name, source, now, source, now))
+    except sqlite3.Error as e:
+        logger.error(f"failed to record the import into {table.name}: {e}")
+        return False
+    return True
+
+
+def migrate_legacy(
+    settings: Settings,
+    db_prefix: str,
+    servers_prefix: str,
+    batch_size: int = 500,
+    only_once: bool = False
+) -> Dict[str, int]:
+    """
+    Import the legacy databases in db_prefix and server settings in servers_prefix.
+
+    Every table that's imported without a failure is recorded in the
+    legacy_imports table. With only_once, tables that have been recorded
+    and tables whose legacy data doesn't exist are left out, so are all
+    tables if the record can't be read.
+
+    Returns the number of rows copied into each table, -1 for a failure.
+    """
+    mutes = settings.mutes
+    blacklist = settings.region_blacklist
+    imports: List[Tuple[ABCTableBase, str, Callable[[], int]]] = [
+        (settings.server_settings, servers_prefix,
+         lambda: import_setting_files(settings, servers_prefix, batch_size)),
+        (mutes, f"{db_prefix}/mutes.db",
+         lambda: copy_rows(f"{db_prefix}/mutes.db", legacy_mutes,
+                           mutes, mutes.columns, batch_size, convert_mute)),
+        (blacklist, f"{db_prefix}/regions.db",
+         lambda: copy_rows(f"{db_prefix}/regions.db", legacy_blacklist,
+                           blacklist, blacklist.columns, batch_size)),
+    ]
+
+    imported: Set[str] = set()
+    if only_once:
+        # Rather import nothing than import the same data twice.
+        imported = imported_tables(settings.dbpath)
+        if imported is None:
+            return dict()
+
+    counts: Dict[str, int] = dict()
+    for table, source, run_import in imports:
+        if only_once and (table.table_name in imported or not os.path.exists(source)):
+            continue
+
+        counts[table.name] = run_import()
+        # Legacy data that doesn't exist hasn't been imported.
+        if counts[table.name] >= 0 and os.path.exists(source):
+            mark_imported(settings.dbpath, table, source)
+
+    return counts
@@ -13,15 +13,26 @@ from .tables.freeze_mutes import FreezeMutes
 from .tables.inkcyclopedia import InkcyclopediaInks
 from .tables.mute_channels import MuteChannels
 from .tables.mute_roles import MuteRoles
+from .tables.mutes import Mutes
+from .tables.region_blacklist import RegionBlacklist
+from .tables.server_settings import ServerSettings
 from .tables.trash_channels import TrashChannels
 
 
 class Settings:
     """Settings is a class for coordinating all the various settings modules."""
 
-    def __init__(self) -> None:
-        self.dbpath = "settings.db"
+    def __init__(self, dbpath: str = "settings.db") -> None:
+        self.dbpath = dbpath
         self.tables: List[ABCTableBase] = list()
+
+        # Tables are loaded on first use, this loads the ones
+        # that haven't been used yet once the bot is ready.
+        self.warm_up_on_ready = True
+
+        # How often, in seconds, changes to tables that
+        # aren't durable are written to the database.
+        self.flush_interval = 5
         self.logger = logging.getLogger(self.__class__.__name__)
 
         # Initialize the tables
@@ -30,6 +41,9 @@ class Settings:
         self.inkcyclopedia  = InkcyclopediaInks(self.dbpath, self.logger)
         self.mute_channels  = MuteChannels(self.dbpath, self.logger)
         self.mute_roles     = MuteRoles(self.dbpath, self.logger)
+        self.mutes          = Mutes(self.dbpath, self.logger)
+        self.region_blacklist = RegionBlacklist(self.dbpath, self.logger)
+        self.server_settings = ServerSettings(self.dbpath, self.logger)
         self.trash_channels = TrashChannels(self.dbpath, self.logger)
         self.logger.info("All tables instantiated")
 
@@ -38,6 +52,9 @@ class Settings:
         self.tables.append(self.inkcyclopedia)
         self.tables.append(self.mute_channels)
         self.tables.append(self.mute_roles)
+        self.tables.append(self.mutes)
+        self.tables.append(self.region_blacklist)
+        self.tables.append(self.server_settings)
         self.tables.append(self.trash_channels)
 
         # Initialize all the tables
@@ -60,15 +77,31 @@ class Settings:
         self.set_mute_role           = self.mute_roles.set
         self.set_mute_role_by_id     = self.mute_roles.set_by_id
 
+        # Server Settings
+        self.get_server_setting      = self.server_settings.get_value
+        self.set_server_setting      = self.server_settings.set_value
+        self.add_setting_listener    = self.server_settings.add_listener
+
         # Trash Channels
         self.get_trash_channel       = self.trash_channels.get
         self.set_trash_channel       = self.trash_channels.set
         self.set_trash_channel_by_id = self.trash_channels.set_by_id
 
+    def flush(self) -> bool:
+        """Write the pending changes of every table to the database."""
+        results = [ table.flush() for table in self.tables ]
+        return all(results)
+
     def initialize(self) -> None:
-        """Set up the database and tables necessary for the server settings module."""
+        """
+        Set up the database and tables necessary for the server settings module.
+
+        The tables aren't loaded into memory here, the bot loads every
+        table on the database worker the first time it's used instead.
+        """
         for module in self.tables:
             module.create_table()
 
-        for module in self.tables:
-            module.load_from_db()
+    def unloaded_tables(self) -> List[ABCTableBase]:
+        """Get the tables that haven't been loaded into memory yet."""
+        return [ table for table in self.tables if not table.is_loaded() ]
@@ -6,6 +6,9 @@ from abc import ABCMeta
 from abc import abstractmethod
 from typing import Any
 from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
 from typing import Tuple
 
 from mrfreeze.colors import GREEN, MAGENTA, RED, RESET, YELLOW_B
@@ -50,6 +53,28 @@ class ABCTableBase(metaclass=ABCMeta):
         """Load all data from the database into memory."""
         pass
 
+    def is_loaded(self) -> bool:
+        """
+        Check if the table's data has been loaded into memory.
+
+        Tables are loaded on the database worker the first time they're used,
+        or when the settings are warmed up after the bot is ready. Tables that
+        don't keep anything in memory are always loaded.
+        """
+        return True
+
+    def ensure_loaded(self) -> bool:
+        """
+        Load the table if it hasn't been loaded, return whether it's loaded.
+
+        This reads the database, so it only runs on the database worker.
+        Reads never load the table, they treat a table that isn't loaded as
+        empty, so the bot awaits this on the worker before a table is used.
+        """
+        if not self.is_loaded():
+            self.load_from_db()
+        return self.is_loaded()
+
     def update(self, pairs: Dict[Any, Any], accept_none: bool = False) -> bool:
         """
         Update (or insert) something into the database.
@@ -62,12 +87,10 @@ class ABCTableBase(metaclass=ABCMeta):
         The function never accepts None in the primary keys, and also doesn't
         accept None is secondary keys unless accept_none is set to True.
         """
-        primary_values = tuple([ pairs[v] for v in self.primary_keys ])
-        secondary_values = tuple([ pairs[v] for v in self.secondary_keys ])
-        value_fill = primary_values + secondary_values + secondary_values
+        value_fill = self.insert_values(pairs, accept_none)
 
         # Check that all required values are filled in
-        if None in primary_values or (not accept_none and None in secondary_values):
+        if value_fill is None:
             self.errorlog(
                 "missing one or more values, can't upsert")
             return False
@@ -85,6 +108,77 @@ class ABCTableBase(metaclass=ABCMeta):
             "upsert successful")
         return True
 
+    def update_many(self, rows: Iterable[Dict[Any, Any]], accept_none: bool = False) -> bool:
+        """
+        Update (or insert) many rows into the database at once.
+
+        Every row is checked like in update, and if any of them is missing
+        values nothing is written at all. Otherwise all the rows are written
+        in a single transaction, and then the table's data in memory is
+        updated in one go.
+        """
+        rows = list(rows)
+        value_fills: List[Tuple[Any, ...]] = list()
+        for number, pairs in enumerate(rows):
+            value_fill = self.insert_values(pairs, accept_none)
+            if value_fill is None:
+                self.errorlog(
+                    f"missing one or more values in row {number}, can't upsert")
+                return False
+            value_fills.append(value_fill)
+
+        if not value_fills:
+            return True
+
+        conn = db_connect(self.dbpath)
+        try:
+            with conn:
+                conn.executemany(self.insert, value_fills)
+        except sqlite3.Error as e:
+            self.errorlog(
+                f"failed to upsert {len(value_fills)} rows: {e}")
+            return False
+
+        self.update_memory(rows)
+        self.infolog(
+            f"upserted {len(value_fills)} rows")
+        return True
+
+    def insert_values(
+            self,
+            pairs: Dict[Any, Any],
+            accept_none: bool = False) -> Optional[Tuple[Any, ...]]:
+        """
+        Get the values for self.insert from a dictionary of column names and values.
+
+        Returns None if a primary key is None, or if a secondary key is None
+        and accept_none isn't set.
+        """
+        primary_values = tuple([ pairs[v] for v in self.primary_keys ])
+        secondary_values = tuple([ pairs[v] for v in self.secondary_keys ])
+
+        if None in primary_values or (not accept_none and None in secondary_values):
+            return None
+
+        return primary_values + secondary_values + secondary_values
+
+    def update_memory(self, rows: List[Dict[Any, Any]]) -> None:
+        """
+        Update the table's data in memory after rows have been written by update_many.
+
+        Tables keeping their data in memory need to override this.
+        """
+        pass
+
+    def flush(self) -> bool:
+        """
+        Write any changes that haven't been written to disk yet.
+
+        Tables write every change to disk immediately unless they say
+        otherwise, so there's nothing to do by default.
+        """
+        return True
+
     def create_table(self) -> None:
         """Create the table for a given module."""
         conn = db_connect(self.dbpath)
@@ -2,8 +2,10 @@
 
 import logging
 import sqlite3
+import threading
 from typing import Any
 from typing import Dict
+from typing import List
 from typing import Optional
 from typing import Union
 
@@ -33,6 +35,18 @@ class ABCTableDict(ABCTableBase):
     logger: logging.Logger
     dict: Optional[Dict[Any, Any]]
 
+    # Durable tables write every change to disk right away. Tables that
+    # aren't durable only update the dictionary, and the changes are written
+    # in batches by flush, so a crash may lose the most recent changes.
+    # Changes being written by a flush are kept in flushing until they're
+    # committed, and flushes counts the flushes that have finished. Every
+    # table has a pending_lock of its own guarding all three.
+    durable: bool = True
+    pending: Optional[Dict[Any, Any]] = None
+    flushing: Optional[Dict[Any, Any]] = None
+    flushes: int = 0
+    pending_lock: threading.Lock
+
     # SQL commands
     select_all: str
     insert: str
@@ -58,27 +72,47 @@ class ABCTableDict(ABCTableBase):
         Each module has a dictionary called self.dict into which the values
         are all loaded. This function generalises this process so it doesn't
         have to be implemented into all the cogs individually.
+
+        Changes that haven't been written yet are merged into what's read,
+        including changes a flush is writing while the table is read. If a
+        flush finishes during the read, its changes may have been committed
+        after they were read and removed from flushing before they could be
+        merged, so the table is read again.
         """
-        query = db_execute(self.dbpath, self.select_all, tuple())
+        while True:
+            with self.pending_lock:
+                flushes = self.flushes
+
+            query = db_execute(self.dbpath, self.select_all, tuple())
+            if query.error is not None:
+                self.errorlog(f"failed to fetch data: {query.error}")
+                self.dict = None
+                return
 
-        if query.error is None:
             new_dict = dict()
             for entry in query.output:
                 new_dict[entry[0]] = entry[1]
 
-            self.dict = new_dict
-            self.infolog(f"successfully fetched data")
-        else:
-            self.errorlog(f"failed to fetch data: {query.error}")
-            self.dict = None
+            with self.pending_lock:
+                if self.flushes != flushes:
+                    continue
+
+                # Changes that haven't been written yet are newer than the database.
+                new_dict.update(self.flushing or dict())
+                new_dict.update(self.pending or dict())
+                self.dict = new_dict
+
+            self.infolog("successfully fetched data")
+            return
+
+    def is_loaded(self) -> bool:
+        """Check if the table's data has been loaded into memory."""
+        return self.dict is not None
 
     def get(self, server: Guild) -> Optional[int]:
         """Get the value from a given module for a given server."""
-        # Check that values are loaded, if not try again.
-        if self.dict is None:
-            self.load_from_db()
-
-        # Check that they loaded properly, otherwise return None.
+        # Tables are loaded on the database worker, never from here.
+        # If it hasn't been loaded yet (or failed to load) return None.
         if self.dict is None:
             return None
 
@@ -100,6 +134,21 @@ class ABCTableDict(ABCTableBase):
             self.dict[key] = value
             return True
 
+    def update_memory(self, rows: List[Dict[Any, Any]]) -> None:
+        """Update the dictionary with rows that were written by update_many."""
+        if self.dict is None:
+            self.load_from_db()
+            return
+
+        key_column = self.primary_keys[0]
+        value_column = self.secondary_keys[0]
+        with self.pending_lock:
+            for pairs in rows:
+                # What was just written is newer than what's waiting to be.
+                if self.pending:
+                    self.pending.pop(pairs[key_column], None)
+                self.dict[pairs[key_column]] = pairs[value_column]
+
     def set(self, object: Union[TextChannel, Role]) -> bool:
         """Set the value using a TextChannel or Role object."""
         return self.upsert(object.guild, object.id)
@@ -110,6 +159,9 @@ class ABCTableDict(ABCTableBase):
 
     def upsert(self, server: Guild, value: Union[int, bool]) -> bool:
         """Insert or update the value for `server.id` with `value`."""
+        if not self.durable:
+            return self.upsert_behind(server, value)
+
         query = db_execute(self.dbpath, self.insert, (server.id, value, value))
 
         if query.error is not None:
@@ -127,6 +179,55 @@ class ABCTableDict(ABCTableBase):
                 f"set {server.name} to {value}")
             return True
 
+    def upsert_behind(self, server: Guild, value: Union[int, bool]) -> bool:
+        """Update the value in the dictionary, leaving the database write for flush."""
+        if not self.update_dictionary(server.id, value):
+            self.errorlog(
+                f"failed to update dictionary for {server.name} to {value}")
+            return False
+
+        with self.pending_lock:
+            if self.pending is None:
+                self.pending = dict()
+            self.pending[server.id] = value
+
+        self.infolog(
+            f"set {server.name} to {value} (not yet written)")
+        return True
+
+    def flush(self) -> bool:
+        """Write all pending changes to the database in a single transaction."""
+        with self.pending_lock:
+            pending = self.pending or dict()
+            self.pending = dict()
+            self.flushing = pending
+
+        if not pending:
+            return True
+
+        conn = db_connect(self.dbpath)
+        try:
+            with conn:
+                conn.executemany(
+                    self.insert, [ (key, value, value) for key, value in pending.items() ])
+
+        except sqlite3.Error as e:
+            # Try again next time, unless the value has been changed since.
+            with self.pending_lock:
+                for key, value in pending.items():
+                    self.pending.setdefault(key, value)
+                self.flushing = None
+                self.flushes += 1
+            self.errorlog(f"failed to write {len(pending)} changes: {e}")
+            return False
+
+        with self.pending_lock:
+            self.flushing = None
+            self.flushes += 1
+
+        self.infolog(f"wrote {len(pending)} changes")
+        return True
+
     def infolog(self, msg: str) -> None:
         """Write a message to the log, prefixing it with the module name."""
         self.logger.info(f"{YELLOW_B}{self.name} {GREEN}{msg}{RESET}")
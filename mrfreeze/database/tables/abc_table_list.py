@@ -1,11 +1,21 @@
 """Abstract base class for data best stored in lists."""
 
 import logging
+import sqlite3
+import threading
 from typing import Any
+from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Set
+from typing import Tuple
 
 from .abc_table_base import ABCTableBase
+from ..helpers import db_connect
+from ..helpers import db_execute
+
+Row = Tuple[Any, ...]
+Key = Tuple[Any, ...]
 
 
 class ABCTableList(ABCTableBase):
@@ -14,6 +24,15 @@ class ABCTableList(ABCTableBase):
 
     This class defines a number of properties and methods common to all
     such tables, making them easier to work with.
+
+    Rows are kept in memory as tuples with the primary keys first, then the
+    secondary keys, in a dictionary keyed on the primary key values. On top
+    of that each column in index_columns gets an index from value to the
+    keys of the rows with that value, so both looking up a single row and
+    finding all rows of for example a server are done without any queries.
+
+    The select_all query of a subclass must select the primary keys followed
+    by the secondary keys, in the same order as they're listed.
     """
 
     # General properties
@@ -21,19 +40,148 @@ class ABCTableList(ABCTableBase):
     table_name: str
     dbpath: str
     logger: logging.Logger
-    entries: Optional[List[Any]]
+    entries: Optional[Dict[Key, Row]] = None
+    index_columns: Tuple[str, ...] = tuple()
+    indexes: Dict[str, Dict[Any, Set[Key]]]
+
+    # The in memory data is updated from the database worker while it's
+    # being read from the event loop, every table has a lock of its own
+    # which is held while the entries or indexes are read or changed.
+    memory_lock: threading.RLock
 
     # SQL commands
     select_all: str
     insert: str
     table: str
 
-    # Placeholder to make sure the module type checks.
-    def upsert(self, key: Any, value: Any) -> bool:
-        """Insert or update something into the database."""
-        pass
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        """Get the names of the columns of a row, in order."""
+        return self.primary_keys + self.secondary_keys
+
+    def key_of(self, row: Row) -> Key:
+        """Get the primary key values of a row."""
+        return row[:len(self.primary_keys)]
 
-    # Placeholder to make sure the module type checks.
     def load_from_db(self) -> None:
-        """Load all data from the database into memory."""
-        pass
+        """Load all the rows of the table into memory, and build the indexes."""
+        query = db_execute(self.dbpath, self.select_all, tuple())
+
+        if query.error is not None:
+            self.errorlog(f"failed to fetch data: {query.error}")
+            with self.memory_lock:
+                self.entries = None
+                self.indexes = dict()
+            return
+
+        with self.memory_lock:
+            self.entries = dict()
+            self.indexes = { column: dict() for column in self.index_columns }
+            for row in query.output:
+                self.add_to_memory(tuple(row))
+
+        self.infolog("successfully fetched data")
+
+    def is_loaded(self) -> bool:
+        """Check if the table's data has been loaded into memory."""
+        return self.entries is not None
+
+    def add_to_memory(self, row: Row) -> None:
+        """Add a row to the entries and indexes, replacing any row with the same key."""
+        key = self.key_of(row)
+        self.remove_from_memory(key)
+        self.entries[key] = row
+        for column in self.index_columns:
+            value = row[self.columns.index(column)]
+            self.indexes[column].setdefault(value, set()).add(key)
+
+    def remove_from_memory(self, key: Key) -> None:
+        """Remove the row with the given key from the entries and indexes."""
+        row = self.entries.pop(key, None)
+        if row is None:
+            return
+
+        for column in self.index_columns:
+            value = row[self.columns.index(column)]
+            keys = self.indexes[column].get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.indexes[column][value]
+
+    def contains(self, *key: Any) -> bool:
+        """Check if there's a row with the given primary key values."""
+        with self.memory_lock:
+            if not self.is_loaded():
+                return False
+            return key in self.entries
+
+    def get(self, *key: Any) -> Optional[Row]:
+        """Get the row with the given primary key values, if there is one."""
+        with self.memory_lock:
+            if not self.is_loaded():
+                return None
+            return self.entries.get(key)
+
+    def find(self, column: str, value: Any) -> List[Row]:
+        """Get all rows where an indexed column has the given value."""
+        with self.memory_lock:
+            if not self.is_loaded():
+                return list()
+
+            keys = self.indexes[column].get(value, set())
+            return [ self.entries[key] for key in keys ]
+
+    def all(self) -> List[Row]:
+        """Get all rows."""
+        with self.memory_lock:
+            if not self.is_loaded():
+                return list()
+
+            return list(self.entries.values())
+
+    def upsert(self, key: Key, value: Row) -> bool:
+        """Insert or update the row with primary key values key and secondary values value."""
+        return self.update(dict(zip(self.columns, tuple(key) + tuple(value))))
+
+    def update(self, pairs: Dict[Any, Any], accept_none: bool = False) -> bool:
+        """Update (or insert) a row in the database, then in memory."""
+        if not super().update(pairs, accept_none):
+            return False
+
+        self.update_memory([ pairs ])
+        return True
+
+    def update_memory(self, rows: List[Dict[Any, Any]]) -> None:
+        """Update the entries and indexes with rows that have been written."""
+        if not self.ensure_loaded():
+            return
+
+        with self.memory_lock:
+            for pairs in rows:
+                self.add_to_memory(tuple([ pairs[column] for column in self.columns ]))
+
+    def delete(self, *key: Any) -> bool:
+        """Delete the row with the given primary key values."""
+        return self.delete_many([ key ])
+
+    def delete_many(self, keys: List[Key]) -> bool:
+        """Delete all the rows with the given primary key values in a single transaction."""
+        where = " AND ".join(f"{column} = ?" for column in self.primary_keys)
+        sql = f"DELETE FROM {self.table_name} WHERE {where}"
+
+        conn = db_connect(self.dbpath)
+        try:
+            with conn:
+                conn.executemany(sql, [ tuple(key) for key in keys ])
+        except sqlite3.Error as e:
+            self.errorlog(f"failed to delete {len(keys)} rows: {e}")
+            return False
+
+        with self.memory_lock:
+            if self.entries is not None:
+                for key in keys:
+                    self.remove_from_memory(tuple(key))
+
+        self.infolog(f"deleted {len(keys)} rows")
+        return True
@@ -1,6 +1,7 @@
 """Freeze mutes stores information about which servers have inactivated Mr Freeze."""
 
 import logging
+import threading
 
 from discord import Guild
 
@@ -15,7 +16,12 @@ class FreezeMutes(ABCTableDict):
         self.name = "freeze mutes"
         self.table_name = "freeze_mutes"
         self.dict = None
+        self.pending_lock = threading.Lock()
         self.logger = logger
+
+        # Toggled on and off by anyone with a mod role, so changes
+        # tend to come in bursts and are cheap to lose.
+        self.durable = False
         self.primary_keys = ("server",)
         self.secondary_keys = ("muted",)
 
@@ -44,5 +50,7 @@ class FreezeMutes(ABCTableDict):
 
         Return the new value.
         """
+        # Runs on the database worker, so the current value can be loaded here.
+        self.ensure_loaded()
         new_value = not self.get(server)
         return self.upsert(server, new_value)
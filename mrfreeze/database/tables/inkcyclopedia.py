@@ -1,34 +1,295 @@
 """Store inks from the inkcyclopedia."""
 
+import hashlib
 import logging
+import sqlite3
+import threading
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
 
 from .abc_table_dict import ABCTableDict
+from ..helpers import db_connect
+
+
+class InkRecord(NamedTuple):
+    """An ink as fetched from Airtable, or a plain (name, url, regex) tuple."""
+
+    name:      str
+    url:       str
+    regex:     str
+    record_id: str = ""
+    modified:  str = ""
+
+
+class InkRow(NamedTuple):
+    """A single row of the inkcyclopedia_inks table."""
+
+    name:      str
+    url:       str
+    regex:     str
+    position:  int
+    hash:      str
+    record_id: str = ""
+    modified:  str = ""
 
 
 class InkcyclopediaInks(ABCTableDict):
-    """Class for handling the mute_roles table."""
+    """
+    Class for handling the inkcyclopedia_inks table.
+
+    Unlike the other tables the inks aren't kept in memory, there can be
+    thousands of them and the Inkcyclopedia only needs them when it builds
+    its matcher, which reads them a chunk at a time with iter_rows.
+    """
 
     def __init__(self, dbpath: str, logger: logging.Logger) -> None:
         self.dbpath = dbpath
         self.name = "inkcyclopedia inks"
         self.table_name = "inkcyclopedia_inks"
         self.dict = None
+        self.pending_lock = threading.Lock()
         self.logger = logger
         self.primary_keys = ("name",)
-        self.secondary_keys = ("url", "regex")
+        self.secondary_keys = ("url", "regex", "position", "hash", "record_id", "modified")
 
         # SQL commands
-        self.select_all = f"SELECT name, url, regex FROM {self.table_name}"
+        self.select_all = f"""
+        SELECT name, url, regex, position, hash, record_id, modified
+        FROM {self.table_name} ORDER BY position;
+        """
+
+        # Reads the chunk of inks following a given position and name.
+        self.select_chunk = f"""
+        SELECT name, url, regex, position, hash, record_id, modified
+        FROM {self.table_name} WHERE (position, name) > (?, ?)
+        ORDER BY position, name LIMIT ?;
+        """
+
+        self.select_any = f"SELECT 1 FROM {self.table_name} LIMIT 1"
+
+        self.select_hashes = f"""
+        SELECT name, position, hash, record_id, modified FROM {self.table_name}
+        """
+
+        self.select_last_modified = f"SELECT MAX(modified) FROM {self.table_name}"
 
         self.insert = f"""
         INSERT INTO {self.table_name}
-            (name, url, regex) VALUES (?, ?, ?)
-        ON CONFLICT(name) DO UPDATE SET url = ?, regex = ?;
+            (name, url, regex, position, hash, record_id, modified)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            url = ?, regex = ?, position = ?, hash = ?, record_id = ?, modified = ?;
         """
 
+        self.delete = f"DELETE FROM {self.table_name} WHERE name = ?"
+
         self.table = f"""
         CREATE TABLE IF NOT EXISTS {self.table_name} (
             name      VARCHAR(63) NOT NULL PRIMARY KEY,
             url       VARCHAR(255) NOT NULL,
-            regex     VARCHAR(127)
+            regex     VARCHAR(127),
+            position  INTEGER NOT NULL DEFAULT 0,
+            hash      CHAR(40) NOT NULL DEFAULT '',
+            record_id VARCHAR(31) NOT NULL DEFAULT '',
+            modified  VARCHAR(31) NOT NULL DEFAULT ''
         );"""
+
+        # Columns added after the table was first created.
+        self.added_columns = {
+            "position":  "INTEGER NOT NULL DEFAULT 0",
+            "hash":      "CHAR(40) NOT NULL DEFAULT ''",
+            "record_id": "VARCHAR(31) NOT NULL DEFAULT ''",
+            "modified":  "VARCHAR(31) NOT NULL DEFAULT ''",
+        }
+
+    @staticmethod
+    def ink_hash(name: str, url: str, regex: str) -> str:
+        """Calculate the content hash of an ink."""
+        content = "\0".join((name, url, regex))
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def create_table(self) -> None:
+        """Create the table, adding any columns missing from an older version of it."""
+        super().create_table()
+
+        conn = db_connect(self.dbpath)
+        with conn:
+            try:
+                c = conn.cursor()
+                c.execute(f"PRAGMA table_info({self.table_name})")
+                columns = { row[1] for row in c.fetchall() }
+                for column, definition in self.added_columns.items():
+                    if column not in columns:
+                        c.execute(
+                            f"ALTER TABLE {self.table_name} ADD COLUMN {column} {definition}")
+                        self.infolog(f"added column {column}")
+
+            except sqlite3.Error as e:
+                self.errorlog(f"failed to add columns to table: {e}")
+
+    def load_from_db(self) -> None:
+        """Do nothing, the inks aren't kept in memory."""
+        pass
+
+    def is_loaded(self) -> bool:
+        """Check if the table is loaded, which it always is since it keeps nothing in memory."""
+        return True
+
+    def iter_rows(self, chunk_size: int = 500) -> Iterator[List[InkRow]]:
+        """
+        Read all the inks in order of position, chunk_size rows at a time.
+
+        Every chunk is a query of its own, continuing after the last row of
+        the previous chunk, so no cursor is left open on the shared connection
+        in between chunks.
+        """
+        after: Tuple[int, str] = (-1, "")
+        while True:
+            conn = db_connect(self.dbpath)
+            chunk = conn.execute(self.select_chunk, after + (chunk_size,)).fetchall()
+            if not chunk:
+                break
+
+            rows = [ InkRow(*row) for row in chunk ]
+            yield rows
+            after = (rows[-1].position, rows[-1].name)
+
+    def is_empty(self) -> bool:
+        """Check if there are no inks in the table, without loading them."""
+        try:
+            return db_connect(self.dbpath).execute(self.select_any).fetchone() is None
+        except sqlite3.Error as e:
+            self.errorlog(f"failed to check for inks: {e}")
+            return True
+
+    def last_modified(self) -> Optional[str]:
+        """Get the most recent modification stamp of any ink, if any ink has one."""
+        try:
+            conn = db_connect(self.dbpath)
+            stamp = conn.execute(self.select_last_modified).fetchone()[0]
+        except sqlite3.Error as e:
+            self.errorlog(f"failed to fetch last modification: {e}")
+            return None
+
+        return stamp or None
+
+    def make_row(self, ink: Sequence[str], position: int) -> InkRow:
+        """Create a row from an ink record and its position."""
+        record = InkRecord(*ink)
+        ink_hash = self.ink_hash(record.name, record.url, record.regex)
+        return InkRow(record.name, record.url, record.regex, position, ink_hash,
+                      record.record_id, record.modified)
+
+    def replace_all(self, inks: Iterable[Sequence[str]]) -> bool:
+        """
+        Replace the contents of the table with inks.
+
+        Inks are InkRecords or (name, url, regex) tuples, their position is the
+        order they're given in. Only inks that are new or have changed are
+        written, and inks that are no longer present are deleted, all in a
+        single transaction.
+        """
+        rows: Dict[str, InkRow] = dict()
+        for ink in inks:
+            # If a name appears twice the first one wins, like when matching.
+            if ink[0] not in rows:
+                rows[ink[0]] = self.make_row(ink, len(rows))
+
+        conn = db_connect(self.dbpath)
+        try:
+            with conn:
+                c = conn.cursor()
+                c.execute(self.select_hashes)
+                existing = { row[0]: tuple(row[1:]) for row in c.fetchall() }
+
+                changed = [ row for row in rows.values()
+                            if existing.get(row.name) != tuple(row[3:]) ]
+                stale = [ (name,) for name in existing if name not in rows ]
+
+                c.executemany(
+                    self.insert, [ self.insert_values(row._asdict()) for row in changed ])
+                c.executemany(self.delete, stale)
+
+        except sqlite3.Error as e:
+            self.errorlog(f"failed to replace inks: {e}")
+            return False
+
+        self.infolog(
+            f"replaced inks: {len(changed)} written, {len(stale)} deleted, " +
+            f"{len(rows) - len(changed)} unchanged")
+        return True
+
+    def apply_changes(
+        self,
+        changed: Iterable[Sequence[str]],
+        removed: Iterable[str] = ()
+    ) -> Optional[Tuple[List[InkRow], List[str]]]:
+        """
+        Patch the table with inks that changed since the last sync.
+
+        changed are InkRecords of inks that were added or edited, removed are
+        the record IDs of inks that should no longer be in the table. Edited
+        inks keep their position, new inks go at the end. An ink that was
+        renamed is treated as removed and added under its new name.
+
+        Returns the rows that were written and the names of the inks that
+        were deleted, or None if the table couldn't be updated.
+        """
+        conn = db_connect(self.dbpath)
+        try:
+            with conn:
+                c = conn.cursor()
+                c.execute(self.select_hashes)
+                existing = { row[0]: tuple(row[1:]) for row in c.fetchall() }
+                by_record = { values[2]: name for name, values in existing.items()
+                              if values[2] }
+                next_position = max((v[0] for v in existing.values()), default=-1) + 1
+
+                deleted: Dict[str, None] = dict()
+                for record_id in removed:
+                    if record_id in by_record:
+                        deleted[by_record[record_id]] = None
+
+                written: Dict[str, InkRow] = dict()
+                for ink in changed:
+                    record = InkRecord(*ink)
+                    old_name = by_record.get(record.record_id)
+                    if old_name is not None and old_name != record.name:
+                        deleted[old_name] = None
+
+                    if record.name in written:
+                        continue
+                    elif record.name in existing and record.name not in deleted:
+                        position = existing[record.name][0]
+                    else:
+                        position = next_position
+                        next_position += 1
+
+                    row = self.make_row(record, position)
+                    if existing.get(row.name) != tuple(row[3:]) or row.name in deleted:
+                        written[row.name] = row
+
+                for name in written:
+                    deleted.pop(name, None)
+
+                c.executemany(self.delete, [ (name,) for name in deleted ])
+                c.executemany(
+                    self.insert, [ self.insert_values(r._asdict()) for r in written.values() ])
+
+        except sqlite3.Error as e:
+            self.errorlog(f"failed to apply changes: {e}")
+            return None
+
+        self.infolog(f"applied changes: {len(written)} written, {len(deleted)} deleted")
+        return list(written.values()), list(deleted)
+
+    def update_memory(self, rows: List[Dict[str, Any]]) -> None:
+        """Do nothing, the inks written by update_many aren't kept in memory."""
+        pass
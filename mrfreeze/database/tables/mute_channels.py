@@ -1,6 +1,7 @@
 """Mute channels stores information about which channels servers use for mutes."""
 
 import logging
+import threading
 
 from .abc_table_dict import ABCTableDict
 
@@ -13,6 +14,7 @@ class MuteChannels(ABCTableDict):
         self.name = "mute channels"
         self.table_name = "mute_channels"
         self.dict = None
+        self.pending_lock = threading.Lock()
         self.logger = logger
         self.primary_keys = ("server",)
         self.secondary_keys = ("channel",)
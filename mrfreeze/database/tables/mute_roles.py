@@ -1,6 +1,7 @@
 """Store information about which roles servers use for mute."""
 
 import logging
+import threading
 
 from .abc_table_dict import ABCTableDict
 
@@ -13,6 +14,7 @@ class MuteRoles(ABCTableDict):
         self.name = "mute roles"
         self.table_name = "mute_roles"
         self.dict = None
+        self.pending_lock = threading.Lock()
         self.logger = logger
         self.primary_keys = ("server",)
         self.secondary_keys = ("role",)
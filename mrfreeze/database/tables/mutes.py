@@ -0,0 +1,112 @@
+"""Mutes stores who's been banished, on which server and until when."""
+
+import logging
+import sqlite3
+import threading
+from typing import Any
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .abc_table_list import ABCTableList
+from ..helpers import db_connect
+from ..helpers import db_epoch
+
+
+class Mutes(ABCTableList):
+    """
+    Class for handling the mutes table.
+
+    The time a mute ends, until, is stored as seconds since the epoch, or
+    NULL for mutes that never end. Both until and (server, until) are
+    indexed, so finding the mutes that have expired is a range scan of
+    the index rather than a look at every mute.
+    """
+
+    def __init__(self, dbpath: str, logger: logging.Logger) -> None:
+        self.dbpath = dbpath
+        self.name = "mutes"
+        self.table_name = "mutes"
+        self.entries = None
+        self.memory_lock = threading.RLock()
+        self.logger = logger
+        self.primary_keys = ("server", "member")
+        self.secondary_keys = ("voluntary", "until")
+        self.index_columns = ("server",)
+
+        # SQL commands
+        self.select_all = f"SELECT server, member, voluntary, until FROM {self.table_name}"
+
+        self.select_expired = f"""
+        SELECT server, member, voluntary, until FROM {self.table_name}
+        WHERE until <= ? ORDER BY until;
+        """
+
+        self.select_server_expired = f"""
+        SELECT server, member, voluntary, until FROM {self.table_name}
+        WHERE server = ? AND until <= ? ORDER BY until;
+        """
+
+        self.insert = f"""
+        INSERT INTO {self.table_name}
+            (server, member, voluntary, until) VALUES (?, ?, ?, ?)
+        ON CONFLICT(server, member) DO UPDATE SET voluntary = ?, until = ?;
+        """
+
+        # The primary key doubles as the index on server.
+        self.table = f"""
+        CREATE TABLE IF NOT EXISTS {self.table_name} (
+            server      INTEGER NOT NULL,
+            member      INTEGER NOT NULL,
+            voluntary   BOOLEAN NOT NULL,
+            until       INTEGER,
+            PRIMARY KEY (server, member)
+        );"""
+
+        self.indexes_sql = (
+            f"CREATE INDEX IF NOT EXISTS {self.table_name}_until " +
+            f"ON {self.table_name} (until)",
+            f"CREATE INDEX IF NOT EXISTS {self.table_name}_server_until " +
+            f"ON {self.table_name} (server, until)",
+        )
+
+    def create_table(self) -> None:
+        """Create the table and its indexes, converting end times stored as text."""
+        super().create_table()
+
+        conn = db_connect(self.dbpath)
+        try:
+            with conn:
+                c = conn.cursor()
+                for sql in self.indexes_sql:
+                    c.execute(sql)
+
+                # Mutes imported from or written by older versions store
+                # until as a "%Y-%m-%d %H:%M:%S" string in local time.
+                c.execute(f"""
+                    SELECT server, member, until FROM {self.table_name}
+                    WHERE typeof(until) = 'text'""")
+                converted = [ (db_epoch(until), server, member)
+                              for server, member, until in c.fetchall() ]
+                c.executemany(
+                    f"UPDATE {self.table_name} SET until = ? WHERE server = ? AND member = ?",
+                    converted)
+
+        except (sqlite3.Error, ValueError) as e:
+            self.errorlog(f"failed to index table: {e}")
+            return
+
+        if converted:
+            self.infolog(f"converted {len(converted)} end times to epoch")
+
+    def expired(self, now: int, server: Optional[int] = None) -> List[Tuple[Any, ...]]:
+        """Get the mutes that ended at or before now, optionally only on one server."""
+        try:
+            conn = db_connect(self.dbpath)
+            if server is None:
+                return conn.execute(self.select_expired, (now,)).fetchall()
+            return conn.execute(self.select_server_expired, (server, now)).fetchall()
+
+        except sqlite3.Error as e:
+            self.errorlog(f"failed to fetch expired mutes: {e}")
+            return list()
@@ -0,0 +1,38 @@
+"""Region blacklist stores which members aren't allowed to change their region."""
+
+import logging
+import threading
+
+from .abc_table_list import ABCTableList
+
+
+class RegionBlacklist(ABCTableList):
+    """Class for handling the region_blacklist table."""
+
+    def __init__(self, dbpath: str, logger: logging.Logger) -> None:
+        self.dbpath = dbpath
+        self.name = "region blacklist"
+        self.table_name = "region_blacklist"
+        self.entries = None
+        self.memory_lock = threading.RLock()
+        self.logger = logger
+        self.primary_keys = ("server", "member")
+        self.secondary_keys = tuple()
+        self.index_columns = ("server",)
+
+        # SQL commands
+        self.select_all = f"SELECT server, member FROM {self.table_name}"
+
+        self.insert = f"""
+        INSERT INTO {self.table_name}
+            (server, member) VALUES (?, ?)
+        ON CONFLICT(server, member) DO NOTHING;
+        """
+
+        # The primary key doubles as the index on server.
+        self.table = f"""
+        CREATE TABLE IF NOT EXISTS {self.table_name} (
+            server      INTEGER NOT NULL,
+            member      INTEGER NOT NULL,
+            PRIMARY KEY (server, member)
+        );"""
@@ -0,0 +1,82 @@
+"""Store miscellaneous per server settings, like how long self mutes last."""
+
+import logging
+import threading
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from discord import Guild
+
+from .abc_table_list import ABCTableList
+
+Listener = Callable[[int, str, str], None]
+
+
+class ServerSettings(ABCTableList):
+    """
+    Class for handling the server_settings table.
+
+    Every setting is a string value stored under a server ID and a setting
+    name. Listeners can be added for a setting name, they're called with the
+    server ID, setting name and new value whenever that setting changes.
+    Listeners are called on the thread that made the change, usually the
+    database worker, so they should be quick and leave the event loop alone.
+    """
+
+    def __init__(self, dbpath: str, logger: logging.Logger) -> None:
+        self.dbpath = dbpath
+        self.name = "server settings"
+        self.table_name = "server_settings"
+        self.entries = None
+        self.memory_lock = threading.RLock()
+        self.logger = logger
+        self.primary_keys = ("server", "setting")
+        self.secondary_keys = ("value",)
+        self.index_columns = ("server",)
+        self.listeners: Dict[str, List[Listener]] = dict()
+
+        # SQL commands
+        self.select_all = f"SELECT server, setting, value FROM {self.table_name}"
+
+        self.insert = f"""
+        INSERT INTO {self.table_name}
+            (server, setting, value) VALUES (?, ?, ?)
+        ON CONFLICT(server, setting) DO UPDATE SET value = ?;
+        """
+
+        self.table = f"""
+        CREATE TABLE IF NOT EXISTS {self.table_name} (
+            server      INTEGER NOT NULL,
+            setting     VARCHAR(63) NOT NULL,
+            value       TEXT NOT NULL,
+            PRIMARY KEY (server, setting)
+        );"""
+
+    def get_value(self, server: Guild, setting: str) -> Optional[str]:
+        """Get the value of a setting for a given server, if it's been set."""
+        row = self.get(server.id, setting)
+        if row is None:
+            return None
+        return row[2]
+
+    def set_value(self, server: Guild, setting: str, value: str) -> bool:
+        """Set the value of a setting for a given server."""
+        return self.upsert((server.id, setting), (value,))
+
+    def add_listener(self, setting: str, listener: Listener) -> None:
+        """Call listener with server ID, setting and value whenever setting changes."""
+        self.listeners.setdefault(setting, list()).append(listener)
+
+    def update_memory(self, rows: List[Dict[Any, Any]]) -> None:
+        """Update the entries with rows that have been written, then notify listeners."""
+        super().update_memory(rows)
+
+        for pairs in rows:
+            for listener in self.listeners.get(pairs["setting"], list()):
+                try:
+                    listener(pairs["server"], pairs["setting"], pairs["value"])
+                except Exception as e:
+                    self.errorlog(f"listener for {pairs['setting']} failed: {e}")
@@ -1,6 +1,7 @@
 """Trash channels stores information about which channels servers use for trash."""
 
 import logging
+import threading
 
 from .abc_table_dict import ABCTableDict
 
@@ -13,6 +14,7 @@ class TrashChannels(ABCTableDict):
         self.name = "trash channels"
         self.table_name = "trash_channels"
         self.dict = None
+        self.pending_lock = threading.Lock()
         self.logger = logger
         self.primary_keys = ("server",)
         self.secondary_keys = ("channel",)
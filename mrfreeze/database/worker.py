@@ -0,0 +1,55 @@
+"""
+Worker running database work on a thread of its own.
+
+SQLite calls block until they're done, which inside a coroutine means the
+whole bot waits for them, gateway heartbeats included. A slow disk or a
+database locked by some other process could stall the bot for seconds.
+
+Instead the cogs hand their database work to the worker and await it.
+The worker has a single thread, so database work is carried out one job
+at a time in the order it was submitted, and that thread gets its own
+long-lived connections from the connection manager.
+"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import Tuple
+from typing import TypeVar
+
+from .helpers import ExecutionResult
+from .helpers import db_execute
+
+T = TypeVar("T")
+
+
+class DatabaseWorker:
+    """Async facade running blocking database functions on a dedicated thread."""
+
+    def __init__(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call func with the given arguments on the database thread, wait for the result."""
+        loop = asyncio.get_event_loop()
+        job = functools.partial(func, *args, **kwargs)
+        return await loop.run_in_executor(self.executor, job)
+
+    async def execute(
+        self,
+        dbpath: str,
+        sql: str,
+        values: Tuple[Any, ...] = ()
+    ) -> ExecutionResult:
+        """Execute a database query on the database thread."""
+        return await self.run(db_execute, dbpath, sql, values)
+
+    async def close(self) -> None:
+        """Finish all submitted jobs and stop the database thread, without blocking the loop."""
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, functools.partial(self.executor.shutdown, wait=True))
+        self.logger.debug("Database worker stopped")
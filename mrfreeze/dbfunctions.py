@@ -8,13 +8,14 @@ import datetime
 import sqlite3
 
 from mrfreeze import colors
+from mrfreeze.database.helpers import connections
+from mrfreeze.database.helpers import db_epoch  # noqa: F401
 
 
 def db_connect(bot, dbname):
-    """Create a connection to a database."""
+    """Get the shared connection to a database, don't close it."""
     db_file = f"{bot.db_prefix}/{dbname}.db"
-    conn = sqlite3.connect(db_file)
-    return conn
+    return connections.connect(db_file)
 
 
 def db_create(bot, dbname, tables, comment=None):
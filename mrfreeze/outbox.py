@@ -0,0 +1,220 @@
+"""
+Module for the outbox, a per-channel queue for outgoing replies.
+
+Listeners such as the temperature converter and the Inkcyclopedia reply to
+messages without being asked to. A burst of such messages in one channel
+would have them fire off one API request each, quickly running into
+Discord's rate limits. Instead they hand their replies to the outbox, which
+waits a short while and then merges everything that was queued for the
+channel into as few messages as possible.
+
+Replies addressed to an author are only merged with other replies to the
+same author, so every such message still answers a single person. Replies
+without an author, like the Inkcyclopedia's, are merged per channel no
+matter who triggered them. Queues are removed as soon as they're empty.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+from discord import Embed
+from discord import File
+from discord import Message
+from discord.abc import Messageable
+from discord.abc import User
+
+from mrfreeze.colors import CYAN, RED, RESET, YELLOW_B
+
+
+QueueKey = Tuple[int, Optional[int]]
+
+
+class OutboxEntry(NamedTuple):
+    """Class for holding a single queued reply."""
+
+    content: str
+    files:   List[File]
+    embed:   Optional[Embed]
+    future:  "asyncio.Future[Optional[Message]]"
+
+
+class Outbox:
+    """Per-channel send queue coalescing replies to an author sent in quick succession."""
+
+    # Limits imposed by Discord on a single message.
+    max_length = 2000
+    max_files = 10
+
+    def __init__(self, window: float = 0.5, max_pending: int = 25) -> None:
+        self.window = window
+        self.max_pending = max_pending
+        self.pending: Dict[QueueKey, Deque[OutboxEntry]] = dict()
+        self.flushers: Dict[QueueKey, "asyncio.Task[None]"] = dict()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        # queued:  replies accepted into a queue
+        # merged:  replies that were merged into another reply's message
+        # sent:    messages actually sent
+        # dropped: replies that were never sent
+        self.metrics: Dict[str, int] = {
+            "queued": 0,
+            "merged": 0,
+            "sent": 0,
+            "dropped": 0,
+        }
+
+    async def send(
+        self,
+        channel: Messageable,
+        content: str = "",
+        *,
+        file: Optional[File] = None,
+        embed: Optional[Embed] = None,
+        author: Optional[User] = None
+    ) -> Optional[Message]:
+        """
+        Queue a reply to author to be sent to channel.
+
+        Returns the message the reply ended up in once it's been sent,
+        or None if the reply was dropped. Replies that are empty, too long
+        or that don't fit in a full queue are dropped.
+        """
+        files = [ file ] if file is not None else list()
+
+        if not content and not files and embed is None:
+            self.drop(channel, "reply is empty")
+            return None
+
+        if len(content) > self.max_length:
+            self.drop(channel, "reply is too long")
+            return None
+
+        # Without a window there's nothing to coalesce, send it right away.
+        if self.window <= 0:
+            self.metrics["sent"] += 1
+            return await self.deliver(channel, content, files, embed)
+
+        key = (channel.id, author.id if author is not None else None)
+        queue = self.pending.setdefault(key, deque())
+        if len(queue) >= self.max_pending:
+            self.drop(channel, "queue is full")
+            return None
+
+        loop = asyncio.get_event_loop()
+        future: "asyncio.Future[Optional[Message]]" = loop.create_future()
+        queue.append(OutboxEntry(content, files, embed, future))
+        self.metrics["queued"] += 1
+
+        if key not in self.flushers:
+            self.flushers[key] = loop.create_task(self.flush(channel, key))
+
+        return await future
+
+    async def flush(self, channel: Messageable, key: QueueKey) -> None:
+        """Wait for the window to pass, then send everything queued under key."""
+        try:
+            while self.pending.get(key):
+                await asyncio.sleep(self.window)
+                queue = self.pending[key]
+                entries = list(queue)
+                queue.clear()
+
+                for batch in self.batches(entries):
+                    await self.send_batch(channel, batch)
+        finally:
+            self.flushers.pop(key, None)
+            # Replies left after a cancellation are dropped by close.
+            queue = self.pending.get(key)
+            if queue is not None and not queue:
+                del self.pending[key]
+
+    async def close(self) -> None:
+        """Cancel every pending flush, replies still queued are never sent."""
+        flushers = list(self.flushers.values())
+        for flusher in flushers:
+            flusher.cancel()
+        await asyncio.gather(*flushers, return_exceptions=True)
+        self.flushers.clear()
+
+        for queue in self.pending.values():
+            for entry in queue:
+                if not entry.future.done():
+                    entry.future.cancel()
+                self.metrics["dropped"] += 1
+        self.pending.clear()
+
+    def batches(self, entries: List[OutboxEntry]) -> Iterator[List[OutboxEntry]]:
+        """Split entries into batches that each fit in a single message."""
+        batch: List[OutboxEntry] = list()
+        length = 0
+        files = 0
+        has_embed = False
+
+        for entry in entries:
+            new_length = length + len(entry.content) + (1 if batch else 0)
+            fits = (new_length <= self.max_length and
+                    files + len(entry.files) <= self.max_files and
+                    not (has_embed and entry.embed is not None))
+
+            if batch and not fits:
+                yield batch
+                batch = list()
+                new_length = len(entry.content)
+                files = 0
+                has_embed = False
+
+            batch.append(entry)
+            length = new_length
+            files += len(entry.files)
+            has_embed = has_embed or entry.embed is not None
+
+        if batch:
+            yield batch
+
+    async def send_batch(self, channel: Messageable, batch: List[OutboxEntry]) -> None:
+        """Send a batch of entries as one message."""
+        content = "\n".join(entry.content for entry in batch if entry.content)
+        files = [ f for entry in batch for f in entry.files ]
+        embeds = [ entry.embed for entry in batch if entry.embed is not None ]
+        embed = embeds[0] if embeds else None
+
+        try:
+            message = await self.deliver(channel, content, files, embed)
+        except Exception as e:
+            self.metrics["dropped"] += len(batch)
+            for entry in batch:
+                if not entry.future.done():
+                    entry.future.set_exception(e)
+            return
+
+        self.metrics["sent"] += 1
+        self.metrics["merged"] += len(batch) - 1
+        for entry in batch:
+            if not entry.future.done():
+                entry.future.set_result(message)
+
+    async def deliver(
+        self,
+        channel: Messageable,
+        content: str,
+        files: List[File],
+        embed: Optional[Embed]
+    ) -> Message:
+        """Send a single message to channel."""
+        if len(files) == 1:
+            return await channel.send(content or None, file=files[0], embed=embed)
+        return await channel.send(content or None, files=files or None, embed=embed)
+
+    def drop(self, channel: Messageable, reason: str) -> None:
+        """Count and log a dropped reply."""
+        self.metrics["dropped"] += 1
+        self.logger.warning(
+            f"{YELLOW_B}Outbox {CYAN}dropped reply to {channel}: {RED}{reason}{RESET}")
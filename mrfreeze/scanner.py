@@ -0,0 +1,133 @@
+"""
+Module for the message scanner used by passive listeners.
+
+Passive listeners such as the temperature converter and the Inkcyclopedia
+don't respond to commands, they look through every single message for
+something they can react to. Rather than having each of them run their own
+regexes over every message, they register a trigger with the scanner.
+
+Each trigger has a cheap prefilter, such as "contains a digit", and
+optionally a more expensive pattern. The prefilters of all triggers are
+merged into a single regex so that the vast majority of messages, which
+don't trigger anything at all, are rejected after one fast pass.
+
+The handlers of all matching triggers run concurrently. A handler raising
+doesn't affect the others, its exception is passed on to the error handler
+(normally the bot's on_error) just like an exception in any other event.
+"""
+
+import asyncio
+import logging
+import re
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import NamedTuple
+from typing import Optional
+from typing import Pattern
+from typing import Union
+
+from discord import Message
+
+from mrfreeze.colors import RED, RESET, YELLOW_B
+
+
+Handler = Callable[[Message], Awaitable[None]]
+ErrorHandler = Callable[..., Awaitable[None]]
+
+
+class ScanTrigger(NamedTuple):
+    """Class for holding information about a registered trigger."""
+
+    name:      str
+    prefilter: Pattern[str]
+    pattern:   Optional[Pattern[str]]
+    handler:   Handler
+
+
+class MessageScanner:
+    """Scanner dispatching incoming messages to the passive listeners."""
+
+    def __init__(self, on_error: Optional[ErrorHandler] = None) -> None:
+        self.on_error = on_error
+        self.triggers: Dict[str, ScanTrigger] = dict()
+        self.prefilter: Optional[Pattern[str]] = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def register(
+        self,
+        name: str,
+        prefilter: str,
+        handler: Handler,
+        pattern: Optional[Union[str, Pattern[str]]] = None
+    ) -> None:
+        """
+        Register a new trigger with the scanner.
+
+        The prefilter is a regex which should be as cheap as possible, it's
+        run over every message. If it matches, the pattern (if any) is run
+        and only if that matches as well is the handler called.
+
+        Registering a trigger under an existing name replaces the old one.
+        """
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+
+        self.triggers[name] = ScanTrigger(name, re.compile(prefilter), pattern, handler)
+        self.update_prefilter()
+
+    def unregister(self, name: str) -> None:
+        """Remove a trigger from the scanner, if it exists."""
+        if self.triggers.pop(name, None) is not None:
+            self.update_prefilter()
+
+    def update_prefilter(self) -> None:
+        """Merge the prefilters of all triggers into a single regex."""
+        if not self.triggers:
+            self.prefilter = None
+            return
+
+        self.prefilter = re.compile("|".join(
+            f"(?:{trigger.prefilter.pattern})"
+            for trigger in self.triggers.values()
+        ))
+
+    async def scan(self, message: Message) -> None:
+        """Scan a message and call the handlers of all matching triggers."""
+        if self.prefilter is None or message.author.bot:
+            return
+
+        content = message.content
+        if not self.prefilter.search(content):
+            return
+
+        matching = list()
+        for trigger in tuple(self.triggers.values()):
+            if not trigger.prefilter.search(content):
+                continue
+            if trigger.pattern is not None and not trigger.pattern.search(content):
+                continue
+            matching.append(trigger)
+
+        results = await asyncio.gather(
+            *(self.dispatch(trigger, message) for trigger in matching),
+            return_exceptions=True)
+
+        for trigger, result in zip(matching, results):
+            if isinstance(result, Exception):
+                self.logger.error(
+                    f"{YELLOW_B}{trigger.name} {RED}error handler failed: {result}{RESET}")
+
+    async def dispatch(self, trigger: ScanTrigger, message: Message) -> None:
+        """Call the handler of a trigger, reporting any exception it raises."""
+        try:
+            await trigger.handler(message)
+        except Exception:
+            if self.on_error is None:
+                self.logger.exception(
+                    f"{YELLOW_B}{trigger.name} {RED}failed to handle message{RESET}")
+                return
+
+            # Called from within the except block, like discord.py does for
+            # events, so the error handler can get at the traceback.
+            await self.on_error(f"scanner:{trigger.name}", message)
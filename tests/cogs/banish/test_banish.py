@@ -0,0 +1,203 @@
+"""Unittest for the automatic unmutes of the banish cog."""
+
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from mrfreeze import dbfunctions
+from mrfreeze import time
+from mrfreeze.cogs.banish import mute_db
+from mrfreeze.cogs.banish.banish import BanishAndRegion
+from mrfreeze.database.settings import Settings
+
+import pytest
+
+from tests import helpers
+
+
+@pytest.fixture()
+def guild():
+    """Create the guild everyone is banished on."""
+    yield helpers.MockGuild(id=1, name="guild")
+
+
+@pytest.fixture()
+def mute_role():
+    """Create the guild's mute role."""
+    yield helpers.MockRole(name="Antarctica")
+
+
+@pytest.fixture()
+def mute_channel():
+    """Create the guild's mute channel."""
+    yield helpers.MockTextChannel()
+
+
+@pytest.fixture()
+def bot(tmp_path, guild, mute_role, mute_channel):
+    """Create a bot with settings of its own, on a single guild."""
+    bot = helpers.MockMrFreeze()
+    bot.settings = Settings(str(tmp_path / "settings.db"))
+    bot.db_time = dbfunctions.db_time
+    bot.db_epoch = dbfunctions.db_epoch
+    bot.parse_timedelta = time.parse_timedelta
+    bot.current_time = lambda: "now"
+    bot.servertuples = { 1: SimpleNamespace(mute_role=mute_role) }
+    bot.get_guild = mock.Mock(side_effect=lambda guild_id: guild if guild_id == 1 else None)
+    bot.get_mute_channel = mock.AsyncMock(return_value=mute_channel)
+    yield bot
+
+
+@pytest.fixture()
+def cog(bot):
+    """Instantiate the cog."""
+    yield BanishAndRegion(bot)
+
+
+def test_unmute_expired_batch(bot, cog, guild, mute_role, mute_channel):
+    """Test that expired mutes are deleted at once and announced once."""
+    async def run():
+        end_date = datetime.now() - timedelta(minutes=1)
+        members = { member_id: helpers.MockMember(id=member_id, guild=guild, name=f"m{member_id}")
+                    for member_id in range(2, 32) }
+        for member in members.values():
+            member.roles.append(mute_role)
+        mute_db.mdb_add_many(bot, list(members.values()), end_date=end_date)
+
+        # One of them left, and one was banished again in the meantime.
+        del members[2]
+        guild.get_member = mock.Mock(side_effect=members.get)
+        mute_db.mdb_add(bot, members[3], end_date=end_date + timedelta(hours=1))
+
+        until = bot.db_epoch(bot.db_epoch(end_date))
+        expired = [ (1, member_id, until) for member_id in range(2, 32) ]
+        delete_many = bot.settings.mutes.delete_many
+        with mock.patch.object(bot.settings.mutes, "delete_many", wraps=delete_many) as deletes:
+            await cog.unmute_expired(expired)
+
+        deletes.assert_called_once()
+        assert bot.settings.mutes.all() == [ bot.settings.mutes.get(1, 3) ]
+        members[3].remove_roles.assert_not_called()
+        for member_id in range(4, 32):
+            members[member_id].remove_roles.assert_awaited_once_with(mute_role)
+
+        mute_channel.send.assert_awaited_once()
+        announcement = mute_channel.send.call_args[0][0]
+        assert "the exile of" in announcement
+        assert all(members[member_id].mention in announcement for member_id in range(4, 32))
+    asyncio.run(run())
+
+
+def test_unmute_expired_single(bot, cog, guild, mute_role, mute_channel):
+    """Test that a single expired mute gets the announcement meant for one."""
+    async def run():
+        member = helpers.MockMember(id=2, guild=guild, name="m2")
+        member.roles.append(mute_role)
+        guild.get_member = mock.Mock(return_value=member)
+
+        end_date = datetime.now() - timedelta(minutes=1)
+        mute_db.mdb_add(bot, member, end_date=end_date)
+        await cog.unmute_expired([ (1, 2, bot.db_epoch(bot.db_epoch(end_date))) ])
+
+        mute_channel.send.assert_awaited_once()
+        assert f"{member.mention}'s exile" in mute_channel.send.call_args[0][0]
+    asyncio.run(run())
+
+
+def test_unmute_expired_role_failure(bot, cog, guild, mute_role, mute_channel):
+    """Test that a mute whose role couldn't be removed is kept and retried."""
+    async def run():
+        members = { member_id: helpers.MockMember(id=member_id, guild=guild, name=f"m{member_id}")
+                    for member_id in range(2, 5) }
+        for member in members.values():
+            member.roles.append(mute_role)
+        members[3].remove_roles.side_effect = RuntimeError("missing permissions")
+        guild.get_member = mock.Mock(side_effect=members.get)
+
+        end_date = datetime.now() - timedelta(minutes=1)
+        mute_db.mdb_add_many(bot, list(members.values()), end_date=end_date)
+
+        until = bot.db_epoch(bot.db_epoch(end_date))
+        cog.scheduler.retry = mock.Mock()
+        await cog.unmute_expired([ (1, member_id, until) for member_id in members ])
+
+        assert bot.settings.mutes.all() == [ bot.settings.mutes.get(1, 3) ]
+        cog.scheduler.retry.assert_called_once_with(1, 3)
+        announcement = mute_channel.send.call_args[0][0]
+        assert members[2].mention in announcement
+        assert members[3].mention not in announcement
+    asyncio.run(run())
+
+
+def test_unmute_expired_database_failure(bot, cog, guild, mute_role):
+    """Test that mutes are retried if they couldn't be deleted."""
+    async def run():
+        member = helpers.MockMember(id=2, guild=guild, name="m2")
+        member.roles.append(mute_role)
+        guild.get_member = mock.Mock(return_value=member)
+
+        end_date = datetime.now() - timedelta(minutes=1)
+        mute_db.mdb_add(bot, member, end_date=end_date)
+
+        cog.scheduler.retry = mock.Mock()
+        with mock.patch.object(bot.settings.mutes, "delete_many", return_value=False):
+            await cog.unmute_expired([ (1, 2, bot.db_epoch(bot.db_epoch(end_date))) ])
+
+        member.remove_roles.assert_awaited_once_with(mute_role)
+        cog.scheduler.retry.assert_called_once_with(1, 2)
+        assert len(bot.settings.mutes.all()) == 1
+    asyncio.run(run())
+
+
+def test_unmute_retried_after_failure(bot, cog, guild, mute_role, mute_channel):
+    """Test that the scheduler retries an unmute whose role couldn't be removed."""
+    async def run():
+        member = helpers.MockMember(id=2, guild=guild, name="m2")
+        member.roles.append(mute_role)
+        member.remove_roles.side_effect = [ RuntimeError("discord is down"), None ]
+        guild.get_member = mock.Mock(return_value=member)
+
+        end_date = datetime.now() - timedelta(minutes=1)
+        mute_db.mdb_add(bot, member, end_date=end_date)
+
+        cog.scheduler.retry_delay = 0.05
+        task = asyncio.ensure_future(cog.scheduler.run())
+        cog.scheduler.schedule(1, 2, bot.db_epoch(bot.db_epoch(end_date)))
+        await asyncio.sleep(0.3)
+        task.cancel()
+
+        assert member.remove_roles.await_count == 2
+        assert bot.settings.mutes.all() == list()
+        assert len(cog.scheduler) == 0
+        assert cog.scheduler.running == dict()
+        mute_channel.send.assert_awaited_once()
+    asyncio.run(run())
+
+
+def test_on_ready_retries_mutes_expired_while_away(bot, cog, guild, mute_role, mute_channel):
+    """Test that mutes that ran out while the bot was away go through the scheduler."""
+    async def run():
+        member = helpers.MockMember(id=2, guild=guild, name="m2")
+        member.roles.append(mute_role)
+        member.remove_roles.side_effect = [ RuntimeError("discord is down"), None ]
+        guild.get_member = mock.Mock(return_value=member)
+        mute_db.mdb_add(bot, member, end_date=datetime.now() - timedelta(days=1))
+
+        bot.guilds = [ guild ]
+        bot.read_server_setting = mock.Mock(return_value=False)
+        tasks = list()
+        bot.add_bg_task = mock.Mock(
+            side_effect=lambda task, name: tasks.append(asyncio.ensure_future(task)))
+        cog.scheduler.retry_delay = 0.05
+
+        await cog.on_ready()
+        await asyncio.sleep(0.3)
+        for task in tasks:
+            task.cancel()
+
+        assert member.remove_roles.await_count == 2
+        assert bot.settings.mutes.all() == list()
+        mute_channel.send.assert_awaited_once()
+    asyncio.run(run())
@@ -0,0 +1,173 @@
+"""Unittest for the mutes database functions of the banish cog."""
+
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from mrfreeze import dbfunctions
+from mrfreeze import time
+from mrfreeze.cogs.banish import mute_db
+from mrfreeze.cogs.banish.scheduler import UnmuteScheduler
+from mrfreeze.database.settings import Settings
+
+import pytest
+
+from tests import helpers
+
+
+@pytest.fixture()
+def guild():
+    """Create the guild everyone is banished on."""
+    yield helpers.MockGuild(id=1, name="guild")
+
+
+@pytest.fixture()
+def mute_role():
+    """Create the guild's mute role."""
+    yield helpers.MockRole(name="Antarctica")
+
+
+@pytest.fixture()
+def bot(tmp_path, mute_role):
+    """Create a bot with settings of its own."""
+    bot = helpers.MockMrFreeze()
+    bot.settings = Settings(str(tmp_path / "settings.db"))
+    bot.db_time = dbfunctions.db_time
+    bot.db_epoch = dbfunctions.db_epoch
+    bot.parse_timedelta = time.parse_timedelta
+    bot.current_time = lambda: "now"
+    bot.servertuples = { 1: SimpleNamespace(mute_role=mute_role) }
+    yield bot
+
+
+def member(guild, member_id):
+    """Create a member of the guild."""
+    return helpers.MockMember(id=member_id, guild=guild, name=f"m{member_id}")
+
+
+def test_add_fetch_delete(bot, guild):
+    """Test that mutes are added, looked up in memory and deleted."""
+    alice = member(guild, 2)
+    end_date = datetime.now() + timedelta(minutes=5)
+
+    assert mute_db.mdb_active(bot, 1, 2) is None
+    assert mute_db.mdb_add(bot, alice, end_date=end_date)
+
+    mute = mute_db.mdb_active(bot, 1, 2)
+    assert mute.until == end_date.replace(microsecond=0)
+    assert mute_db.mdb_fetch(bot, alice)[0].member is alice
+
+    assert mute_db.mdb_del(bot, alice)
+    assert mute_db.mdb_active(bot, 1, 2) is None
+    assert mute_db.mdb_fetch(bot, alice) == list()
+
+
+def test_add_prolongs(bot, guild):
+    """Test that banishing someone already banished adds to their time."""
+    alice = member(guild, 2)
+    mute_db.mdb_add(bot, alice, end_date=datetime.now() + timedelta(hours=1))
+    mute_db.mdb_add(bot, alice, end_date=datetime.now() + timedelta(hours=1))
+
+    remaining = mute_db.mdb_active(bot, 1, 2).until - datetime.now()
+    assert timedelta(minutes=119) < remaining <= timedelta(hours=2)
+
+
+def test_fetch_server(bot, guild):
+    """Test that fetching a server's mutes resolves members without scanning."""
+    members = { member_id: member(guild, member_id) for member_id in (2, 3) }
+    for muted in members.values():
+        mute_db.mdb_add(bot, muted)
+    guild.get_member = mock.Mock(side_effect=members.get)
+
+    fetched = mute_db.mdb_fetch(bot, guild)
+    assert sorted(mute.member.id for mute in fetched) == [ 2, 3 ]
+    assert all(mute.until is None for mute in fetched)
+
+
+def test_carry_out_banish_and_unbanish(bot, guild, mute_role):
+    """Test that banishing schedules the unmute and unbanishing cancels it."""
+    async def run():
+        alice = member(guild, 2)
+        scheduler = UnmuteScheduler(None)
+        end_date = datetime.now() + timedelta(minutes=5)
+
+        assert await mute_db.carry_out_banish(bot, alice, end_date, scheduler) is None
+        alice.add_roles.assert_awaited_once_with(mute_role)
+        assert scheduler.next_deadline() == end_date.replace(microsecond=0)
+
+        alice.roles.append(mute_role)
+        assert await mute_db.carry_out_unbanish(bot, alice, scheduler) is None
+        alice.remove_roles.assert_awaited_once_with(mute_role)
+        assert len(scheduler) == 0
+        assert mute_db.mdb_active(bot, 1, 2) is None
+    asyncio.run(run())
+
+
+def test_unbanish_unmuted(bot, guild):
+    """Test that unbanishing someone who isn't banished doesn't touch the database."""
+    async def run():
+        with mock.patch.object(bot.settings.mutes, "delete") as delete:
+            assert await mute_db.carry_out_unbanish(bot, member(guild, 2)) is None
+            delete.assert_not_called()
+    asyncio.run(run())
+
+
+def test_banish_many_concurrently(bot, guild, mute_role):
+    """Test that role changes overlap up to the limit and mutes are written at once."""
+    async def run():
+        in_flight = list()
+        most_in_flight = list()
+
+        async def change_role(role):
+            in_flight.append(role)
+            most_in_flight.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.pop()
+
+        members = [ member(guild, member_id) for member_id in range(2, 22) ]
+        for muted in members:
+            muted.add_roles.side_effect = change_role
+            muted.remove_roles.side_effect = change_role
+
+        scheduler = UnmuteScheduler(None)
+        end_date = datetime.now() + timedelta(minutes=5)
+        update_many = bot.settings.mutes.update_many
+        with mock.patch.object(bot.settings.mutes, "update_many", wraps=update_many) as writes:
+            errors = await mute_db.carry_out_banish_many(
+                bot, members, end_date, scheduler, asyncio.Semaphore(5))
+
+        assert errors == [ None ] * 20
+        assert max(most_in_flight) == 5
+        writes.assert_called_once()
+        assert len(bot.settings.mutes.find("server", 1)) == 20
+        assert len(scheduler) == 20
+
+        for muted in members:
+            muted.roles.append(mute_role)
+        delete_many = bot.settings.mutes.delete_many
+        with mock.patch.object(bot.settings.mutes, "delete_many", wraps=delete_many) as deletes:
+            errors = await mute_db.carry_out_unbanish_many(
+                bot, members, scheduler, asyncio.Semaphore(5))
+
+        assert errors == [ None ] * 20
+        deletes.assert_called_once()
+        assert bot.settings.mutes.find("server", 1) == list()
+        assert len(scheduler) == 0
+    asyncio.run(run())
+
+
+def test_banish_many_with_failures(bot, guild):
+    """Test that members whose role couldn't be changed aren't banished in the db."""
+    async def run():
+        alice, bob = member(guild, 2), member(guild, 3)
+        error = RuntimeError("no permission")
+        bob.add_roles.side_effect = error
+
+        errors = await mute_db.carry_out_banish_many(bot, [ alice, bob ], None)
+
+        assert errors == [ None, error ]
+        assert mute_db.mdb_active(bot, 1, 2) is not None
+        assert mute_db.mdb_active(bot, 1, 3) is None
+    asyncio.run(run())
@@ -0,0 +1,185 @@
+"""Unittest for the unmute scheduler."""
+
+import asyncio
+from datetime import datetime
+from datetime import timedelta
+
+from mrfreeze.cogs.banish.scheduler import UnmuteScheduler
+
+
+def in_seconds(seconds):
+    """Get the time a number of seconds from now."""
+    return datetime.now() + timedelta(seconds=seconds)
+
+
+def test_pop_due_in_order():
+    """Test that due unmutes come out earliest first, and later ones stay."""
+    async def run():
+        scheduler = UnmuteScheduler(None)
+        scheduler.schedule(1, 2, in_seconds(-5))
+        scheduler.schedule(1, 1, in_seconds(-10))
+        scheduler.schedule(2, 1, in_seconds(60))
+        scheduler.schedule(2, 2, None)
+
+        due = scheduler.pop_due(datetime.now())
+        assert [ (guild, member) for guild, member, until in due ] == [ (1, 1), (1, 2) ]
+        assert len(scheduler) == 1
+    asyncio.run(run())
+
+
+def test_reschedule_and_cancel():
+    """Test that only the latest schedule of a mute counts."""
+    async def run():
+        scheduler = UnmuteScheduler(None)
+        scheduler.schedule(1, 1, in_seconds(-10))
+        scheduler.schedule(1, 1, in_seconds(60))
+        scheduler.schedule(1, 2, in_seconds(-10))
+        scheduler.cancel(1, 2)
+
+        assert scheduler.pop_due(datetime.now()) == list()
+        assert scheduler.next_deadline() > datetime.now()
+    asyncio.run(run())
+
+
+def test_compact():
+    """Test that rescheduling the same mute over and over doesn't grow the heap forever."""
+    async def run():
+        scheduler = UnmuteScheduler(None)
+        for seconds in range(1000):
+            scheduler.schedule(1, 1, in_seconds(seconds))
+
+        assert len(scheduler) == 1
+        assert len(scheduler.heap) < 100
+    asyncio.run(run())
+
+
+def test_run_fires_on_time():
+    """Test that the scheduler wakes up for a mute scheduled while it's asleep."""
+    async def run():
+        fired = list()
+
+        async def handler(expired):
+            fired.append((datetime.now(), expired))
+
+        scheduler = UnmuteScheduler(handler)
+        scheduler.schedule(1, 1, in_seconds(3600))
+        task = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+
+        until = in_seconds(0.05)
+        scheduler.schedule(1, 2, until)
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+        assert len(fired) == 1
+        fired_at, expired = fired[0]
+        assert expired == [ (1, 2, until) ]
+        assert fired_at >= until
+        assert len(scheduler) == 1
+    asyncio.run(run())
+
+
+def test_run_survives_failing_handler():
+    """Test that an exception in the handler doesn't stop the scheduler."""
+    async def run():
+        calls = list()
+
+        async def handler(expired):
+            calls.append(expired)
+            raise RuntimeError("oops")
+
+        scheduler = UnmuteScheduler(handler)
+        task = asyncio.ensure_future(scheduler.run())
+        scheduler.schedule(1, 1, in_seconds(0))
+        await asyncio.sleep(0.05)
+        scheduler.schedule(1, 2, in_seconds(0))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+        assert len(calls) == 2
+    asyncio.run(run())
+
+
+def test_run_retries_failing_handler():
+    """Test that unmutes the handler fails on are retried, backing off every time."""
+    async def run():
+        calls = list()
+
+        async def handler(expired):
+            calls.append(expired)
+            raise RuntimeError("oops")
+
+        scheduler = UnmuteScheduler(handler, retry_delay=0.05, max_retry_delay=0.1)
+        until = in_seconds(0)
+        scheduler.schedule(1, 1, until)
+        task = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+
+        # The unmute is back on the heap rather than lost.
+        assert calls == [ [ (1, 1, until) ] ]
+        assert len(scheduler) == 1
+        assert scheduler.failures == { (1, 1): 1 }
+
+        await asyncio.sleep(0.3)
+        task.cancel()
+
+        assert 3 <= len(calls) <= 4
+        assert scheduler.failures[(1, 1)] == len(calls)
+        assert len(scheduler) == 1
+
+        # Retries are handed the time the mute ends, not when they're due.
+        assert all(expired == [ (1, 1, until) ] for expired in calls)
+    asyncio.run(run())
+
+
+def test_retry_after_cancel():
+    """Test that an unmute cancelled or rescheduled while running isn't retried."""
+    async def run():
+        scheduler = UnmuteScheduler(None)
+        scheduler.schedule(1, 1, in_seconds(-10))
+        scheduler.schedule(1, 2, in_seconds(-10))
+        scheduler.pop_due(datetime.now())
+
+        scheduler.cancel(1, 1)
+        until = in_seconds(60)
+        scheduler.schedule(1, 2, until)
+        scheduler.retry(1, 1)
+        scheduler.retry(1, 2)
+
+        assert scheduler.deadlines == { (1, 2): until }
+        assert scheduler.failures == dict()
+    asyncio.run(run())
+
+
+def test_finish_forgets_failures():
+    """Test that a successful unmute clears earlier failures."""
+    async def run():
+        scheduler = UnmuteScheduler(None)
+        scheduler.schedule(1, 1, in_seconds(-10))
+        scheduler.pop_due(datetime.now())
+        scheduler.retry(1, 1)
+
+        assert scheduler.next_deadline() > in_seconds(25)
+        assert scheduler.failures == { (1, 1): 1 }
+
+        # Pretend the retry is due.
+        scheduler.push((1, 1), in_seconds(-1))
+        due = scheduler.pop_due(datetime.now())
+        scheduler.finish(due)
+
+        assert scheduler.running == dict()
+        assert scheduler.failures == dict()
+        assert len(scheduler) == 0
+    asyncio.run(run())
+
+
+def test_far_future():
+    """Test that a mute lasting practically forever doesn't upset the scheduler."""
+    async def run():
+        scheduler = UnmuteScheduler(None)
+        scheduler.schedule(1, 1, datetime.max)
+        task = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.01)
+        assert not task.done()
+        task.cancel()
+    asyncio.run(run())
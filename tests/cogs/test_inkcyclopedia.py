@@ -0,0 +1,432 @@
+"""Unittest for the Inkcyclopedia."""
+
+import asyncio
+import logging
+import re
+import threading
+
+from mrfreeze.cogs.inkcyclopedia import InkMatcher, Inkcyclopedia, InkyTuple
+from mrfreeze.database.tables.inkcyclopedia import InkcyclopediaInks
+
+import pytest
+
+from tests import helpers
+
+
+def ink(name, regex):
+    """Create an ink with a made up url."""
+    return InkyTuple(name, f"https://example.com/{name}.jpg", re.compile(regex, re.IGNORECASE))
+
+
+@pytest.fixture()
+def matcher():
+    """Create a matcher with a handful of inks."""
+    yield InkMatcher([
+        ink("Iroshizuku Kon-peki", r"kon.?peki"),
+        ink("Diamine Oxblood", r"(diamine )?ox.?blood"),
+        ink("Sailor Oxblood", r"sailor ox.?blood"),
+        ink("Blue", r"^blue$"),
+        ink("Anything Red", r"r.d"),
+    ])
+
+
+class StandInAirtable:
+    """Stand-in for Airtable serving records from memory, one page at a time."""
+
+    def __init__(self, pages, before_page=None):
+        self.pages = pages
+        self.before_page = before_page
+        self.pages_served = 0
+        self.options = None
+
+    def get_iter(self, **options):
+        self.options = options
+        for page in self.pages:
+            if self.before_page is not None:
+                self.before_page(self.pages_served)
+            self.pages_served += 1
+            yield page
+
+
+def record(name, url, regex, record_id=None, modified="2020-01-01T00:00:00.000Z"):
+    """Create an Airtable record for an ink."""
+    return {"id": record_id or f"rec{name}", "createdTime": "2019-01-01T00:00:00.000Z",
+            "fields": {"Ink Name": name, "Inkbot version": url, "RegEx": regex,
+                       "Last Modified": modified}}
+
+
+@pytest.fixture()
+def airtable():
+    """Create a stand-in Airtable with two pages of inks."""
+    yield StandInAirtable([
+        [ record("Diamine Oxblood", "https://example.com/a.jpg", r"ox.?blood"),
+          {"id": "recBroken", "fields": {"Ink Name": "Broken"}} ],
+        [ record("No Image", "https://i.imgur.com/N38sjv2.jpg", r"no image"),
+          record("Blue", "https://example.com/b.jpg", r"^blue$") ],
+    ])
+
+
+@pytest.fixture()
+def table(tmp_path):
+    """Create an empty ink table."""
+    table = InkcyclopediaInks(str(tmp_path / "settings.db"), logging.getLogger("test"))
+    table.create_table()
+    table.load_from_db()
+    yield table
+
+
+@pytest.fixture()
+def cog(table, tmp_path):
+    """Instantiate the cog with its own ink table."""
+    bot = helpers.MockMrFreeze()
+    bot.settings.inkcyclopedia = table
+    cog = Inkcyclopedia(bot)
+    cog.inkdb_path = str(tmp_path / "inkcyclopedia.csv")
+    yield cog
+
+
+def test_required_literal():
+    """Test that the longest top level literal run is found."""
+    def literal(regex):
+        return InkMatcher.required_literal(re.compile(regex, re.IGNORECASE))
+
+    assert literal(r"kon.?peki") == "peki"
+    assert literal(r"(diamine )?ox.?blood") == "blood"
+    assert literal(r"^Blue$") == "blue"
+    assert literal(r"r.d") == "r"
+    assert literal(r"a|b") == ""
+
+
+def test_match_finds_ink(matcher):
+    """Test that a term is matched to the right ink."""
+    assert matcher.match("Kon Peki").name == "Iroshizuku Kon-peki"
+    assert matcher.match("blue").name == "Blue"
+
+
+def test_match_unindexed_ink(matcher):
+    """Test that inks without a usable literal are still matched."""
+    assert matcher.match("rad").name == "Anything Red"
+
+
+def test_match_no_ink(matcher):
+    """Test that None is returned when no ink matches."""
+    assert matcher.match("green") is None
+    assert matcher.match("") is None
+
+
+def test_match_priority(matcher):
+    """Test that the first added ink wins when several inks match."""
+    # Both oxblood inks and "Anything Red" match this.
+    assert matcher.match("sailor oxblood red").name == "Diamine Oxblood"
+
+
+def test_add_replaces_ink_in_place(matcher):
+    """Test that replacing an ink keeps its priority."""
+    matcher.add(ink("Sailor Oxblood", r"oxblood"))
+    matcher.add(ink("Diamine Oxblood", r"diamine ox.?blood"))
+
+    assert len(matcher) == 5
+    assert matcher.match("oxblood").name == "Sailor Oxblood"
+    assert matcher.match("diamine oxblood").name == "Diamine Oxblood"
+
+
+def test_remove_ink(matcher):
+    """Test that a removed ink is never matched again."""
+    matcher.remove("Diamine Oxblood")
+    matcher.remove("Anything Red")
+    matcher.remove("Not An Ink")
+
+    assert len(matcher) == 3
+    assert matcher.match("sailor oxblood red").name == "Sailor Oxblood"
+    assert matcher.match("rad") is None
+
+
+def test_match_agrees_with_linear_scan(matcher):
+    """Test that the prefilter never changes the result of a lookup."""
+    terms = [ "kon-peki", "KONPEKI", "ox blood", "Sailor Ox-Blood", "blue",
+              "blue ink", "red", "rod", "peki", "oxblo" ]
+    for term in terms:
+        linear = next((i for i in matcher.inks if i.regex.search(term)), None)
+        assert matcher.match(term) == linear
+
+
+def test_match_without_regex_parser(monkeypatch):
+    """Test that every ink is scanned when the regex parser isn't available."""
+    monkeypatch.setattr("mrfreeze.cogs.inkcyclopedia.sre_parse", None)
+    matcher = InkMatcher([ ink("Diamine Oxblood", r"ox.?blood"), ink("Blue", r"^blue$") ])
+
+    assert matcher.trigrams == dict()
+    assert matcher.match("oxblood").name == "Diamine Oxblood"
+    assert matcher.match("blue").name == "Blue"
+    assert matcher.match("red") is None
+
+
+def test_update_db_keeps_table_order(cog, table):
+    """Test that inks are loaded in the order they were stored in."""
+    table.replace_all([
+        ("Diamine Oxblood", "https://example.com/a.jpg", r"ox.?blood"),
+        ("Sailor Oxblood", "https://example.com/b.jpg", r"sailor ox.?blood"),
+    ])
+
+    asyncio.run(cog.update_db())
+    assert len(cog.inkydb) == 2
+    assert [ i.name for i in cog.inkydb.inks ] == [ "Diamine Oxblood", "Sailor Oxblood" ]
+
+
+def test_update_db_only_compiles_changed_inks(cog, table):
+    """Test that inks that haven't changed keep their compiled regex."""
+    table.replace_all([
+        ("Blue", "https://example.com/a.jpg", r"^blue$"),
+        ("Red", "https://example.com/b.jpg", r"^red$"),
+    ])
+    asyncio.run(cog.update_db())
+    blue, red = cog.inkydb.inks
+
+    table.replace_all([
+        ("Blue", "https://example.com/a.jpg", r"^blue$"),
+        ("Red", "https://example.com/b.jpg", r"^red(dish)?$"),
+    ])
+    asyncio.run(cog.update_db())
+    new_blue, new_red = cog.inkydb.inks
+    assert new_blue is blue
+    assert new_red is not red
+    assert new_red.regex.pattern == r"^red(dish)?$"
+
+
+def test_update_db_skips_invalid_regex(cog, table):
+    """Test that an ink with a broken regex doesn't stop the others from loading."""
+    table.replace_all([
+        ("Broken", "https://example.com/a.jpg", r"(unclosed"),
+        ("Blue", "https://example.com/b.jpg", r"^blue$"),
+    ])
+
+    asyncio.run(cog.update_db())
+    assert [ i.name for i in cog.inkydb.inks ] == [ "Blue" ]
+
+
+def test_on_ready_imports_csv(cog, table, tmp_path):
+    """Test that the old ink file is imported into an empty table."""
+    inkfile = tmp_path / "inkcyclopedia.csv"
+    inkfile.write_text(
+        "Diamine Oxblood,ox.?blood,https://example.com/a.jpg\n",
+        encoding=cog.inkdb_enc)
+
+    asyncio.run(cog.on_ready())
+    rows = { row.name: row for chunk in table.iter_rows() for row in chunk }
+    assert rows["Diamine Oxblood"].regex == "ox.?blood"
+    assert rows["Diamine Oxblood"].url == "https://example.com/a.jpg"
+    assert cog.lookup("oxblood").name == "Diamine Oxblood"
+
+
+def test_fetch_inks_stores_usable_records(cog, table, airtable):
+    """Test that complete records with proper images are stored in order."""
+    cog.airtable = airtable
+
+    assert asyncio.run(cog.fetch_inks())
+    assert airtable.pages_served == 2
+    names = [ row.name for chunk in table.iter_rows() for row in chunk ]
+    assert names == [ "Diamine Oxblood", "Blue" ]
+
+
+def test_fetch_inks_without_airtable(cog, table):
+    """Test that nothing happens when Airtable isn't configured."""
+    cog.airtable = None
+    assert not asyncio.run(cog.fetch_inks())
+    assert table.is_empty()
+
+
+def test_fetch_inks_failure_keeps_old_inks(cog, table, airtable):
+    """Test that a download failing halfway through doesn't touch the table."""
+    table.replace_all([ ("Red", "https://example.com/r.jpg", r"^red$") ])
+
+    def fail_on_second_page(page):
+        if page == 1:
+            raise ConnectionError("connection reset")
+
+    airtable.before_page = fail_on_second_page
+    cog.airtable = airtable
+
+    assert not asyncio.run(cog.fetch_inks())
+    names = [ row.name for chunk in table.iter_rows() for row in chunk ]
+    assert names == [ "Red" ]
+
+
+def test_fetch_inks_does_not_block_event_loop(cog, airtable):
+    """Test that the event loop keeps running while inks are downloaded."""
+    loop_ran = threading.Event()
+
+    def wait_for_loop(page):
+        # Only returns in time if the event loop is free to run other tasks.
+        assert loop_ran.wait(timeout=5)
+
+    airtable.before_page = wait_for_loop
+    cog.airtable = airtable
+
+    async def other_task():
+        await asyncio.sleep(0.01)
+        loop_ran.set()
+
+    async def run():
+        return await asyncio.gather(cog.fetch_inks(), other_task())
+
+    fetched, _ = asyncio.run(run())
+    assert fetched
+
+
+def test_inkupdate_patches_changed_inks(cog, table):
+    """Test that !inkupdate only fetches and applies inks changed since last sync."""
+    table.replace_all([
+        ("Blue", "https://example.com/a.jpg", r"^blue$", "rec1", "2020-01-01T00:00:00.000Z"),
+        ("Red", "https://example.com/b.jpg", r"^red$", "rec2", "2020-02-01T00:00:00.000Z"),
+        ("Grey", "https://example.com/c.jpg", r"^gr[ae]y$", "rec3", "2020-01-01T00:00:00.000Z"),
+    ])
+    asyncio.run(cog.update_db())
+    grey = cog.inkydb.inks[2]
+
+    cog.airtable = StandInAirtable([[
+        record("Blue", "https://example.com/a.jpg", r"^blue(ish)?$", "rec1"),
+        record("Crimson", "https://example.com/b.jpg", r"^crimson$", "rec2"),
+        {"id": "rec4", "fields": {"Ink Name": "Broken"}},
+        record("Green", "https://example.com/d.jpg", r"^green$", "rec5"),
+    ]])
+    ctx = helpers.MockContext()
+    asyncio.run(cog.inkupdate.callback(cog, ctx))
+
+    formula = cog.airtable.options["formula"]
+    assert formula == "IS_AFTER({Last Modified}, DATETIME_PARSE('2020-02-01T00:00:00.000Z'))"
+    reply = ctx.send.call_args[0][0]
+    assert "Updated 3 and removed 1 inks" in reply
+
+    # Blue is edited in place, Red was renamed to Crimson, Grey is untouched.
+    names = [ i.name if i else None for i in cog.inkydb.inks ]
+    assert names == [ "Blue", None, "Grey", "Crimson", "Green" ]
+    assert cog.inkydb.inks[2] is grey
+    assert cog.lookup("blueish").name == "Blue"
+    assert cog.lookup("red") is None
+    assert cog.lookup("crimson").name == "Crimson"
+
+    # The table agrees with the patched matcher.
+    stored = [ row.name for chunk in table.iter_rows() for row in chunk ]
+    assert stored == [ "Blue", "Grey", "Crimson", "Green" ]
+
+
+def test_inkupdate_full(cog, table, airtable):
+    """Test that !inkupdate full fetches every ink."""
+    table.replace_all([
+        ("Red", "https://example.com/b.jpg", r"^red$", "rec2", "2020-02-01T00:00:00.000Z"),
+    ])
+    cog.airtable = airtable
+    ctx = helpers.MockContext()
+
+    asyncio.run(cog.inkupdate.callback(cog, ctx, "full"))
+    assert airtable.options == dict()
+    assert [ i.name for i in cog.inkydb.inks ] == [ "Diamine Oxblood", "Blue" ]
+
+
+def test_inkupdate_without_stamps_falls_back_to_full(cog, table, airtable):
+    """Test that inks without modification stamps are all fetched again."""
+    table.replace_all([ ("Red", "https://example.com/b.jpg", r"^red$") ])
+    cog.airtable = airtable
+
+    asyncio.run(cog.inkupdate.callback(cog, helpers.MockContext()))
+    assert airtable.options == dict()
+    assert [ i.name for i in cog.inkydb.inks ] == [ "Diamine Oxblood", "Blue" ]
+
+
+def test_record_without_last_modified_has_no_stamp(cog):
+    """Test that the creation time is never used as a modification stamp."""
+    ink = record("Blue", "https://example.com/b.jpg", r"^blue$")
+    del ink["fields"]["Last Modified"]
+    assert cog.parse_record(ink).modified == ""
+
+
+def test_inkupdate_stops_after_failed_fetch(cog, table, airtable):
+    """Test that a failed full fetch is reported without reloading the inks."""
+    def fail(page):
+        raise ConnectionError("connection reset")
+
+    airtable.before_page = fail
+    cog.airtable = airtable
+    ctx = helpers.MockContext()
+
+    asyncio.run(cog.inkupdate.callback(cog, ctx, "full"))
+    ctx.send.assert_called_once()
+    assert "Failed to fetch" in ctx.send.call_args[0][0]
+
+
+def test_handle_message_sends_first_hit(cog):
+    """Test that the first matching ink in a message is posted."""
+    cog.inkydb = InkMatcher([ ink("Diamine Oxblood", r"ox.?blood") ])
+    message = helpers.MockMessage()
+    message.author.bot = False
+    message.content = "I love {nothing} and {oxblood} and {ox blood}"
+
+    asyncio.run(cog.handle_message(message))
+    message.channel.send.assert_called_once()
+    args, kwargs = message.channel.send.call_args
+    assert args[0] == "Found a match for Diamine Oxblood!"
+    assert kwargs["embed"].image.url == "https://example.com/Diamine Oxblood.jpg"
+
+
+def test_lookup_caches_lower_case_term(cog):
+    """Test that repeated lookups of the same term are served from the cache."""
+    cog.inkydb = InkMatcher([ ink("Blue", r"^blue$") ])
+
+    assert cog.lookup("Blue").name == "Blue"
+    assert cog.lookup("blue").name == "Blue"
+    assert cog.lookup("BLUE").name == "Blue"
+    assert cog.cache_misses == 1
+    assert cog.cache_hits == 2
+
+
+def test_lookup_matches_term_as_written(cog):
+    """Test that whitespace in the term is left for the regexes to judge."""
+    cog.inkydb = InkMatcher([ ink("Blue", r"^blue$"), ink("Kon-peki", r"kon peki") ])
+
+    assert cog.lookup("blue").name == "Blue"
+    assert cog.lookup(" blue ") is None
+    assert cog.lookup("kon  peki") is None
+
+
+def test_lookup_caches_misses(cog):
+    """Test that terms matching no ink are remembered too."""
+    cog.inkydb = InkMatcher([ ink("Blue", r"^blue$") ])
+
+    assert cog.lookup("green") is None
+    assert cog.lookup("green") is None
+    assert cog.cache_misses == 1
+    assert cog.cache_hits == 1
+
+
+def test_lookup_evicts_least_recently_used(cog):
+    """Test that the cache never grows beyond its size."""
+    cog.inkydb = InkMatcher([ ink("Blue", r"^blue$") ])
+    cog.cache_size = 2
+
+    cog.lookup("a")
+    cog.lookup("b")
+    cog.lookup("a")
+    cog.lookup("c")
+    assert list(cog.cache) == [ "a", "c" ]
+
+
+def test_update_db_clears_cache(cog, table):
+    """Test that reloading the inks invalidates the cache."""
+    assert cog.lookup("blue") is None
+    table.replace_all([ ("Blue", "https://example.com/a.jpg", r"^blue$") ])
+    asyncio.run(cog.update_db())
+    assert cog.lookup("blue").name == "Blue"
+
+
+def test_inkstats(cog):
+    """Test that !inkstats reports the cache counters."""
+    cog.lookup("blue")
+    cog.lookup("blue")
+    ctx = helpers.MockContext()
+
+    asyncio.run(cog.inkstats.callback(cog, ctx))
+    ctx.send.assert_called_once()
+    reply = ctx.send.call_args[0][0]
+    assert "**hits:** 1" in reply
+    assert "**misses:** 1" in reply
+    assert "**hit rate:** 50%" in reply
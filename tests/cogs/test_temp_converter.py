@@ -6,7 +6,7 @@ from typing import List
 
 from discord import File
 
-from mrfreeze.cogs.temp_converter import TemperatureConverter
+from mrfreeze.cogs.temp_converter import TempUnit, TemperatureConverter
 
 from tests import helpers
 
@@ -51,7 +51,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
         to ensure that it's closed after the test finish running.
         """
         self.msg.content = content
-        coroutine = self.cog.on_message(self.msg)
+        coroutine = self.cog.handle_message(self.msg)
         self.assertIsNone(asyncio.run(coroutine))
 
         text, kwargs = self.channel.send.call_args
@@ -63,33 +63,35 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
         return text[0]
 
     def add_role_with_name(self, name: str):
-        """Append a new role to author."""
+        """Append a new role to the guild and the author."""
         new_role = helpers.MockRole(name=name)
+        if self.ctx.guild is not None:
+            self.ctx.guild.roles.append(new_role)
         self.author.roles.append(new_role)
 
     def test_on_message_no_response_when_user_is_bot(self):
-        """Test that on_message() does nothing when called by bot."""
+        """Test that handle_message() does nothing when called by bot."""
         self.msg.author.bot = True
 
         self.msg.content = "10 c"
-        coroutine = self.cog.on_message(self.msg)
+        coroutine = self.cog.handle_message(self.msg)
         self.assertIsNone(asyncio.run(coroutine))
         self.channel.send.assert_not_called()
 
     def test_on_message_no_response_with_invalid_statement(self):
         """
-        Test on_message() with invalid temperature statement.
+        Test handle_message() with invalid temperature statement.
 
         Should return nothing at all.
         """
         self.msg.content = "10"
-        coroutine = self.cog.on_message(self.msg)
+        coroutine = self.cog.handle_message(self.msg)
         self.assertIsNone(asyncio.run(coroutine))
         self.channel.send.assert_not_called()
 
     def test_on_message_with_temperature_100000(self):
         """
-        Test on_message() with message "100000 C".
+        Test handle_message() with message "100000 C".
 
         Should return a message saying that it's quite warm,
         and a picture of helldog.gif.
@@ -102,7 +104,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_with_temperature_negative_100000(self):
         """
-        Test on_message() with message "-100000 C".
+        Test handle_message() with message "-100000 C".
 
         Should return a message saying that it's a bit chilly,
         and a picture of hellacold.gif.
@@ -115,7 +117,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_with_temperature_50_c(self):
         """
-        Test on_message() with message "50 c".
+        Test handle_message() with message "50 c".
 
         Should return a message saying 50 c is around 122 f.
         """
@@ -126,7 +128,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_with_temperature_50_f(self):
         """
-        Test on_message() with message "50 f".
+        Test handle_message() with message "50 f".
 
         Should return a message saying 50 f is around 10 c.
         """
@@ -137,7 +139,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_with_temperature_50_k(self):
         """
-        Test on_message() with message "50 k".
+        Test handle_message() with message "50 k".
 
         Should return a message saying 50 k is around -223.15 c.
         """
@@ -148,7 +150,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_with_temperature_50_r(self):
         """
-        Test on_message() with message "50 r".
+        Test handle_message() with message "50 r".
 
         Should return a message saying 50 r is around -409.67 f.
         """
@@ -159,7 +161,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_degrees_with_no_role(self):
         """
-        Test on_message() with message "50 degrees" and no role.
+        Test handle_message() with message "50 degrees" and no role.
 
         Should assume origin unit is celsius.
         """
@@ -170,7 +172,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_degrees_from_dm_channel(self):
         """
-        Test on_message() when sent from DMs.
+        Test handle_message() when sent from DMs.
 
         Should assume origin unit is celsius, regardless of roles.
         Roles are not accessible in DM channels, but our mock object
@@ -185,7 +187,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_degrees_with_celsius_role(self):
         """
-        Test on_message() with message "50 degrees" and Celsius role.
+        Test handle_message() with message "50 degrees" and Celsius role.
 
         Should assume origin unit is celsius.
         North America role is added to make sure the role does something.
@@ -199,7 +201,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_degrees_with_fahrenheit_role(self):
         """
-        Test on_message() with message "50 degrees" and Fahrenheit role.
+        Test handle_message() with message "50 degrees" and Fahrenheit role.
 
         Should assume origin unit is fahrenheit.
         """
@@ -211,7 +213,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_degrees_with_canada_role(self):
         """
-        Test on_message() with message "50 degrees" and Canada role.
+        Test handle_message() with message "50 degrees" and Canada role.
 
         Should assume origin unit is celsius.
         North America role is added to make sure the role does something.
@@ -225,7 +227,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_degrees_with_mexico_role(self):
         """
-        Test on_message() with message "50 degrees" and Mexico role.
+        Test handle_message() with message "50 degrees" and Mexico role.
 
         Should assume origin unit is celsius.
         North America role is added to make sure the role does something.
@@ -239,7 +241,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_degrees_with_north_america_role(self):
         """
-        Test on_message() with message "50 degrees" and North America role.
+        Test handle_message() with message "50 degrees" and North America role.
 
         Should assume origin unit is fahrenheit.
         """
@@ -251,7 +253,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_celsius_aliases(self):
         """
-        Test on_message() with various celsius aliases.
+        Test handle_message() with various celsius aliases.
 
         Aliases are:
         °c, c, celcius, celsius, civilized unit(s), civilized unit(s).
@@ -278,7 +280,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_fahrenheit_aliases(self):
         """
-        Test on_message() with various fahrenheit aliases.
+        Test handle_message() with various fahrenheit aliases.
 
         Aliases are:
         °f, f, fahrenheit, freedom unit, freedom units
@@ -300,7 +302,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_kelvin_aliases(self):
         """
-        Test on_message() with various kelvin aliases.
+        Test handle_message() with various kelvin aliases.
 
         Aliases are:
         k, kelvin
@@ -318,7 +320,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_rankine_aliases(self):
         """
-        Test on_message() with various rankine aliases.
+        Test handle_message() with various rankine aliases.
 
         Aliases are:
         r, rankine
@@ -336,7 +338,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_forced_c_to_f(self):
         """
-        Test on_message() when forcing conversion from c to f.
+        Test handle_message() when forcing conversion from c to f.
 
         Should return 50.0°C in fahrenheit.
         """
@@ -348,7 +350,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_forced_c_to_k(self):
         """
-        Test on_message() when forcing conversion from c to k.
+        Test handle_message() when forcing conversion from c to k.
 
         Should return 50.0°C in kelvin.
         """
@@ -359,7 +361,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_forced_c_to_r(self):
         """
-        Test on_message() when forcing conversion from c to r.
+        Test handle_message() when forcing conversion from c to r.
 
         Should return 50.0°C in rankine.
         """
@@ -370,7 +372,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_forced_f_to_k(self):
         """
-        Test on_message() when forcing conversion from f to k.
+        Test handle_message() when forcing conversion from f to k.
 
         Should return 50.0°F in kelvin.
         """
@@ -381,7 +383,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_forced_f_to_r(self):
         """
-        Test on_message() when forcing conversion from f to r.
+        Test handle_message() when forcing conversion from f to r.
 
         Should return 50.0°F in rankine.
         """
@@ -392,7 +394,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_forced_k_to_f(self):
         """
-        Test on_message() when forcing conversion from k to f.
+        Test handle_message() when forcing conversion from k to f.
 
         Should return 50.0K in fahrenheit.
         """
@@ -403,7 +405,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_forced_r_to_c(self):
         """
-        Test on_message() when forcing conversion from r to c.
+        Test handle_message() when forcing conversion from r to c.
 
         Should return 50°R in celsius.
         """
@@ -414,7 +416,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_forced_c_to_c(self):
         """
-        Test on_message() when forcing conversion from c to c.
+        Test handle_message() when forcing conversion from c to c.
 
         Should return:
         "Did {author} just try to convert {old_temp} {origin}
@@ -427,7 +429,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_when_original_and_converted_are_same_not_forced(self):
         """
-        Test on_message() with -40 C and non-forced conversion.
+        Test handle_message() with -40 C and non-forced conversion.
 
         Should return a surprised exclamation saying that they are the same.
         Should also have hellacold.gif attached.
@@ -439,7 +441,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_when_original_and_converted_are_same_forced(self):
         """
-        Test on_message() with -40 C and forced conversion to fahrenheit.
+        Test handle_message() with -40 C and forced conversion to fahrenheit.
 
         Should return an angry response saying that they are the same,
         and that the author knew they would be.
@@ -451,7 +453,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_with_temperature_minus_20c_gives_gif(self):
         """
-        Verify that on_message() with -20c includes hellacold.gif in output.
+        Verify that handle_message() with -20c includes hellacold.gif in output.
 
         -20c is the threshold for including the gif. It should be included
         in the response for this request.
@@ -473,7 +475,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_with_temperature_minus_19c_gives_no_gif(self):
         """
-        Verify that on_message() with -19c doesn't include gif in output.
+        Verify that handle_message() with -19c doesn't include gif in output.
 
         -20c is the threshold for including the gif. -19c should not have
         any attachments whatsoever.
@@ -486,7 +488,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_with_temperature_35c_gives_gif(self):
         """
-        Verify that on_message() with 35c includes helldog.gif in output.
+        Verify that handle_message() with 35c includes helldog.gif in output.
 
         35c is the threshold for including the gif. It should be included
         in the response for this request.
@@ -508,7 +510,7 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
 
     def test_on_message_with_temperature_34c_gives_no_gif(self):
         """
-        Verify that on_message() with 34c doesn't include gif in output.
+        Verify that handle_message() with 34c doesn't include gif in output.
 
         35c is the threshold for including the gif. 34c should not have
         any attachments whatsoever.
@@ -518,3 +520,79 @@ class TemperatureConverterCogUnitTest(unittest.TestCase):
         self.assertEqual(
             len(self.files),
             0, msg="self.files should be empty.")
+
+    def test_default_unit_follows_member_roles(self):
+        """Verify that the default unit always reflects the member's current roles."""
+        self.add_role_with_name("Celsius")
+        celsius = self.author.roles.pop()
+        self.add_role_with_name("North America")
+        self.assertEqual(self.cog.default_unit(self.ctx), TempUnit.F)
+
+        # No update event is needed, only the role index is cached.
+        self.author.roles.append(celsius)
+        self.assertEqual(self.cog.default_unit(self.ctx), TempUnit.C)
+
+    def test_role_index_is_rebuilt_when_roles_change(self):
+        """Verify that renaming a role invalidates the role index of the guild."""
+        self.add_role_with_name("Fahrenheit")
+        self.assertEqual(self.cog.default_unit(self.ctx), TempUnit.F)
+
+        role = self.author.roles[-1]
+        before = helpers.MockRole(name="Fahrenheit", id=role.id)
+        role.name = "Freedom"
+        role.guild = self.ctx.guild
+        asyncio.run(self.cog.on_guild_role_update(before, role))
+        self.assertEqual(self.cog.default_unit(self.ctx), TempUnit.C)
+
+    def test_handle_message_with_several_statements_sends_one_reply(self):
+        """
+        Verify that handle_message() converts all statements in one reply.
+
+        Each statement gets its own line, including negative temperatures
+        following directly after another statement.
+        """
+        result = self.call_on_ready_with("50 c today, -40 f tonight and 50 f in k")
+
+        expected = ("50.0°C is around 122.0°F\n" +
+                    "Guess what! -40.0°F is the same as -40.0°C! WOOOW!\n" +
+                    "50.0°F is around 283.15K")
+        self.assertEqual(expected, result)
+        self.channel.send.assert_called_once()
+
+    def test_handle_message_with_repeated_statement_replies_once(self):
+        """Verify that handle_message() doesn't repeat identical lines."""
+        result = self.call_on_ready_with("50 c or so, yes 50 c")
+
+        expected = "50.0°C is around 122.0°F"
+        self.assertEqual(expected, result)
+
+    def test_handle_message_with_several_statements_gives_one_gif(self):
+        """
+        Verify that handle_message() attaches at most one gif.
+
+        When hot and cold statements are equally extreme the hot one wins.
+        """
+        self.call_on_ready_with("35 c in the sun and -20 c in the shade")
+
+        self.assertEqual(
+            len(self.files),
+            1, msg="self.files should have exactly one file.")
+
+        self.assertEqual(
+            self.files[0].filename,
+            "helldog.gif")
+
+    def test_handle_message_picks_gif_of_most_extreme_statement(self):
+        """Verify that handle_message() picks the gif of the most extreme statement."""
+        self.call_on_ready_with("36 c in the sun and -60 c in the freezer")
+        self.assertEqual(self.files[0].filename, "hellacold.gif")
+
+        self.call_on_ready_with("-100000 k and 200000 c")
+        self.assertEqual(self.files[1].filename, "helldog.gif")
+
+    def test_handle_message_limits_number_of_statements(self):
+        """Verify that handle_message() converts at most max_statements statements."""
+        self.cog.max_statements = 2
+        result = self.call_on_ready_with("1 c and 2 c and 3 c")
+
+        self.assertEqual(len(result.splitlines()), 2)
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark for the temperature statement regex.
+
+Timings depend on the machine and whatever else it's doing, so the
+benchmarks only run when MRFREEZE_BENCHMARK is set in the environment.
+"""
+
+import os
+import re
+import timeit
+
+from mrfreeze.cogs.temp_converter import TemperatureConverter
+
+import pytest
+
+from tests import helpers
+
+benchmark = pytest.mark.skipif(
+    not os.environ.get("MRFREEZE_BENCHMARK"),
+    reason="set MRFREEZE_BENCHMARK to run benchmarks")
+
+non_matching = "I've been up since 6 this morning and I'm on my 3rd coffee already."
+matching = "It's 35 c outside today, convert 35 c to f for me please!"
+
+
+def legacy_search(text):
+    """
+    Search for a temperature statement the way parse_request used to.
+
+    The patterns were rebuilt from f-strings for every message and the
+    forced conversion was searched for with a second, separate regex.
+    """
+    numbers = r"(?:(?:\s|^)-)?\d+(?:[,.]\d+)? ?"
+    celsius = r"°?(?:c|celcius|celsius|civili[sz]ed units?)"
+    fahrenheit = r"°?(?:f|fahrenheit|freedom units?)"
+    degrees = r"°?(?:deg|degrees)"
+    kelvin = r"(?:k|kelvin)"
+    rankine = r"°?(?:r|rankine)"
+
+    regex = (f"({numbers})(?:({celsius})|({fahrenheit})" +
+             fr"|([ °]{kelvin})|({rankine})|({degrees}))(?:\s|$)")
+    statement = re.search(regex, text, re.IGNORECASE)
+    if not statement:
+        return False
+
+    no_catch = (fr"(?:(?:{numbers}) ?(?:{celsius}|{fahrenheit}|" +
+                fr"{degrees}|[ °]{kelvin}|{rankine})) (?:for|in|as" +
+                r"|(?:convert )?to|convert)")
+    find_convert = (fr"{no_catch} (?:({celsius})|({fahrenheit})" +
+                    fr"|(°?{kelvin})|({rankine}))(?:\s|$)")
+    return re.search(find_convert, text, re.IGNORECASE)
+
+
+def best_time(function, text):
+    """Get the best time out of several runs of function(text)."""
+    return min(timeit.repeat(lambda: function(text), number=2000, repeat=7))
+
+
+@pytest.fixture()
+def cog():
+    """Instantiate the cog."""
+    yield TemperatureConverter(helpers.MockMrFreeze())
+
+
+def test_precompiled_regex_matches_like_legacy(cog):
+    """Test that the precompiled regex finds the same forced conversions."""
+    assert not legacy_search(non_matching)
+    assert not cog.temperature_regex.search(non_matching)
+    assert legacy_search(matching)
+    assert cog.temperature_regex.search(matching)
+
+
+@benchmark
+def test_precompiled_regex_is_faster_for_non_matching_message(cog):
+    """Test that rejecting a message is cheaper than before."""
+    legacy = best_time(legacy_search, non_matching)
+    current = best_time(cog.temperature_regex.search, non_matching)
+    assert current < legacy, f"{current:.6f}s should be less than {legacy:.6f}s"
+
+
+@benchmark
+def test_precompiled_regex_is_faster_for_matching_message(cog):
+    """Test that extracting a forced conversion is cheaper than before."""
+    legacy = best_time(legacy_search, matching)
+    current = best_time(cog.temperature_regex.search, matching)
+    assert current < legacy, f"{current:.6f}s should be less than {legacy:.6f}s"
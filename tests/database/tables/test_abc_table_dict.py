@@ -0,0 +1,164 @@
+"""Unittest for the dictionary based tables, using the mute channels table."""
+
+import logging
+import sqlite3
+
+from mrfreeze.database.helpers import db_execute
+from mrfreeze.database.tables.freeze_mutes import FreezeMutes
+from mrfreeze.database.tables.mute_channels import MuteChannels
+
+import pytest
+
+from tests import helpers
+
+
+@pytest.fixture()
+def dbpath(tmp_path):
+    """Path to an empty database."""
+    yield str(tmp_path / "settings.db")
+
+
+@pytest.fixture()
+def table(dbpath):
+    """Create an empty mute channels table."""
+    table = MuteChannels(dbpath, logging.getLogger("test"))
+    table.create_table()
+    table.load_from_db()
+    yield table
+
+
+def stored(table):
+    """Read the values stored on disk."""
+    with sqlite3.connect(table.dbpath) as conn:
+        return dict(conn.execute(table.select_all).fetchall())
+
+
+def test_durable_upsert_writes_immediately(table):
+    """Test that durable tables write every change right away."""
+    guild = helpers.MockGuild()
+
+    assert table.set_by_id(guild, 10)
+    assert table.get(guild) == 10
+    assert stored(table) == { guild.id: 10 }
+
+
+def test_write_behind_upsert(table):
+    """Test that changes to tables that aren't durable are written on flush."""
+    table.durable = False
+    first = helpers.MockGuild()
+    second = helpers.MockGuild()
+
+    assert table.set_by_id(first, 10)
+    assert table.set_by_id(first, 11)
+    assert table.set_by_id(second, 20)
+    assert table.get(first) == 11
+    assert stored(table) == dict()
+
+    assert table.flush()
+    assert stored(table) == { first.id: 11, second.id: 20 }
+    assert table.pending == dict()
+
+
+def test_reload_keeps_pending_changes(table):
+    """Test that reloading from the database doesn't drop unwritten changes."""
+    table.durable = False
+    guild = helpers.MockGuild()
+
+    table.set_by_id(guild, 10)
+    table.load_from_db()
+    assert table.get(guild) == 10
+
+
+def test_reload_keeps_changes_being_flushed(table):
+    """Test that changes a flush is still writing aren't lost by a reload."""
+    guild = helpers.MockGuild()
+    table.flushing = { guild.id: 10 }
+
+    table.load_from_db()
+    assert table.get(guild) == 10
+
+
+def test_reload_reads_again_after_flush_finishes(table, monkeypatch):
+    """Test that the table is read again if a flush finishes while it's read."""
+    reads = list()
+
+    def read_during_flush(*args):
+        reads.append(args)
+        if len(reads) == 1:
+            # The flush finishes after the first read was made.
+            table.flushes += 1
+        return db_execute(*args)
+
+    monkeypatch.setattr(
+        "mrfreeze.database.tables.abc_table_dict.db_execute", read_during_flush)
+    table.load_from_db()
+    assert len(reads) == 2
+
+
+def test_tables_have_their_own_lock(table, dbpath):
+    """Test that tables don't share a pending lock."""
+    other = FreezeMutes(dbpath, logging.getLogger("test"))
+    assert table.pending_lock is not other.pending_lock
+
+
+def test_failed_flush_is_retried(table):
+    """Test that changes that couldn't be written are kept for the next flush."""
+    table.durable = False
+    guild = helpers.MockGuild()
+    table.set_by_id(guild, 10)
+
+    insert = table.insert
+    table.insert = "INSERT INTO no_such_table VALUES (?, ?, ?)"
+    assert not table.flush()
+    assert table.pending == { guild.id: 10 }
+
+    table.insert = insert
+    assert table.flush()
+    assert stored(table) == { guild.id: 10 }
+
+
+def test_freeze_mutes_write_behind(dbpath):
+    """Test that freeze mutes are written behind."""
+    table = FreezeMutes(dbpath, logging.getLogger("test"))
+    table.create_table()
+    table.load_from_db()
+    guild = helpers.MockGuild()
+
+    table.toggle(guild)
+    assert table.get(guild)
+    assert stored(table) == dict()
+    table.flush()
+    assert stored(table) == { guild.id: 1 }
+
+
+def test_update_many(table):
+    """Test that many rows are written at once and the dictionary updated."""
+    table.update({ "server": 1, "channel": 10 })
+    rows = [ { "server": server, "channel": server * 10 } for server in range(1, 101) ]
+    rows[0]["channel"] = 11
+
+    assert table.update_many(rows)
+    assert stored(table) == { row["server"]: row["channel"] for row in rows }
+    assert table.dict[1] == 11
+    assert table.dict[100] == 1000
+
+
+def test_update_many_rejects_missing_values(table):
+    """Test that nothing is written if any row is missing a value."""
+    rows = [ { "server": 1, "channel": 10 }, { "server": 2, "channel": None } ]
+
+    assert not table.update_many(rows)
+    assert stored(table) == dict()
+    assert table.dict == dict()
+
+
+def test_update_many_overrides_pending_changes(table):
+    """Test that rows written by update_many aren't overwritten by older pending changes."""
+    table.durable = False
+    guild = helpers.MockGuild()
+    table.set_by_id(guild, 10)
+
+    assert table.update_many([ { "server": guild.id, "channel": 20 } ])
+    table.flush()
+    assert stored(table) == { guild.id: 20 }
+    assert table.get(guild) == 20
@@ -0,0 +1,125 @@
+"""Unittest for the list based tables."""
+
+import logging
+import sqlite3
+import threading
+
+from mrfreeze.database.tables.abc_table_list import ABCTableList
+
+import pytest
+
+
+class Blacklist(ABCTableList):
+    """A small list table, like the region blacklist."""
+
+    def __init__(self, dbpath, logger):
+        self.dbpath = dbpath
+        self.name = "blacklist"
+        self.table_name = "blacklist"
+        self.entries = None
+        self.memory_lock = threading.RLock()
+        self.logger = logger
+        self.primary_keys = ("server", "member")
+        self.secondary_keys = ("reason",)
+        self.index_columns = ("server", "member")
+
+        self.select_all = f"SELECT server, member, reason FROM {self.table_name}"
+
+        self.insert = f"""
+        INSERT INTO {self.table_name}
+            (server, member, reason) VALUES (?, ?, ?)
+        ON CONFLICT(server, member) DO UPDATE SET reason = ?;
+        """
+
+        self.table = f"""
+        CREATE TABLE IF NOT EXISTS {self.table_name} (
+            server      INTEGER NOT NULL,
+            member      INTEGER NOT NULL,
+            reason      TEXT,
+            PRIMARY KEY (server, member)
+        );"""
+
+
+@pytest.fixture()
+def table(tmp_path):
+    """Create an empty blacklist table."""
+    table = Blacklist(str(tmp_path / "settings.db"), logging.getLogger("test"))
+    table.create_table()
+    table.load_from_db()
+    yield table
+
+
+def stored(table):
+    """Read the rows stored on disk."""
+    with sqlite3.connect(table.dbpath) as conn:
+        return set(conn.execute(table.select_all).fetchall())
+
+
+def test_update_and_lookup(table):
+    """Test that written rows can be looked up from memory."""
+    assert table.update({ "server": 1, "member": 10, "reason": "spam" })
+    assert table.upsert((1, 11), ("trolling",))
+    assert table.upsert((2, 10), ("spam",))
+
+    assert table.contains(1, 10)
+    assert not table.contains(2, 11)
+    assert table.get(1, 11) == (1, 11, "trolling")
+    assert sorted(table.find("server", 1)) == [ (1, 10, "spam"), (1, 11, "trolling") ]
+    assert sorted(table.find("member", 10)) == [ (1, 10, "spam"), (2, 10, "spam") ]
+    assert table.find("server", 3) == []
+    assert stored(table) == set(table.all())
+
+
+def test_update_replaces_row(table):
+    """Test that updating a row replaces it, in memory and in the indexes."""
+    table.upsert((1, 10), ("spam",))
+    table.upsert((1, 10), ("trolling",))
+
+    assert table.get(1, 10) == (1, 10, "trolling")
+    assert table.find("server", 1) == [ (1, 10, "trolling") ]
+    assert stored(table) == { (1, 10, "trolling") }
+
+
+def test_delete(table):
+    """Test that deleted rows are removed from the database and indexes."""
+    table.update_many([ { "server": 1, "member": m, "reason": None } for m in range(5) ],
+                      accept_none=True)
+    assert len(table.find("server", 1)) == 5
+
+    assert table.delete(1, 0)
+    assert table.delete_many([ (1, 1), (1, 2) ])
+    assert not table.contains(1, 0)
+    assert sorted(table.find("server", 1)) == [ (1, 3, None), (1, 4, None) ]
+    assert table.find("member", 0) == []
+    assert stored(table) == { (1, 3, None), (1, 4, None) }
+
+
+def test_load_from_db(table):
+    """Test that rows already in the database are loaded and indexed."""
+    with sqlite3.connect(table.dbpath) as conn:
+        conn.execute("INSERT INTO blacklist VALUES (1, 10, 'spam')")
+
+    table.load_from_db()
+    assert table.get(1, 10) == (1, 10, "spam")
+    assert table.find("member", 10) == [ (1, 10, "spam") ]
+
+
+def test_readers_wait_for_writers(table):
+    """Test that lookups wait while the entries are being changed."""
+    table.upsert((1, 2), ("spam",))
+    results = list()
+
+    with table.memory_lock:
+        reader = threading.Thread(target=lambda: results.append(table.get(1, 2)))
+        reader.start()
+        reader.join(timeout=0.05)
+        assert results == list(), "get() shouldn't read while the lock is held"
+
+    reader.join(timeout=5)
+    assert results == [ (1, 2, "spam") ]
+
+
+def test_tables_have_their_own_lock(table, tmp_path):
+    """Test that tables don't share a memory lock."""
+    other = Blacklist(str(tmp_path / "other.db"), logging.getLogger("test"))
+    assert table.memory_lock is not other.memory_lock
@@ -0,0 +1,129 @@
+"""Unittest for the inkcyclopedia_inks table."""
+
+import logging
+import sqlite3
+
+from mrfreeze.database.tables.inkcyclopedia import InkcyclopediaInks
+
+import pytest
+
+
+@pytest.fixture()
+def dbpath(tmp_path):
+    """Path to an empty database."""
+    yield str(tmp_path / "settings.db")
+
+
+@pytest.fixture()
+def table(dbpath):
+    """Create an empty ink table."""
+    table = InkcyclopediaInks(dbpath, logging.getLogger("test"))
+    table.create_table()
+    yield table
+
+
+def rows(table):
+    """Read all rows in the table."""
+    return [ row for chunk in table.iter_rows(chunk_size=2) for row in chunk ]
+
+
+def test_replace_all_stores_position_and_hash(table):
+    """Test that inks are stored in order with their content hash."""
+    assert table.replace_all([
+        ("Blue", "https://example.com/a.jpg", "blue"),
+        ("Red", "https://example.com/b.jpg", "red"),
+        ("Blue", "https://example.com/c.jpg", "other blue"),
+        ("Green", "https://example.com/d.jpg", "green"),
+    ])
+
+    stored = rows(table)
+    assert [ (row.name, row.position) for row in stored ] == [
+        ("Blue", 0), ("Red", 1), ("Green", 2) ]
+    assert stored[0].url == "https://example.com/a.jpg"
+    assert stored[0].hash == InkcyclopediaInks.ink_hash(
+        "Blue", "https://example.com/a.jpg", "blue")
+
+
+def test_replace_all_updates_and_deletes(table):
+    """Test that changed inks are updated and missing inks are deleted."""
+    table.replace_all([
+        ("Blue", "https://example.com/a.jpg", "blue"),
+        ("Red", "https://example.com/b.jpg", "red"),
+    ])
+    table.replace_all([
+        ("Red", "https://example.com/b.jpg", "reddish"),
+        ("Green", "https://example.com/d.jpg", "green"),
+    ])
+
+    stored = rows(table)
+    assert [ (row.name, row.regex, row.position) for row in stored ] == [
+        ("Red", "reddish", 0), ("Green", "green", 1) ]
+
+
+def test_create_table_upgrades_old_table(dbpath):
+    """Test that the new columns are added to a table created without them."""
+    with sqlite3.connect(dbpath) as conn:
+        conn.execute("""
+        CREATE TABLE inkcyclopedia_inks (
+            name      VARCHAR(63) NOT NULL PRIMARY KEY,
+            url       VARCHAR(255) NOT NULL,
+            regex     VARCHAR(127)
+        );""")
+    conn.close()
+
+    table = InkcyclopediaInks(dbpath, logging.getLogger("test"))
+    table.create_table()
+    assert table.replace_all([ ("Blue", "https://example.com/a.jpg", "blue") ])
+    assert rows(table)[0].position == 0
+
+
+def test_apply_changes(table):
+    """Test that changes are patched in, keeping the position of edited inks."""
+    table.replace_all([
+        ("Blue", "https://example.com/a.jpg", "blue", "rec1", "2020-01-01"),
+        ("Red", "https://example.com/b.jpg", "red", "rec2", "2020-01-01"),
+        ("Grey", "https://example.com/c.jpg", "grey", "rec3", "2020-01-03"),
+    ])
+    assert table.last_modified() == "2020-01-03"
+
+    written, removed = table.apply_changes([
+        ("Blue", "https://example.com/a.jpg", "blueish", "rec1", "2020-01-04"),
+        ("Green", "https://example.com/d.jpg", "green", "rec4", "2020-01-05"),
+    ], [ "rec2", "rec404" ])
+
+    assert [ row.name for row in written ] == [ "Blue", "Green" ]
+    assert removed == [ "Red" ]
+    stored = rows(table)
+    assert [ (row.name, row.regex, row.position) for row in stored ] == [
+        ("Blue", "blueish", 0), ("Grey", "grey", 2), ("Green", "green", 3) ]
+    assert table.last_modified() == "2020-01-05"
+
+
+def test_apply_changes_skips_unchanged(table):
+    """Test that an ink identical to the stored one isn't written again."""
+    ink = ("Blue", "https://example.com/a.jpg", "blue", "rec1", "2020-01-01")
+    table.replace_all([ ink ])
+
+    written, removed = table.apply_changes([ ink ])
+    assert written == []
+    assert removed == []
+
+
+def test_update_many(table):
+    """Test that update_many writes the inks without keeping them in memory."""
+    ink_hash = InkcyclopediaInks.ink_hash("Blue", "https://example.com/a.jpg", "blue")
+    assert table.update_many([ {
+        "name": "Blue", "url": "https://example.com/a.jpg", "regex": "blue",
+        "position": 0, "hash": ink_hash, "record_id": "", "modified": "" } ])
+
+    assert rows(table)[0].hash == ink_hash
+    assert table.dict is None
+
+
+def test_never_loaded_into_memory(table):
+    """Test that the inks are left out of loading, and the settings warm-up."""
+    table.replace_all([ ("Blue", "https://example.com/a.jpg", "blue") ])
+    table.load_from_db()
+
+    assert table.is_loaded()
+    assert table.dict is None
@@ -0,0 +1,67 @@
+"""Unittest for the mutes table."""
+
+import logging
+import sqlite3
+
+from mrfreeze.database.helpers import db_connect
+from mrfreeze.database.helpers import db_epoch
+from mrfreeze.database.tables.mutes import Mutes
+
+import pytest
+
+
+@pytest.fixture()
+def table(tmp_path):
+    """Create an empty mutes table."""
+    table = Mutes(str(tmp_path / "settings.db"), logging.getLogger("test"))
+    table.create_table()
+    yield table
+
+
+def mute(table, server, member, until):
+    """Banish a member of a server until some time."""
+    table.update(
+        { "server": server, "member": member, "voluntary": False, "until": until },
+        accept_none=True)
+
+
+def test_expired(table):
+    """Test that only mutes that have ended are returned, earliest first."""
+    mute(table, 1, 1, 300)
+    mute(table, 1, 2, 100)
+    mute(table, 2, 1, 200)
+    mute(table, 2, 2, 900)
+    mute(table, 2, 3, None)
+
+    assert [ row[:2] for row in table.expired(500) ] == [ (1, 2), (2, 1), (1, 1) ]
+    assert [ row[:2] for row in table.expired(500, server=2) ] == [ (2, 1) ]
+    assert table.expired(50) == list()
+
+
+def test_expired_uses_indexes(table):
+    """Test that looking for expired mutes searches an index instead of scanning."""
+    conn = db_connect(table.dbpath)
+    for sql, values in ((table.select_expired, (0,)), (table.select_server_expired, (0, 0))):
+        plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", values))
+        assert "SEARCH" in plan and "until" in plan
+
+
+def test_text_end_times_are_converted(tmp_path):
+    """Test that end times stored as text by older versions become epoch seconds."""
+    dbpath = str(tmp_path / "settings.db")
+    conn = sqlite3.connect(dbpath)
+    with conn:
+        conn.execute("""CREATE TABLE mutes (
+            server INTEGER NOT NULL, member INTEGER NOT NULL,
+            voluntary BOOLEAN NOT NULL, until DATE, PRIMARY KEY (server, member));""")
+        conn.execute("INSERT INTO mutes VALUES (1, 1, 0, '2030-01-01 00:00:00')")
+        conn.execute("INSERT INTO mutes VALUES (1, 2, 0, NULL)")
+    conn.close()
+
+    table = Mutes(dbpath, logging.getLogger("test"))
+    table.create_table()
+    table.load_from_db()
+
+    assert table.get(1, 1) == (1, 1, 0, db_epoch("2030-01-01 00:00:00"))
+    assert table.get(1, 2) == (1, 2, 0, None)
+    assert [ row[:2] for row in table.expired(db_epoch("2031-01-01 00:00:00")) ] == [ (1, 1) ]
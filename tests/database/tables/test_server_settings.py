@@ -0,0 +1,58 @@
+"""Unittest for the server settings table."""
+
+import logging
+
+from mrfreeze.database.tables.server_settings import ServerSettings
+
+import pytest
+
+from tests import helpers
+
+
+@pytest.fixture()
+def table(tmp_path):
+    """Create an empty server settings table."""
+    table = ServerSettings(str(tmp_path / "settings.db"), logging.getLogger("test"))
+    table.create_table()
+    yield table
+
+
+def test_get_and_set(table):
+    """Test that settings are stored per server and survive a reload."""
+    guild = helpers.MockGuild(id=1)
+    other = helpers.MockGuild(id=2)
+
+    assert table.get_value(guild, "mute_interval") is None
+    assert table.set_value(guild, "mute_interval", "10")
+    assert table.set_value(guild, "mute_interval", "15")
+    assert table.get_value(guild, "mute_interval") == "15"
+    assert table.get_value(other, "mute_interval") is None
+
+    reloaded = ServerSettings(table.dbpath, logging.getLogger("test"))
+    reloaded.load_from_db()
+    assert reloaded.get_value(guild, "mute_interval") == "15"
+
+
+def test_listeners(table):
+    """Test that listeners are told about changes to their setting only."""
+    guild = helpers.MockGuild(id=1)
+    changes = list()
+    table.add_listener("mute_interval", lambda *change: changes.append(change))
+
+    table.set_value(guild, "mute_interval", "10")
+    table.set_value(guild, "self_mute_time", "20")
+    table.update_many([ { "server": 2, "setting": "mute_interval", "value": "30" } ])
+
+    assert changes == [ (1, "mute_interval", "10"), (2, "mute_interval", "30") ]
+
+
+def test_failing_listener(table):
+    """Test that a failing listener doesn't stop the change or other listeners."""
+    guild = helpers.MockGuild(id=1)
+    changes = list()
+    table.add_listener("mute_interval", lambda *change: 1 / 0)
+    table.add_listener("mute_interval", lambda *change: changes.append(change))
+
+    assert table.set_value(guild, "mute_interval", "10")
+    assert changes == [ (1, "mute_interval", "10") ]
+    assert table.get_value(guild, "mute_interval") == "10"
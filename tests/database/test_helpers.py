@@ -0,0 +1,63 @@
+"""Unittest for the database helpers."""
+
+import threading
+
+from mrfreeze.database.helpers import ConnectionManager, db_execute
+
+import pytest
+
+
+@pytest.fixture()
+def manager():
+    """Create a connection manager, closing its connections afterwards."""
+    manager = ConnectionManager()
+    yield manager
+    manager.close_all()
+
+
+def test_connect_reuses_connection(manager, tmp_path):
+    """Test that the same thread always gets the same connection."""
+    dbpath = str(tmp_path / "test.db")
+    assert manager.connect(dbpath) is manager.connect(dbpath)
+    assert manager.connect(dbpath) is not manager.connect(str(tmp_path / "other.db"))
+
+
+def test_connect_sets_pragmas(manager, tmp_path):
+    """Test that new connections use WAL mode."""
+    conn = manager.connect(str(tmp_path / "test.db"))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+
+def test_connect_per_thread(manager, tmp_path):
+    """Test that other threads get connections of their own."""
+    dbpath = str(tmp_path / "test.db")
+    main_conn = manager.connect(dbpath)
+    thread_conns = list()
+
+    thread = threading.Thread(target=lambda: thread_conns.append(manager.connect(dbpath)))
+    thread.start()
+    thread.join()
+
+    assert thread_conns[0] is not main_conn
+    assert len(manager.connections) == 2
+
+
+def test_close_all(manager, tmp_path):
+    """Test that closing all connections opens fresh ones on next use."""
+    dbpath = str(tmp_path / "test.db")
+    conn = manager.connect(dbpath)
+    manager.close_all()
+    assert manager.connections == []
+    assert manager.connect(dbpath) is not conn
+
+
+def test_db_execute_commits(tmp_path):
+    """Test that db_execute commits writes on the shared connection."""
+    dbpath = str(tmp_path / "test.db")
+    db_execute(dbpath, "CREATE TABLE t (x INTEGER)", tuple())
+    db_execute(dbpath, "INSERT INTO t (x) VALUES (?)", (1,))
+
+    query = db_execute(dbpath, "SELECT x FROM t", tuple())
+    assert query.error is None
+    assert query.output == [ (1,) ]
@@ -0,0 +1,164 @@
+"""Unittest for importing the legacy mutes and regions databases."""
+
+import sqlite3
+from unittest.mock import patch
+
+from mrfreeze.database.helpers import db_epoch
+from mrfreeze.database.migrate import import_setting_files
+from mrfreeze.database.migrate import migrate_legacy
+from mrfreeze.database.settings import Settings
+
+import pytest
+
+from tests import helpers
+
+
+@pytest.fixture()
+def settings(tmp_path):
+    """Create settings with a database of their own."""
+    yield Settings(str(tmp_path / "settings.db"))
+
+
+def create_legacy(tmp_path, mutes, blacklist):
+    """Create legacy databases like the banish cog used to."""
+    conn = sqlite3.connect(str(tmp_path / "mutes.db"))
+    with conn:
+        conn.execute("""CREATE TABLE mutes(
+            id          integer NOT NULL,
+            server      integer NOT NULL,
+            voluntary   boolean NOT NULL,
+            until       date,
+            CONSTRAINT  server_user PRIMARY KEY (id, server));""")
+        conn.executemany("INSERT INTO mutes VALUES (?, ?, ?, ?)", mutes)
+    conn.close()
+
+    conn = sqlite3.connect(str(tmp_path / "regions.db"))
+    with conn:
+        conn.execute("""CREATE TABLE blacklist(
+            uid         integer NOT NULL,
+            sid         integer NOT NULL,
+            CONSTRAINT  sid_uid PRIMARY KEY (uid, sid));""")
+        conn.executemany("INSERT INTO blacklist VALUES (?, ?)", blacklist)
+    conn.close()
+
+
+def test_migrate_legacy(tmp_path, settings):
+    """Test that every legacy row ends up in the new tables, in batches."""
+    mutes = [ (member, member % 3, member % 2, None if member % 5 else "2030-01-01 00:00:00")
+              for member in range(25) ]
+    blacklist = [ (member, 1) for member in range(7) ]
+    create_legacy(tmp_path, mutes, blacklist)
+
+    counts = migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"), batch_size=4)
+    assert counts == { "server settings": 0, "mutes": 25, "region blacklist": 7 }
+
+    assert sorted(settings.mutes.all(), key=str) == sorted((
+        (server, member, voluntary, db_epoch(until))
+        for member, server, voluntary, until in mutes), key=str)
+    assert len(settings.mutes.find("server", 1)) == 8
+    assert settings.mutes.get(1, 10) == (1, 10, 0, db_epoch("2030-01-01 00:00:00"))
+
+    assert sorted(row[1] for row in settings.region_blacklist.find("server", 1)) == list(range(7))
+
+    # The data survives a restart.
+    reloaded = Settings(settings.dbpath)
+    reloaded.mutes.load_from_db()
+    assert len(reloaded.mutes.all()) == 25
+
+
+def test_migrate_twice(tmp_path, settings):
+    """Test that importing the same data again doesn't duplicate anything."""
+    create_legacy(tmp_path, [ (1, 2, 0, None) ], [ (1, 2) ])
+    migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"))
+    counts = migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"))
+
+    assert counts == { "server settings": 0, "mutes": 1, "region blacklist": 1 }
+    assert settings.mutes.all() == [ (2, 1, 0, None) ]
+    assert settings.region_blacklist.all() == [ (2, 1) ]
+
+
+def test_migrate_without_legacy(tmp_path, settings):
+    """Test that missing legacy data is skipped and not created."""
+    counts = migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"))
+
+    assert counts == { "server settings": 0, "mutes": 0, "region blacklist": 0 }
+    assert not (tmp_path / "mutes.db").exists()
+    assert not (tmp_path / "servers").exists()
+    assert settings.mutes.all() == list()
+
+
+def test_migrate_only_once(tmp_path, settings):
+    """Test that the import on start skips tables that have been imported before."""
+    create_legacy(tmp_path, [ (1, 2, 0, None) ], [ (1, 2) ])
+    migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"), only_once=True)
+
+    # Emptied tables don't get the legacy data back.
+    settings.mutes.delete(2, 1)
+    settings.region_blacklist.delete(2, 1)
+    counts = migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"), only_once=True)
+
+    assert counts == dict()
+    assert settings.mutes.all() == list()
+    assert settings.region_blacklist.all() == list()
+
+
+def test_migrate_only_once_new_sources(tmp_path, settings):
+    """Test that legacy data that didn't exist before is still imported on start."""
+    counts = migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"), only_once=True)
+    assert counts == dict()
+
+    create_legacy(tmp_path, [ (1, 2, 0, None) ], [ (1, 2) ])
+    settings.region_blacklist.upsert((5, 5), ())
+    counts = migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"), only_once=True)
+
+    assert counts == { "mutes": 1, "region blacklist": 1 }
+    assert sorted(settings.region_blacklist.all()) == [ (2, 1), (5, 5) ]
+
+
+def test_migrate_marks_manual_import(tmp_path, settings):
+    """Test that !migratedb counts as having imported, but failures don't."""
+    create_legacy(tmp_path, [ (1, 2, 0, None) ], [ (1, 2) ])
+    with patch.object(settings.region_blacklist, "update_many", return_value=False):
+        counts = migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"))
+    assert counts["region blacklist"] == -1
+
+    counts = migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"), only_once=True)
+    assert counts == { "region blacklist": 1 }
+
+
+def test_migrate_skips_bad_rows(tmp_path, settings):
+    """Test that a mute with an unreadable end time is skipped, not fatal."""
+    create_legacy(tmp_path, [ (1, 2, 0, "sometime"), (2, 2, 0, None) ], list())
+
+    counts = migrate_legacy(settings, str(tmp_path), str(tmp_path / "servers"))
+    assert counts == { "server settings": 0, "mutes": 1, "region blacklist": 0 }
+    assert settings.mutes.all() == [ (2, 2, 0, None) ]
+
+
+def test_import_setting_files_skips_bad_files(tmp_path, settings):
+    """Test that a setting file that isn't valid UTF-8 is skipped, not fatal."""
+    servers = tmp_path / "servers"
+    (servers / "1").mkdir(parents=True)
+    (servers / "1" / "mute_interval").write_bytes(b"\xff\xfe5")
+    (servers / "1" / "self_mute_time").write_text("20")
+
+    assert import_setting_files(settings, str(servers)) == 1
+    assert settings.server_settings.all() == [ (1, "self_mute_time", "20") ]
+
+
+def test_import_setting_files(tmp_path, settings):
+    """Test that every setting file is imported, in batches, skipping strays."""
+    servers = tmp_path / "servers"
+    for server in range(3):
+        (servers / str(server)).mkdir(parents=True)
+        (servers / str(server) / "mute_interval").write_text(f"{server + 5}\n")
+        (servers / str(server) / "self_mute_time").write_text("20")
+    (servers / "README").write_text("not a server")
+    (servers / "notes").mkdir()
+
+    assert import_setting_files(settings, str(servers), batch_size=4) == 6
+
+    guild = helpers.MockGuild(id=2)
+    assert settings.get_server_setting(guild, "mute_interval") == "7"
+    assert settings.get_server_setting(guild, "self_mute_time") == "20"
+    assert len(settings.server_settings.all()) == 6
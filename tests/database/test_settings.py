@@ -0,0 +1,66 @@
+"""Unittest for the Settings class."""
+
+from mrfreeze.database.settings import Settings
+
+import pytest
+
+from tests import helpers
+
+
+@pytest.fixture()
+def settings(tmp_path):
+    """Create settings with a database of their own."""
+    yield Settings(str(tmp_path / "settings.db"))
+
+
+def test_tables_start_unloaded(settings):
+    """Test that no table is loaded until it's used, and inks never are."""
+    unloaded = settings.unloaded_tables()
+    assert unloaded == [ table for table in settings.tables
+                         if table is not settings.inkcyclopedia ]
+
+    guild = helpers.MockGuild()
+    assert settings.get_mute_channel(guild) is None
+    assert settings.mutes.get(guild.id, 1) is None
+    assert settings.unloaded_tables() == unloaded
+
+
+def test_ensure_loaded(settings):
+    """Test that ensure_loaded loads a table only once."""
+    assert settings.mute_roles.ensure_loaded()
+    settings.mute_roles.dict[1] = 10
+    assert settings.mute_roles.ensure_loaded()
+    assert settings.mute_roles.dict == { 1: 10 }
+    assert not settings.mute_channels.is_loaded()
+
+
+def test_toggle_loads_current_value(tmp_path):
+    """Test that toggling a freeze mute that's been set before flips it."""
+    dbpath = str(tmp_path / "settings.db")
+    guild = helpers.MockGuild()
+    first = Settings(dbpath)
+    first.toggle_freeze_mute(guild)
+    first.flush()
+
+    settings = Settings(dbpath)
+    settings.toggle_freeze_mute(guild)
+    assert settings.is_freeze_muted(guild) is False
+
+
+def test_tables_load_with_saved_values(tmp_path):
+    """Test that values saved earlier are found when a table is loaded."""
+    dbpath = str(tmp_path / "settings.db")
+    guild = helpers.MockGuild()
+    Settings(dbpath).set_mute_role_by_id(guild, 10)
+
+    settings = Settings(dbpath)
+    settings.mute_roles.load_from_db()
+    assert settings.get_mute_role(guild) == 10
+
+
+def test_load_unloaded_tables(settings):
+    """Test that loading every unloaded table leaves none unloaded."""
+    for table in settings.unloaded_tables():
+        table.ensure_loaded()
+
+    assert settings.unloaded_tables() == []
@@ -0,0 +1,99 @@
+"""Unittest for the database worker."""
+
+import asyncio
+import threading
+
+from mrfreeze.database.worker import DatabaseWorker
+
+import pytest
+
+
+@pytest.fixture()
+def worker():
+    """Create a database worker, stopping it afterwards."""
+    worker = DatabaseWorker()
+    yield worker
+    asyncio.run(worker.close())
+
+
+def test_run_on_worker_thread(worker):
+    """Test that jobs run on the worker thread, not the event loop's."""
+    def job(a, b=0):
+        return threading.current_thread(), a + b
+
+    thread, result = asyncio.run(worker.run(job, 1, b=2))
+    assert thread is not threading.current_thread()
+    assert thread.name.startswith("database")
+    assert result == 3
+
+
+def test_run_keeps_loop_responsive(worker):
+    """Test that the event loop keeps running while a job blocks."""
+    release = threading.Event()
+
+    async def other_task():
+        await asyncio.sleep(0.01)
+        release.set()
+
+    async def run():
+        return await asyncio.gather(worker.run(release.wait, 5), other_task())
+
+    released, _ = asyncio.run(run())
+    assert released
+
+
+def test_run_in_order(worker):
+    """Test that jobs are carried out one at a time, in order."""
+    order = list()
+
+    async def run():
+        await asyncio.gather(*[ worker.run(order.append, i) for i in range(20) ])
+
+    asyncio.run(run())
+    assert order == list(range(20))
+
+
+def test_run_raises(worker):
+    """Test that exceptions are raised in the awaiting coroutine."""
+    def job():
+        raise ValueError("broken")
+
+    with pytest.raises(ValueError):
+        asyncio.run(worker.run(job))
+
+
+def test_execute(worker, tmp_path):
+    """Test that queries can be executed through the worker."""
+    dbpath = str(tmp_path / "test.db")
+
+    async def run():
+        await worker.execute(dbpath, "CREATE TABLE t (x INTEGER)")
+        await worker.execute(dbpath, "INSERT INTO t (x) VALUES (?)", (1,))
+        return await worker.execute(dbpath, "SELECT x FROM t")
+
+    query = asyncio.run(run())
+    assert query.error is None
+    assert query.output == [ (1,) ]
+
+
+def test_close_finishes_jobs_without_blocking(worker):
+    """Test that closing waits for submitted jobs while the event loop keeps running."""
+    release = threading.Event()
+    done = list()
+
+    def job():
+        release.wait(5)
+        done.append(True)
+
+    async def other_task():
+        await asyncio.sleep(0.01)
+        release.set()
+
+    async def run():
+        pending = asyncio.ensure_future(worker.run(job))
+        await asyncio.sleep(0)
+        await asyncio.gather(worker.close(), other_task())
+        await pending
+
+    asyncio.run(run())
+    assert done == [ True ]
@@ -7,6 +7,7 @@ https://github.com/python-discord/bot/blob/master/tests/helpers.py
 """
 
 import collections
+import functools
 import inspect
 import itertools
 from typing import Any, Iterable, Optional
@@ -16,6 +17,7 @@ import discord
 from discord.ext.commands import Context
 
 from mrfreeze.bot import MrFreeze
+from mrfreeze.outbox import Outbox
 
 guild_data = {
     "id": 1,
@@ -220,6 +222,18 @@ class MockMrFreeze(CustomMockMixin, AsyncMock):
     def __init__(self, **kwargs) -> None:
         super().__init__(spec_set=bot_instance, **kwargs)
 
+        # The asset cache is plain data, so use the real one.
+        self.assets = bot_instance.assets
+
+        # Database work is carried out for real, on the bot's worker,
+        # and so is loading the tables the mock's settings are read from.
+        self.database = bot_instance.database
+        self.load_tables = functools.partial(MrFreeze.load_tables, self)
+
+        # Replies are sent right away rather than being queued, so tests
+        # can check what was sent as soon as the listener returns.
+        self.outbox = Outbox(window=0)
+
         # self.wait_for is *not* a coroutine function, but returns a
         # coroutine nonetheless and and should therefore be awaited.
         # (The documentation calls it a coroutine as well, which
@@ -0,0 +1,48 @@
+"""Unittest for the asset cache."""
+
+from discord import Embed
+
+from mrfreeze.assets import AssetCache
+
+import pytest
+
+
+@pytest.fixture()
+def assets(tmp_path):
+    """Create an asset cache loaded from a directory with a single image."""
+    (tmp_path / "image.png").write_bytes(b"not really a png")
+    assets = AssetCache(str(tmp_path))
+    assets.load()
+    yield assets
+
+
+def test_load_reads_files_into_memory(assets):
+    """Test that load() reads the contents of every file."""
+    assert assets.assets == {"image.png": b"not really a png"}
+
+
+def test_file_is_served_from_memory(assets):
+    """Test that file() serves the bytes in memory, not the file on disk."""
+    assets.assets["image.png"] = b"cached"
+    image = assets.file("image.png")
+
+    assert image.filename == "image.png"
+    assert image.fp.read() == b"cached"
+
+
+def test_file_falls_back_to_disk(assets, tmp_path):
+    """Test that file() reads assets that weren't loaded from disk."""
+    (tmp_path / "late.png").write_bytes(b"added later")
+    image = assets.file("late.png")
+
+    assert image.fp.read() == b"added later"
+    image.close()
+
+
+def test_thumbnail_attaches_file(assets):
+    """Test that thumbnail() points the embed at the attached file."""
+    embed = Embed()
+    image = assets.thumbnail(embed, "image.png")
+
+    assert image.filename == "image.png"
+    assert embed.thumbnail.url == "attachment://image.png"
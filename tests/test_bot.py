@@ -0,0 +1,117 @@
+"""Unittest for the MrFreeze bot class."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+from mrfreeze.checks import MuteCheckFailure
+from mrfreeze.database.settings import Settings
+
+import pytest
+
+from tests import helpers
+
+
+@pytest.fixture()
+def bot():
+    """Get the shared MrFreeze object with an empty context cache."""
+    bot = helpers.bot_instance
+    cache_size = bot.context_cache_size
+    bot.context_cache.clear()
+    yield bot
+    bot.context_cache.clear()
+    bot.context_cache_size = cache_size
+
+
+def make_context(message, *, cls=commands.Context):
+    """Create a context for message as if it had been parsed as a command."""
+    view = StringView(message.content)
+    view.skip_string("!")
+    invoked_with = view.get_word()
+    return cls(prefix="!", view=view, bot=helpers.bot_instance, message=message,
+               invoked_with=invoked_with)
+
+
+def test_get_context_parses_each_message_once(bot):
+    """Test that repeated get_context() calls share a single parse."""
+    message = helpers.MockMessage(id=1, content="!help me")
+    parser = AsyncMock(side_effect=make_context)
+
+    with patch.object(commands.Bot, "get_context", parser):
+        first = asyncio.run(bot.get_context(message))
+        second = asyncio.run(bot.get_context(message))
+
+    assert parser.await_count == 1, "message should only be parsed once"
+    assert first is not second, "every caller should get a context of its own"
+    assert second.message is message
+    assert (second.prefix, second.invoked_with) == ("!", "help")
+    assert second.view.read_rest() == " me"
+
+
+def test_get_context_isolates_callers(bot):
+    """Test that invoking one cached context leaves the others untouched."""
+    message = helpers.MockMessage(id=1, content="!help me")
+    parser = AsyncMock(side_effect=make_context)
+
+    with patch.object(commands.Bot, "get_context", parser):
+        first = asyncio.run(bot.get_context(message))
+        first.view.read_rest()
+        first.args.append("me")
+        second = asyncio.run(bot.get_context(message))
+
+    assert second.args == list()
+    assert second.view.read_rest() == " me"
+
+
+def test_get_context_reparses_edited_message(bot):
+    """Test that a new message object with the same ID is parsed again."""
+    original = helpers.MockMessage(id=1, content="!help")
+    edited = helpers.MockMessage(id=1, content="!about")
+    parser = AsyncMock(side_effect=make_context)
+
+    with patch.object(commands.Bot, "get_context", parser):
+        asyncio.run(bot.get_context(original))
+        second = asyncio.run(bot.get_context(edited))
+
+    assert second.message is edited
+    assert second.invoked_with == "about"
+    assert parser.await_count == 2
+
+
+def test_get_context_cache_is_bounded(bot):
+    """Test that the context cache never grows beyond its size."""
+    bot.context_cache_size = 3
+    parser = AsyncMock(side_effect=make_context)
+
+    with patch.object(commands.Bot, "get_context", parser):
+        for message_id in range(10):
+            message = helpers.MockMessage(id=message_id, content="!help")
+            asyncio.run(bot.get_context(message))
+
+    assert list(bot.context_cache) == [7, 8, 9]
+
+
+def test_warm_up_settings(bot):
+    """Test that warming up loads every settings table."""
+    asyncio.run(bot.warm_up_settings())
+    assert bot.settings.unloaded_tables() == []
+
+
+def test_mute_check_loads_freeze_mutes(bot, tmp_path):
+    """Test that the freeze mute check loads the table it reads on first use."""
+    dbpath = str(tmp_path / "settings.db")
+    guild = helpers.MockGuild()
+    settings = Settings(dbpath)
+    settings.toggle_freeze_mute(guild)
+    settings.flush()
+
+    ctx = helpers.MockContext(guild=guild)
+    ctx.command.name = "about"
+    with patch.object(bot, "settings", Settings(dbpath)):
+        assert not bot.settings.freeze_mutes.is_loaded()
+        with pytest.raises(MuteCheckFailure):
+            asyncio.run(bot.block_self_if_muted(ctx))
+        assert bot.settings.freeze_mutes.is_loaded()
+        assert not bot.settings.mute_roles.is_loaded()
@@ -0,0 +1,139 @@
+"""Unittest for the outbox."""
+
+import asyncio
+
+from discord import Embed
+
+from mrfreeze.outbox import Outbox
+
+import pytest
+
+from tests import helpers
+
+
+@pytest.fixture()
+def outbox():
+    """Create an outbox with a very short window."""
+    yield Outbox(window=0.01)
+
+
+@pytest.fixture()
+def channel():
+    """Create a text channel mock."""
+    yield helpers.MockTextChannel()
+
+
+def send_all(outbox, channel, replies):
+    """Queue all replies at once and wait for them to be sent."""
+    async def send():
+        return await asyncio.gather(*[
+            outbox.send(channel, content, **kwargs)
+            for content, kwargs in replies
+        ])
+    return asyncio.run(send())
+
+
+def test_replies_in_window_are_merged(outbox, channel):
+    """Test that replies queued together are sent as a single message."""
+    results = send_all(outbox, channel, [("one", {}), ("two", {}), ("three", {})])
+
+    channel.send.assert_called_once()
+    args, _ = channel.send.call_args
+    assert args[0] == "one\ntwo\nthree"
+    assert results[0] is results[1] is results[2]
+    assert outbox.metrics == {"queued": 3, "merged": 2, "sent": 1, "dropped": 0}
+
+
+def test_replies_to_different_authors_are_not_merged(outbox, channel):
+    """Test that only replies to the same author share a message."""
+    alice = helpers.MockMember(id=1)
+    bob = helpers.MockMember(id=2)
+    send_all(outbox, channel, [
+        ("one", {"author": alice}),
+        ("two", {"author": bob}),
+        ("three", {"author": alice}),
+    ])
+
+    contents = sorted(args[0] for args, _ in channel.send.call_args_list)
+    assert contents == [ "one\nthree", "two" ]
+
+
+def test_empty_queues_are_removed(outbox, channel):
+    """Test that nothing is kept around for channels and authors once sent."""
+    alice = helpers.MockMember(id=1)
+    send_all(outbox, channel, [ ("one", {"author": alice}), ("two", {}) ])
+
+    assert channel.send.call_count == 2
+    assert outbox.pending == dict()
+    assert outbox.flushers == dict()
+
+
+def test_empty_reply_is_dropped(outbox, channel):
+    """Test that a reply without content, file or embed is never sent."""
+    results = send_all(outbox, channel, [("", {})])
+
+    channel.send.assert_not_called()
+    assert results == [None]
+    assert outbox.metrics["dropped"] == 1
+
+
+def test_close_cancels_pending_replies(channel):
+    """Test that closing the outbox cancels queued replies and their flushes."""
+    outbox = Outbox(window=60)
+
+    async def send_and_close():
+        reply = asyncio.ensure_future(outbox.send(channel, "one"))
+        await asyncio.sleep(0)
+        await outbox.close()
+        await asyncio.gather(reply, return_exceptions=True)
+        return reply
+
+    reply = asyncio.run(send_and_close())
+
+    assert reply.cancelled()
+    assert outbox.flushers == dict()
+    channel.send.assert_not_called()
+
+
+def test_merged_replies_respect_length_limit(outbox, channel):
+    """Test that replies are split up rather than exceeding 2000 characters."""
+    send_all(outbox, channel, [("a" * 1500, {}), ("b" * 1500, {})])
+
+    assert channel.send.call_count == 2
+    assert outbox.metrics["merged"] == 0
+    assert outbox.metrics["sent"] == 2
+
+
+def test_only_one_embed_per_message(outbox, channel):
+    """Test that replies with an embed each are sent separately."""
+    send_all(outbox, channel, [("one", {"embed": Embed()}), ("two", {"embed": Embed()})])
+
+    assert channel.send.call_count == 2
+
+
+def test_too_long_reply_is_dropped(outbox, channel):
+    """Test that a reply longer than 2000 characters is dropped."""
+    results = send_all(outbox, channel, [("a" * 2001, {})])
+
+    channel.send.assert_not_called()
+    assert results == [None]
+    assert outbox.metrics["dropped"] == 1
+
+
+def test_full_queue_drops_replies(outbox, channel):
+    """Test that replies beyond max_pending are dropped."""
+    outbox.max_pending = 2
+    results = send_all(outbox, channel, [("one", {}), ("two", {}), ("three", {})])
+
+    channel.send.assert_called_once()
+    assert results[2] is None
+    assert outbox.metrics["dropped"] == 1
+
+
+def test_no_window_sends_right_away(channel):
+    """Test that an outbox without a window doesn't queue anything."""
+    outbox = Outbox(window=0)
+    send_all(outbox, channel, [("one", {}), ("two", {})])
+
+    assert channel.send.call_count == 2
+    assert outbox.metrics["queued"] == 0
@@ -0,0 +1,109 @@
+"""Unittest for the message scanner."""
+
+import asyncio
+from unittest.mock import AsyncMock
+
+from mrfreeze.scanner import MessageScanner
+
+import pytest
+
+from tests import helpers
+
+
+@pytest.fixture()
+def scanner():
+    """Create a scanner with a digit trigger and a bracket trigger."""
+    scanner = MessageScanner()
+    scanner.register("digits", r"\d", AsyncMock())
+    scanner.register("brackets", r"[{]", AsyncMock(), pattern=r"[{]\w+[}]")
+    yield scanner
+
+
+def scan(scanner, content, bot=False):
+    """Scan a message with the given content."""
+    message = helpers.MockMessage()
+    message.content = content
+    message.author.bot = bot
+    asyncio.run(scanner.scan(message))
+    return message
+
+
+def handler(scanner, name):
+    """Get the handler of a trigger."""
+    return scanner.triggers[name].handler
+
+
+def test_scan_ignores_message_matching_nothing(scanner):
+    """Test that no handler is called for a message matching no prefilter."""
+    scan(scanner, "just some chatter")
+    handler(scanner, "digits").assert_not_awaited()
+    handler(scanner, "brackets").assert_not_awaited()
+
+
+def test_scan_only_calls_matching_trigger(scanner):
+    """Test that only the handler whose prefilter matched is called."""
+    message = scan(scanner, "it's 20 c outside")
+    handler(scanner, "digits").assert_awaited_once_with(message)
+    handler(scanner, "brackets").assert_not_awaited()
+
+
+def test_scan_requires_pattern_match(scanner):
+    """Test that a matching prefilter isn't enough if the pattern fails."""
+    scan(scanner, "a lonely { bracket")
+    handler(scanner, "brackets").assert_not_awaited()
+
+    message = scan(scanner, "{diamine}")
+    handler(scanner, "brackets").assert_awaited_once_with(message)
+
+
+def test_scan_ignores_bots(scanner):
+    """Test that messages from bots are never scanned."""
+    scan(scanner, "{diamine} at 20 c", bot=True)
+    handler(scanner, "digits").assert_not_awaited()
+    handler(scanner, "brackets").assert_not_awaited()
+
+
+def test_scan_continues_after_failing_handler(scanner):
+    """Test that one handler raising doesn't stop the others."""
+    handler(scanner, "digits").side_effect = ValueError("broken")
+    message = scan(scanner, "{diamine} at 20 c")
+    handler(scanner, "brackets").assert_awaited_once_with(message)
+
+
+def test_scan_reports_failing_handler(scanner):
+    """Test that an exception in a handler is passed on to the error handler."""
+    scanner.on_error = AsyncMock()
+    handler(scanner, "digits").side_effect = ValueError("broken")
+    message = scan(scanner, "20 c")
+    scanner.on_error.assert_awaited_once_with("scanner:digits", message)
+
+
+def test_scan_runs_handlers_concurrently(scanner):
+    """Test that a slow handler doesn't hold up the others."""
+    started = list()
+
+    async def slow(message):
+        started.append("slow")
+        await asyncio.sleep(0)
+        assert "brackets" in started, "handlers should run concurrently"
+
+    async def fast(message):
+        started.append("brackets")
+
+    scanner.register("digits", r"\d", slow)
+    scanner.register("brackets", r"[{]", fast)
+    scanner.on_error = AsyncMock()
+    scan(scanner, "{diamine} at 20 c")
+
+    assert sorted(started) == [ "brackets", "slow" ]
+    scanner.on_error.assert_not_awaited()
+
+
+def test_unregister_updates_prefilter(scanner):
+    """Test that unregistering all triggers disables the prefilter."""
+    scanner.unregister("digits")
+    assert "digits" not in scanner.triggers
+    assert scanner.prefilter.search("20 c") is None
+
+    scanner.unregister("brackets")
+    assert scanner.prefilter is None